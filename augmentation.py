@@ -0,0 +1,213 @@
+"""
+Vectorized training augmentation for whole uint8 batches.
+
+Applies the transform family of the notebook's `ImageDataGenerator`
+(rotation, zoom, shift, shear, horizontal flip, brightness, 'nearest' fill)
+to a full (N, H, W, 3) batch at once: one affine matrix per image, one
+bilinear gather for the whole batch. Runs on NumPy alone, or as TensorFlow's
+ImageProjectiveTransformV3 op with `in_graph=True`, so the per-image Python
+loop of the Keras generator (and its SciPy warp) disappears from the CPU
+training loop.
+
+Ranges use the Keras conventions: `rotation_range` and `shear_range` are in
+degrees, shifts are fractions of the image size, `zoom_range=z` draws the
+x and y zoom independently from [1 - z, 1 + z].
+
+Randomness is drawn from a generator seeded by (seed, epoch, batch index),
+so a run is reproducible regardless of the order or the worker in which
+batches are produced.
+"""
+
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+try:
+    from tensorflow.keras.utils import Sequence
+except ImportError:
+    # Augmentation itself needs only NumPy (e.g. for benchmarking)
+    Sequence = object
+
+
+class BatchAugmentation:
+    """Random affine + brightness augmentation of uint8 batches"""
+
+    def __init__(self,
+                 rotation_range: float = 20.0,
+                 zoom_range: float = 0.2,
+                 width_shift_range: float = 0.2,
+                 height_shift_range: float = 0.2,
+                 shear_range: float = 0.15,
+                 horizontal_flip: bool = True,
+                 brightness_range: Optional[Tuple[float, float]] = (0.8, 1.2),
+                 rescale: float = 1.0 / 255,
+                 seed: Optional[int] = None):
+        """
+        Args:
+            rotation_range: Maximum rotation in degrees.
+            zoom_range: Maximum zoom deviation from 1.0.
+            width_shift_range: Maximum horizontal shift as a fraction of the width.
+            height_shift_range: Maximum vertical shift as a fraction of the height.
+            shear_range: Maximum shear angle in degrees.
+            horizontal_flip: Flip half of the images left-right.
+            brightness_range: Range of the brightness factor, or None.
+            rescale: Factor applied to the output, 1/255 gives [0, 1] floats.
+            seed: Seed for `augment` calls that pass no generator.
+        """
+        self.rotation_range = rotation_range
+        self.zoom_range = zoom_range
+        self.width_shift_range = width_shift_range
+        self.height_shift_range = height_shift_range
+        self.shear_range = shear_range
+        self.horizontal_flip = horizontal_flip
+        self.brightness_range = brightness_range
+        self.rescale = rescale
+        self.rng = np.random.default_rng(seed)
+
+    def random_parameters(self, n: int, height: int, width: int,
+                          rng: Optional[np.random.Generator] = None) -> Dict[str, np.ndarray]:
+        """Draw transform parameters for `n` images"""
+        rng = rng or self.rng
+        uniform = lambda limit: rng.uniform(-limit, limit, n) if limit else np.zeros(n)
+        zoom = (rng.uniform(1 - self.zoom_range, 1 + self.zoom_range, (n, 2))
+                if self.zoom_range else np.ones((n, 2)))
+        return {
+            "theta": np.deg2rad(uniform(self.rotation_range)),
+            "shear": np.deg2rad(uniform(self.shear_range)),
+            "zoom_y": zoom[:, 0],
+            "zoom_x": zoom[:, 1],
+            "shift_y": uniform(self.height_shift_range) * height,
+            "shift_x": uniform(self.width_shift_range) * width,
+            "flip": rng.random(n) < 0.5 if self.horizontal_flip else np.zeros(n, dtype=bool),
+            "brightness": (rng.uniform(*self.brightness_range, n)
+                           if self.brightness_range else np.ones(n)),
+        }
+
+    @staticmethod
+    def affine_matrices(params: Dict[str, np.ndarray]) -> np.ndarray:
+        """
+        (N, 2, 3) matrices mapping centred output (row, col, 1) to centred
+        input coordinates: rotation @ shear @ zoom, then the shift.
+        """
+        cos, sin = np.cos(params["theta"]), np.sin(params["theta"])
+        rotation = np.stack([np.stack([cos, -sin], -1), np.stack([sin, cos], -1)], 1)
+        shear = np.zeros_like(rotation)
+        shear[:, 0, 0] = 1.0
+        shear[:, 0, 1] = -np.sin(params["shear"])
+        shear[:, 1, 1] = np.cos(params["shear"])
+        zoom = np.zeros_like(rotation)
+        zoom[:, 0, 0] = params["zoom_y"]
+        zoom[:, 1, 1] = params["zoom_x"]
+        linear = rotation @ shear @ zoom
+        # Flipping the output mirrors the column coordinate before the warp
+        linear[:, :, 1] *= np.where(params["flip"], -1.0, 1.0)[:, np.newaxis]
+        shift = np.stack([params["shift_y"], params["shift_x"]], -1)[:, :, np.newaxis]
+        return np.concatenate([linear, shift], axis=2)
+
+    def apply(self, batch: np.ndarray, params: Dict[str, np.ndarray]) -> np.ndarray:
+        """Warp and brighten a (N, H, W, C) batch with given parameters; returns float32"""
+        n, height, width = batch.shape[:3]
+        matrices = self.affine_matrices(params).astype(np.float32)
+        rows = np.arange(height, dtype=np.float32) - (height - 1) / 2
+        cols = np.arange(width, dtype=np.float32) - (width - 1) / 2
+        m = matrices[:, :, :, np.newaxis, np.newaxis]
+        src_y = m[:, 0, 0] * rows[:, np.newaxis] + m[:, 0, 1] * cols + m[:, 0, 2] + (height - 1) / 2
+        src_x = m[:, 1, 0] * rows[:, np.newaxis] + m[:, 1, 1] * cols + m[:, 1, 2] + (width - 1) / 2
+
+        # 'nearest' fill: clamping the source coordinate repeats the edge pixels
+        np.clip(src_y, 0, height - 1, out=src_y)
+        np.clip(src_x, 0, width - 1, out=src_x)
+        y0 = src_y.astype(np.int32)
+        x0 = src_x.astype(np.int32)
+        wy = np.subtract(src_y, y0, dtype=np.float32)[..., np.newaxis]
+        wx = np.subtract(src_x, x0, dtype=np.float32)[..., np.newaxis]
+
+        # Gather the four neighbours as uint8 through flat pixel indices
+        pixels = batch.reshape(-1, batch.shape[3])
+        flat = (np.arange(n, dtype=np.int32)[:, np.newaxis, np.newaxis] * height + y0) * width + x0
+        step_y = np.where(y0 < height - 1, width, 0)
+        step_x = (x0 < width - 1).astype(np.int32)
+        p00, p01 = pixels[flat], pixels[flat + step_x]
+        p10, p11 = pixels[flat + step_y], pixels[flat + step_y + step_x]
+        top = p00 + (p01 - p00.astype(np.float32)) * wx
+        bottom = p10 + (p11 - p10.astype(np.float32)) * wx
+        out = top + (bottom - top) * wy
+
+        brightness = params["brightness"].astype(np.float32)[:, np.newaxis, np.newaxis, np.newaxis]
+        out *= brightness
+        np.minimum(out, 255.0, out=out)
+        out *= np.float32(self.rescale)
+        return out
+
+    def apply_tf(self, batch, params: Dict[str, np.ndarray]):
+        """
+        The same transform as `apply` as TensorFlow ops (ImageProjectiveTransformV3),
+        usable inside a tf.data pipeline; returns a float32 tensor.
+        """
+        import tensorflow as tf
+        height, width = int(batch.shape[1]), int(batch.shape[2])
+        matrices = self.affine_matrices(params)
+        cy, cx = (height - 1) / 2, (width - 1) / 2
+        # Rewrite the centred (row, col) matrices as the op's (x, y) output-to-input transforms
+        a0, a1 = matrices[:, 1, 1], matrices[:, 1, 0]
+        b0, b1 = matrices[:, 0, 1], matrices[:, 0, 0]
+        a2 = matrices[:, 1, 2] + cx - a0 * cx - a1 * cy
+        b2 = matrices[:, 0, 2] + cy - b0 * cx - b1 * cy
+        zeros = np.zeros_like(a0)
+        transforms = np.stack([a0, a1, a2, b0, b1, b2, zeros, zeros], axis=1).astype(np.float32)
+        warped = tf.raw_ops.ImageProjectiveTransformV3(
+            images=tf.cast(batch, tf.float32),
+            transforms=tf.constant(transforms),
+            output_shape=tf.constant([height, width], dtype=tf.int32),
+            fill_value=0.0,
+            interpolation="BILINEAR",
+            fill_mode="NEAREST"
+        )
+        brightness = tf.constant(params["brightness"].astype(np.float32)[:, np.newaxis, np.newaxis, np.newaxis])
+        return tf.minimum(warped * brightness, 255.0) * self.rescale
+
+    def augment(self, batch: np.ndarray, rng: Optional[np.random.Generator] = None,
+                in_graph: bool = False) -> np.ndarray:
+        """Randomly augment a (N, H, W, C) uint8 batch, with NumPy or TensorFlow ops"""
+        params = self.random_parameters(len(batch), batch.shape[1], batch.shape[2], rng)
+        if in_graph:
+            return self.apply_tf(batch, params).numpy()
+        return self.apply(batch, params)
+
+
+class AugmentedSequence(Sequence):
+    """
+    Wraps a Keras directory iterator that yields raw uint8 batches (an
+    `ImageDataGenerator(dtype='uint8')` without augmentation) and augments
+    each batch with `BatchAugmentation`.
+
+    Attributes such as `classes` and `class_indices` are read from the
+    wrapped iterator, so it drops in wherever the generator was used.
+    """
+
+    def __init__(self, iterator, augmentation: BatchAugmentation, seed: int = 0,
+                 in_graph: bool = False):
+        super().__init__()
+        self.iterator = iterator
+        self.augmentation = augmentation
+        self.seed = seed
+        self.in_graph = in_graph
+        self.epoch = 0
+
+    def __len__(self) -> int:
+        return len(self.iterator)
+
+    def __getitem__(self, index: int):
+        images, labels = self.iterator[index]
+        rng = np.random.default_rng([self.seed, self.epoch, index])
+        return self.augmentation.augment(images, rng, self.in_graph), labels
+
+    def on_epoch_end(self):
+        self.epoch += 1
+        self.iterator.on_epoch_end()
+
+    def __getattr__(self, name: str):
+        if name == "iterator":
+            raise AttributeError(name)
+        return getattr(self.iterator, name)
+
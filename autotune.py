@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Benchmark runtime settings for the served model and save the best as a
+tuning profile that main.py applies on later starts.
+
+The grid covers uvicorn workers, TensorFlow intra-op and inter-op threads,
+oneDNN on/off and the inference batch size. Thread pools and oneDNN are
+fixed once TensorFlow starts, so every (workers, threads, oneDNN) point runs
+in fresh child processes: one per worker, loading the model through the
+serving code path and measuring all batch sizes at the same time as the
+others. The chosen configuration has the highest total throughput among
+those whose p99 batch latency stays within --max-p99-ms.
+
+Usage:
+    python autotune.py                                # full grid, writes tuning_profile.json
+    python autotune.py --workers 1,2 --batch-sizes 1,8,32 --max-p99-ms 300
+    AUTOTUNE=1 python main.py                         # tune once, then serve
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import subprocess
+
+import numpy as np
+
+DEFAULT_BATCH_SIZES = "1,4,8,16,32"
+
+
+def _ints(text: str):
+    return [int(v) for v in text.split(",") if v.strip()]
+
+
+def measure(batch_sizes, seconds: float):
+    """
+    Child process: load the model, report READY, wait for GO, then time every batch size.
+
+    Settings arrive through the environment (TF_INTRA_OP_THREADS,
+    TF_INTER_OP_THREADS, TF_ENABLE_ONEDNN_OPTS), exactly as main.py reads them.
+    """
+    import main as service
+
+    runtime = service.create_backend()
+    runtime.load()
+    print("READY", flush=True)
+    sys.stdin.readline()
+
+    results = {}
+    for batch_size in batch_sizes:
+        batch = np.random.random((batch_size, *runtime.input_size, 3)).astype(np.float32)
+        for _ in range(2):  # Warm-up: graph tracing, allocator growth
+            runtime.predict(batch)
+        timings = []
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline or len(timings) < 5:
+            start = time.perf_counter()
+            runtime.predict(batch)
+            timings.append(time.perf_counter() - start)
+        timings_ms = np.asarray(timings) * 1000
+        results[batch_size] = {
+            "images_per_sec": batch_size * len(timings) / (timings_ms.sum() / 1000),
+            "p50_ms": float(np.percentile(timings_ms, 50)),
+            "p99_ms": float(np.percentile(timings_ms, 99))
+        }
+    print(json.dumps({
+        "backend": runtime.name,
+        "model_version": service.file_version(runtime.model_path),
+        "tf_version": service.tf.__version__ if service.tf is not None else None,
+        "results": results
+    }), flush=True)
+
+
+def run_config(config, batch_sizes, seconds: float, timeout: float):
+    """Start one child per worker with the config's settings and combine their measurements"""
+    env = dict(os.environ)
+    env["TUNING_PROFILE_PATH"] = ""       # measure the grid point, not a previous profile
+    env["PREDICTION_LOG_DIR"] = ""
+    env.pop("INFERENCE_THREADS", None)     # TFLite takes its threads from TF_INTRA_OP_THREADS here
+    env["TF_CPP_MIN_LOG_LEVEL"] = "2"
+    env["TF_INTRA_OP_THREADS"] = str(config["intra_op_threads"])
+    env["TF_INTER_OP_THREADS"] = str(config["inter_op_threads"])
+    if config["onednn"] is not None:
+        env["TF_ENABLE_ONEDNN_OPTS"] = "1" if config["onednn"] else "0"
+
+    command = [sys.executable, os.path.abspath(__file__), "--measure",
+               "--batch-sizes", ",".join(map(str, batch_sizes)), "--seconds", str(seconds)]
+    children = [subprocess.Popen(command, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                 stderr=subprocess.DEVNULL, text=True)
+                for _ in range(config["workers"])]
+    try:
+        # Start measuring only once every worker has its model loaded
+        for child in children:
+            for line in child.stdout:
+                if line.strip() == "READY":
+                    break
+            else:
+                raise RuntimeError("a benchmark worker exited before loading the model")
+        for child in children:
+            child.stdin.write("GO\n")
+            child.stdin.flush()
+        reports = []
+        for child in children:
+            output, _ = child.communicate(timeout=timeout)
+            reports.append(json.loads(output.strip().splitlines()[-1]))
+    finally:
+        for child in children:
+            if child.poll() is None:
+                child.kill()
+
+    combined = {}
+    for batch_size in batch_sizes:
+        per_worker = [r["results"][str(batch_size)] for r in reports]
+        combined[batch_size] = {
+            "images_per_sec": sum(m["images_per_sec"] for m in per_worker),
+            "p50_ms": max(m["p50_ms"] for m in per_worker),
+            "p99_ms": max(m["p99_ms"] for m in per_worker)
+        }
+    return reports[0], combined
+
+
+def build_grid(args, cpu_count: int, backend: str):
+    """All (workers, intra, inter, oneDNN) points that do not oversubscribe the CPUs"""
+    workers = _ints(args.workers) if args.workers else [w for w in (1, 2, 4, 8) if w <= cpu_count]
+    onednn = [{"on": True, "off": False}[v] for v in args.onednn.split(",")]
+    inter = _ints(args.inter)
+    if backend == "tflite":
+        # The interpreter has a single thread setting and no oneDNN
+        onednn, inter = [None], [1]
+
+    grid = []
+    for w, o, i in itertools.product(workers, onednn, inter):
+        if args.intra:
+            intra_choices = _ints(args.intra)
+        else:
+            per_worker = max(1, cpu_count // w)
+            intra_choices = sorted({per_worker, max(1, per_worker // 2)}, reverse=True)
+        for intra in intra_choices:
+            if w * intra <= cpu_count or args.intra:
+                grid.append({"workers": w, "intra_op_threads": intra, "inter_op_threads": i, "onednn": o})
+    return grid
+
+
+def choose(candidates, max_p99_ms):
+    """Highest throughput within the p99 limit, else the lowest p99"""
+    acceptable = [c for c in candidates if c["p99_ms"] <= max_p99_ms]
+    if acceptable:
+        return max(acceptable, key=lambda c: c["images_per_sec"]), True
+    return min(candidates, key=lambda c: c["p99_ms"]), False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune threads, oneDNN, workers and batch size")
+    parser.add_argument("--output", default=os.environ.get("TUNING_PROFILE_PATH") or "tuning_profile.json")
+    parser.add_argument("--workers", help="Comma-separated uvicorn worker counts (default: 1,2,4,8 up to the CPU count)")
+    parser.add_argument("--intra", help="Comma-separated intra-op thread counts (default: derived per worker count)")
+    parser.add_argument("--inter", default="1,2", help="Comma-separated inter-op thread counts")
+    parser.add_argument("--onednn", default="on,off", help="oneDNN settings to try: on, off or on,off")
+    parser.add_argument("--batch-sizes", default=DEFAULT_BATCH_SIZES)
+    parser.add_argument("--max-p99-ms", type=float, default=float(os.environ.get("TUNING_MAX_P99_MS", "500")),
+                        help="Largest acceptable p99 latency of one inference call")
+    parser.add_argument("--seconds", type=float, default=3.0, help="Measurement time per batch size")
+    parser.add_argument("--timeout", type=float, default=600.0, help="Give up on a grid point after this long")
+    parser.add_argument("--measure", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    batch_sizes = _ints(args.batch_sizes)
+    if args.measure:
+        measure(batch_sizes, args.seconds)
+        return
+
+    cpu_count = os.cpu_count() or 1
+    backend = os.environ.get("INFERENCE_BACKEND", "keras")
+    grid = build_grid(args, cpu_count, backend)
+    print(f"🔧 Tuning {len(grid)} configurations x {len(batch_sizes)} batch sizes "
+          f"on {cpu_count} CPUs (backend: {backend}, p99 limit {args.max_p99_ms:.0f} ms)")
+
+    candidates, info = [], None
+    for n, config in enumerate(grid, 1):
+        print(f"🔄 [{n}/{len(grid)}] {config}")
+        try:
+            info, measured = run_config(config, batch_sizes, args.seconds, args.timeout)
+        except Exception as e:
+            print(f"⚠️ Skipped: {e}")
+            continue
+        for batch_size, m in measured.items():
+            candidates.append({**config, "batch_size": batch_size, **m})
+            print(f"    batch {batch_size:3d}: {m['images_per_sec']:8.1f} img/s, "
+                  f"p50 {m['p50_ms']:7.1f} ms, p99 {m['p99_ms']:7.1f} ms")
+
+    if not candidates:
+        print("❌ No configuration could be measured")
+        sys.exit(2)
+
+    best, within_limit = choose(candidates, args.max_p99_ms)
+    if not within_limit:
+        print(f"⚠️ No configuration meets p99 <= {args.max_p99_ms:.0f} ms, using the lowest p99")
+    settings = {key: best[key] for key in
+                ("workers", "intra_op_threads", "inter_op_threads", "onednn", "batch_size")}
+    profile = {
+        "settings": settings,
+        "measured": {key: best[key] for key in ("images_per_sec", "p50_ms", "p99_ms")},
+        "max_p99_ms": args.max_p99_ms,
+        "within_p99_limit": within_limit,
+        "cpu_count": cpu_count,
+        "backend": info["backend"],
+        "model_version": info["model_version"],
+        "tf_version": info["tf_version"],
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "candidates": candidates
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(profile, f, indent=2)
+
+    print(f"✅ Best: {settings} -> {best['images_per_sec']:.1f} img/s, p99 {best['p99_ms']:.1f} ms")
+    print(f"✅ Profile saved to {args.output}; main.py applies it on the next start")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Benchmark training augmentation: the notebook's per-image Keras
+`ImageDataGenerator` against the vectorized `BatchAugmentation` (NumPy and,
+when TensorFlow is installed, in-graph).
+
+Usage:
+    python benchmark_augmentation.py
+    python benchmark_augmentation.py --batch-size 4 --batches 200
+    python benchmark_augmentation.py --images-dir dataset_split/train
+"""
+
+import os
+import time
+import argparse
+from typing import Callable, List
+
+import numpy as np
+from PIL import Image
+
+from augmentation import BatchAugmentation
+
+IMG_SIZE = (160, 160)
+SEED = 42
+
+# Same settings as train_datagen in GeneticAlgorithm_New.ipynb
+GENERATOR_SETTINGS = dict(
+    rotation_range=20,
+    zoom_range=0.2,
+    width_shift_range=0.2,
+    height_shift_range=0.2,
+    shear_range=0.15,
+    horizontal_flip=True,
+    brightness_range=[0.8, 1.2],
+)
+
+
+def load_batches(images_dir: str, batch_size: int, num_batches: int) -> List[np.ndarray]:
+    """uint8 batches of real images (searched recursively) or of synthetic patterns"""
+    rng = np.random.default_rng(SEED)
+    images = []
+    if images_dir:
+        for root, _, files in os.walk(images_dir):
+            for filename in sorted(files):
+                if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
+                    img = Image.open(os.path.join(root, filename)).convert('RGB').resize(IMG_SIZE)
+                    images.append(np.asarray(img))
+                if len(images) >= batch_size * num_batches:
+                    break
+            if len(images) >= batch_size * num_batches:
+                break
+    while len(images) < batch_size * num_batches:
+        # Smooth random patterns are closer to fabric than pure noise
+        coarse = rng.integers(0, 255, (8, 8, 3), dtype=np.uint8)
+        images.append(np.asarray(Image.fromarray(coarse).resize(IMG_SIZE, Image.BICUBIC)))
+    stacked = np.stack(images[:batch_size * num_batches])
+    return list(stacked.reshape(num_batches, batch_size, *stacked.shape[1:]))
+
+
+def keras_generator_augment():
+    """Per-image augmentation exactly as ImageDataGenerator's iterator does it"""
+    from tensorflow.keras.preprocessing.image import ImageDataGenerator
+    datagen = ImageDataGenerator(rescale=1. / 255, fill_mode='nearest', **GENERATOR_SETTINGS)
+    np.random.seed(SEED)
+
+    def augment(batch: np.ndarray) -> np.ndarray:
+        out = np.empty(batch.shape, dtype=np.float32)
+        for i, image in enumerate(batch.astype(np.float32)):
+            params = datagen.get_random_transform(image.shape)
+            out[i] = datagen.standardize(datagen.apply_transform(image, params))
+        return out
+    return augment
+
+
+def benchmark(augment: Callable[[np.ndarray], np.ndarray], batches: List[np.ndarray]) -> float:
+    """Images per second, after one warm-up batch"""
+    augment(batches[0])
+    started = time.perf_counter()
+    for batch in batches:
+        augment(batch)
+    return sum(len(batch) for batch in batches) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-image vs vectorized augmentation")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--batches", type=int, default=20)
+    parser.add_argument("--images-dir", help="Benchmark on real images instead of synthetic ones")
+    args = parser.parse_args()
+
+    batches = load_batches(args.images_dir, args.batch_size, args.batches)
+    augmentation = BatchAugmentation(**GENERATOR_SETTINGS, seed=SEED)
+    candidates = {"vectorized (numpy)": augmentation.augment}
+    try:
+        candidates = {
+            "ImageDataGenerator": keras_generator_augment(),
+            **candidates,
+            "vectorized (in-graph)": lambda batch: augmentation.augment(batch, in_graph=True)
+        }
+    except ImportError:
+        print("⚠️ TensorFlow is not installed, benchmarking the NumPy path only")
+
+    print(f"🚀 Augmenting {args.batches} batches of {args.batch_size} at {IMG_SIZE[0]}x{IMG_SIZE[1]}")
+    results = {}
+    for name, augment in candidates.items():
+        results[name] = benchmark(augment, batches)
+        print(f"  {name:24s} {results[name]:9.1f} images/s")
+
+    if "ImageDataGenerator" in results:
+        baseline = results["ImageDataGenerator"]
+        for name, rate in results.items():
+            if name != "ImageDataGenerator":
+                print(f"⚡ {name}: {rate / baseline:.1f}x the ImageDataGenerator throughput")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the building blocks of main.py, separate from
+end-to-end API load tests.
+
+Components:
+    preprocess/<format>/<WxH>   preprocess_image on JPEG, PNG, RGBA PNG and
+                                palette PNG uploads of several sizes
+    forward/<backend>/b<N>      one backend.predict call per batch size
+    topk                        top_k_predictions on one probability vector
+    serialize/<codec>/<shape>   /predict and /predict-batch bodies as JSON
+                                (orjson or stdlib) and MessagePack
+
+Every component is warmed up, then timed over repeated trials; each trial
+runs enough calls to last at least --min-trial-ms so timer resolution does
+not matter. Results are written as versioned JSON with the environment they
+came from, and `compare` flags components whose median got slower by more
+than a threshold.
+
+Usage:
+    python benchmark_components.py run                            # writes benchmarks/components-<time>.json
+    python benchmark_components.py run --backends keras,tflite --batch-sizes 1,8,32
+    python benchmark_components.py run --only preprocess,topk     # no model needed
+    python benchmark_components.py compare baseline.json new.json --threshold 0.10
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+
+import main as service
+
+SCHEMA_VERSION = 1
+COMPONENTS = ("preprocess", "forward", "topk", "serialize")
+IMAGE_SIZES = ((160, 160), (640, 480), (1920, 1080), (4032, 3024))
+IMAGE_FORMATS = ("jpeg", "png", "rgba", "palette")
+
+
+def _ints(text: str):
+    return [int(v) for v in text.split(",") if v.strip()]
+
+
+def time_component(fn: Callable[[], Any], trials: int, warmup: int, min_trial_ms: float) -> Dict[str, Any]:
+    """Summary statistics of the per-call time of `fn` in milliseconds"""
+    for _ in range(warmup):
+        fn()
+    # Calls per trial so one trial takes at least min_trial_ms
+    started = time.perf_counter()
+    fn()
+    single = max(time.perf_counter() - started, 1e-7)
+    number = max(1, int(min_trial_ms / 1000 / single))
+
+    samples = []
+    for _ in range(trials):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - started) * 1000 / number)
+    quartiles = statistics.quantiles(samples, n=4) if len(samples) > 1 else [samples[0]] * 3
+    return {
+        "median_ms": statistics.median(samples),
+        "mean_ms": statistics.fmean(samples),
+        "stdev_ms": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "min_ms": min(samples),
+        "p95_ms": float(np.percentile(samples, 95)),
+        "iqr_ms": quartiles[2] - quartiles[0],
+        "trials": trials,
+        "calls_per_trial": number
+    }
+
+
+def sample_image(fmt: str, size) -> bytes:
+    """An encoded upload with batik-like texture rather than flat colour"""
+    rng = np.random.default_rng(42)
+    coarse = rng.integers(0, 255, (24, 32, 3), dtype=np.uint8)
+    img = Image.fromarray(coarse).resize(size, Image.BICUBIC)
+    buffer = io.BytesIO()
+    if fmt == "jpeg":
+        img.save(buffer, format="JPEG", quality=90)
+    elif fmt == "png":
+        img.save(buffer, format="PNG")
+    elif fmt == "rgba":
+        img.putalpha(200)
+        img.save(buffer, format="PNG")
+    elif fmt == "palette":
+        img.quantize(colors=64).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def bench_preprocess(args, record):
+    for fmt in IMAGE_FORMATS:
+        for size in IMAGE_SIZES:
+            data = sample_image(fmt, size)
+            out = np.empty((*service.IMG_SIZE, 3), dtype=np.float32)
+            record(f"preprocess/{fmt}/{size[0]}x{size[1]}",
+                   lambda: service.preprocess_image(data, out),
+                   {"upload_bytes": len(data)})
+
+
+def bench_forward(args, record):
+    for name in args.backends.split(","):
+        try:
+            runtime = service.BACKENDS[name]()
+            runtime.load()
+        except Exception as e:
+            print(f"⚠️ Skipping backend {name}: {e}")
+            continue
+        for batch_size in _ints(args.batch_sizes):
+            batch = np.random.default_rng(0).random((batch_size, *runtime.input_size, 3), dtype=np.float32)
+            record(f"forward/{name}/b{batch_size}", lambda: runtime.predict(batch),
+                   {"images": batch_size})
+
+
+def bench_topk(args, record):
+    probabilities = np.random.default_rng(0).dirichlet(np.ones(service.NUM_CLASSES)).astype(np.float32)
+    record("topk", lambda: service.top_k_predictions(probabilities))
+
+
+def bench_serialize(args, record):
+    rng = np.random.default_rng(0)
+    top = service.top_k_predictions(rng.dirichlet(np.ones(service.NUM_CLASSES)).astype(np.float32))
+    single = {"predicted_class": top[0]["class"], "confidence": top[0]["confidence"], "all_predictions": top}
+    batch = {"predictions": [
+        {"filename": f"image{i}.jpg", "predicted_class": top[0]["class"],
+         "confidence": top[0]["confidence"], "success": True}
+        for i in range(service.BATCH_MAX_FILES)
+    ]}
+    codecs = {
+        "json": lambda content: json.dumps(content, ensure_ascii=False).encode("utf-8"),
+        "fastjson": service.dumps_json
+    }
+    if service.msgpack is not None:
+        codecs["msgpack"] = lambda content: service.msgpack.packb(content, use_bin_type=True)
+    for codec, encode in codecs.items():
+        for shape, content in (("predict", single), ("batch", batch)):
+            record(f"serialize/{codec}/{shape}", lambda: encode(content),
+                   {"bytes": len(encode(content))})
+
+
+def environment() -> Dict[str, Any]:
+    """What the numbers depend on, so only like-for-like runs get compared"""
+    from importlib.metadata import PackageNotFoundError, version
+
+    def package_version(name):
+        try:
+            return version(name)
+        except PackageNotFoundError:
+            return None
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pillow": Image.__version__,
+        "tensorflow": package_version("tensorflow"),
+        "tflite_runtime": package_version("tflite-runtime"),
+        "orjson": package_version("orjson"),
+        "inference_threads": {
+            "intra_op": service.TF_INTRA_OP_THREADS,
+            "inter_op": service.TF_INTER_OP_THREADS,
+            "tflite": service.INFERENCE_THREADS
+        }
+    }
+
+
+def run(args) -> str:
+    service.class_names = service.load_batik_names()
+    results = {}
+
+    def record(name: str, fn: Callable[[], Any], extra: Optional[Dict[str, Any]] = None):
+        stats = time_component(fn, args.trials, args.warmup, args.min_trial_ms)
+        stats.update(extra or {})
+        results[name] = stats
+        print(f"  {name:32s} median {stats['median_ms']:9.3f} ms  "
+              f"p95 {stats['p95_ms']:9.3f} ms  iqr {stats['iqr_ms']:7.3f} ms")
+
+    selected = args.only.split(",") if args.only else COMPONENTS
+    benches = {"preprocess": bench_preprocess, "forward": bench_forward,
+               "topk": bench_topk, "serialize": bench_serialize}
+    for component in selected:
+        print(f"⏱️ {component}")
+        benches[component](args, record)
+
+    report = {
+        "schema_version": SCHEMA_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "model_version": (service.file_version(service.MODEL_PATH)
+                          if os.path.exists(service.MODEL_PATH) else None),
+        "environment": environment(),
+        "settings": {"trials": args.trials, "warmup": args.warmup, "min_trial_ms": args.min_trial_ms,
+                     "backends": args.backends, "batch_sizes": args.batch_sizes},
+        "results": results
+    }
+    output = args.output or os.path.join(
+        "benchmarks", f"components-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ {len(results)} components written to {output}")
+    return output
+
+
+def load_report(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        report = json.load(f)
+    if report.get("schema_version") != SCHEMA_VERSION:
+        raise ValueError(f"{path} has schema version {report.get('schema_version')}, expected {SCHEMA_VERSION}")
+    return report
+
+
+def compare(baseline_path: str, candidate_path: str, threshold: float) -> List[str]:
+    """Print a side-by-side table and return the components that regressed"""
+    baseline, candidate = load_report(baseline_path), load_report(candidate_path)
+    for key in ("cpu_count", "platform", "tensorflow"):
+        if baseline["environment"].get(key) != candidate["environment"].get(key):
+            print(f"⚠️ Different {key}: {baseline['environment'].get(key)} vs "
+                  f"{candidate['environment'].get(key)}, numbers may not be comparable")
+
+    regressions = []
+    print(f"{'component':34s} {'baseline':>10s} {'candidate':>10s} {'change':>8s}")
+    for name in sorted(set(baseline["results"]) | set(candidate["results"])):
+        old, new = baseline["results"].get(name), candidate["results"].get(name)
+        if old is None or new is None:
+            print(f"{name:34s} {'only in ' + ('candidate' if old is None else 'baseline'):>30s}")
+            continue
+        change = new["median_ms"] / old["median_ms"] - 1
+        # A slowdown within the baseline's own spread is noise, not a regression
+        regressed = change > threshold and new["median_ms"] - old["median_ms"] > old["iqr_ms"]
+        flag = "❌" if regressed else ("⚡" if change < -threshold else "")
+        print(f"{name:34s} {old['median_ms']:9.3f}ms {new['median_ms']:9.3f}ms {change:+7.1%} {flag}")
+        if regressed:
+            regressions.append(name)
+
+    if regressions:
+        print(f"❌ {len(regressions)} component(s) slower by more than {threshold:.0%}: {', '.join(regressions)}")
+    else:
+        print(f"✅ No regressions beyond {threshold:.0%}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Component micro-benchmarks for preprocessing and inference")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Benchmark components and write a JSON report")
+    run_parser.add_argument("--only", help=f"Comma-separated subset of {','.join(COMPONENTS)}")
+    run_parser.add_argument("--backends", default=service.INFERENCE_BACKEND,
+                            help=f"Comma-separated backends to time ({','.join(service.BACKENDS)})")
+    run_parser.add_argument("--batch-sizes", default="1,4,8,16,32")
+    run_parser.add_argument("--trials", type=int, default=20)
+    run_parser.add_argument("--warmup", type=int, default=3)
+    run_parser.add_argument("--min-trial-ms", type=float, default=20.0)
+    run_parser.add_argument("--output", help="Report path (default: benchmarks/components-<time>.json)")
+
+    compare_parser = commands.add_parser("compare", help="Flag regressions between two reports")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.add_argument("--threshold", type=float, default=0.10,
+                                help="Relative median slowdown counted as a regression")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    else:
+        sys.exit(1 if compare(args.baseline, args.candidate, args.threshold) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Fuse several GA-trained models into one shared-backbone ensemble for
+`INFERENCE_BACKEND=ensemble`.
+
+Every model `GeneticAlgorithm.build_model_from_individual` produces is the
+frozen ImageNet MobileNetV2 (plus a Resizing layer for smaller input genes)
+followed by a small head. This script checks that the members really share
+that backbone (same layers, same weights), keeps one copy of it and attaches
+all heads to its output, so serving runs the backbone once per image and
+every head in the same batched call. The fused model outputs
+(batch, heads, classes); main.py combines the heads with ENSEMBLE_COMBINE.
+
+Usage:
+    python build_ensemble.py ensemble_heads/*.keras
+    python build_ensemble.py final_tuned_genetic_algorithm_model.keras ensemble_heads/*.keras --output ensemble_model.keras
+"""
+
+import os
+import json
+import hashlib
+import argparse
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+import main as service
+
+
+def load_member(path: str):
+    """Load a member model; the served model goes through main.py's fallbacks"""
+    if os.path.abspath(path) == os.path.abspath(service.MODEL_PATH):
+        if not service.load_model_with_fallback():
+            raise RuntimeError(f"Model could not be loaded: {service.model_loading_error}")
+        return service.model
+    return service.load_tensorflow().keras.models.load_model(path, compile=False)
+
+
+def split_backbone(model) -> Tuple[List[Any], List[Any]]:
+    """
+    Split a GA model into (backbone layers, head layers).
+
+    The backbone is everything up to and including the nested MobileNetV2
+    model, i.e. an optional Resizing layer and the feature extractor.
+    """
+    tf = service.load_tensorflow()
+    for i, layer in enumerate(model.layers):
+        if isinstance(layer, tf.keras.Model):
+            return model.layers[:i + 1], model.layers[i + 1:]
+    raise ValueError(f"{model.name} has no nested backbone model to share")
+
+
+def backbone_signature(layers) -> str:
+    """Hash of the backbone's layer configuration and weights"""
+    digest = hashlib.sha256()
+    for layer in layers:
+        config = layer.get_config()
+        config.pop("name", None)
+        digest.update(json.dumps(config, sort_keys=True, default=str).encode())
+        for weight in layer.get_weights():
+            digest.update(np.ascontiguousarray(weight).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def copy_layer(layer, name: str):
+    """A fresh copy of `layer` under a unique name, sharing no state with it"""
+    config = layer.get_config()
+    config["name"] = name
+    return layer.__class__.from_config(config)
+
+
+def build_ensemble(member_paths: List[str], output_path: str) -> Dict[str, Any]:
+    """Fuse the members sharing the first member's backbone and save the result"""
+    tf = service.load_tensorflow()
+    backbone = None
+    signature = None
+    heads = []
+    for path in member_paths:
+        print(f"🔄 Loading {path}...")
+        model = load_member(path)
+        backbone_layers, head_layers = split_backbone(model)
+        member_signature = backbone_signature(backbone_layers)
+        if signature is None:
+            backbone, signature = backbone_layers, member_signature
+        elif member_signature != signature:
+            print(f"⚠️ Skipping {path}: its backbone differs from {member_paths[0]} "
+                  f"(different alpha/input_size gene or a fine-tuned backbone)")
+            continue
+        heads.append((path, head_layers))
+        print(f"✅ {path}: head of {len(head_layers)} layers, "
+              f"{sum(int(np.prod(w.shape)) for layer in head_layers for w in layer.get_weights()):,} parameters")
+
+    if len(heads) < 2:
+        raise ValueError(f"Need at least two members with a shared backbone, got {len(heads)}")
+
+    inputs = tf.keras.Input(shape=(*service.IMG_SIZE, 3), name="images")
+    features = inputs
+    for layer in backbone:
+        features = layer(features, training=False)
+
+    outputs = []
+    for i, (_, head_layers) in enumerate(heads):
+        x = features
+        for layer in head_layers:
+            head_layer = copy_layer(layer, f"head{i}_{layer.name}")
+            x = head_layer(x)
+            head_layer.set_weights(layer.get_weights())
+        outputs.append(tf.keras.layers.Reshape((1, x.shape[-1]), name=f"head{i}_probabilities")(x))
+    stacked = tf.keras.layers.Concatenate(axis=1, name="head_probabilities")(outputs)
+    ensemble = tf.keras.Model(inputs, stacked, name="shared_backbone_ensemble")
+
+    # The fused model must reproduce every member exactly
+    probe = np.random.default_rng(0).random((2, *service.IMG_SIZE, 3), dtype=np.float32)
+    fused = ensemble.predict(probe, verbose=0)
+    for i, (path, _) in enumerate(heads):
+        reference = load_member(path).predict(probe, verbose=0)
+        max_diff = float(np.max(np.abs(fused[:, i] - reference)))
+        if max_diff > 1e-4:
+            raise RuntimeError(f"Head {i} ({path}) differs from its source model by {max_diff:.2e}")
+
+    ensemble.save(output_path)
+    manifest = {
+        "members": [path for path, _ in heads],
+        "backbone_signature": signature,
+        "num_heads": len(heads),
+        "size_mb": round(os.path.getsize(output_path) / (1024 * 1024), 2)
+    }
+    with open(os.path.splitext(output_path)[0] + ".json", 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    members_mb = sum(os.path.getsize(path) for path, _ in heads) / (1024 * 1024)
+    print(f"✅ Saved {output_path}: {len(heads)} heads on one backbone, "
+          f"{manifest['size_mb']:.2f} MB (members: {members_mb:.2f} MB)")
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fuse GA-trained models into a shared-backbone ensemble")
+    parser.add_argument("members", nargs="+", help=".keras models from the GA (same alpha and input_size genes)")
+    parser.add_argument("--output", default=service.ENSEMBLE_MODEL_PATH)
+    args = parser.parse_args()
+    build_ensemble(args.members, args.output)
+    print("🔍 Serve it with INFERENCE_BACKEND=ensemble, compare with "
+          "INFERENCE_BACKEND=ensemble python evaluate_model.py <test set>")
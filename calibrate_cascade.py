@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Pick the cascade threshold (CASCADE_THRESHOLD) from a labelled validation set.
+
+Runs the small first-stage model and the full model over every image once,
+then evaluates every candidate threshold in one vectorized pass: images
+whose stage-1 confidence reaches the threshold take the stage-1 answer, the
+rest the full model's. The chosen threshold is the lowest one (i.e. the one
+sending the most traffic to stage 1) whose cascade accuracy meets the target.
+
+Usage:
+    python calibrate_cascade.py data/val --stage1-model batik_student.keras --max-accuracy-drop 0.005
+    python calibrate_cascade.py data/val --stage1-model batik_student.tflite --target-accuracy 0.90
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import evaluate_model
+
+
+def collect_predictions(source, service, stage1, batch_size, workers):
+    """Return (labels, stage-1 probabilities, full-model probabilities, timings)"""
+    label_index = evaluate_model.build_label_index(evaluate_model.list_labels(source), service.class_names)
+    labels, probs1, probs2 = [], [], []
+    time1 = time2 = 0.0
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for batch in evaluate_model._batched(evaluate_model.iter_labelled_samples(source), batch_size):
+            arrays, kept, _ = evaluate_model._decode_batch(pool, service.preprocess_image, batch)
+            kept_arrays = [a for a, s in zip(arrays, kept) if s[0] in label_index]
+            kept = [s for s in kept if s[0] in label_index]
+            if not kept:
+                continue
+            inputs = np.concatenate(kept_arrays, axis=0)
+
+            t0 = time.perf_counter()
+            probs1.append(stage1.predict(service.resize_batch(inputs, stage1.input_size)))
+            t1 = time.perf_counter()
+            probs2.append(service.backend.predict(inputs))
+            t2 = time.perf_counter()
+            time1 += t1 - t0
+            time2 += t2 - t1
+            labels.extend(label_index[s[0]] for s in kept)
+
+    return np.asarray(labels), np.concatenate(probs1), np.concatenate(probs2), (time1, time2)
+
+
+def threshold_curve(labels, probs1, probs2):
+    """Cascade accuracy and stage-1 share for every distinct stage-1 confidence"""
+    confidence = probs1.max(axis=1)
+    correct1 = np.argmax(probs1, axis=1) == labels
+    correct2 = np.argmax(probs2, axis=1) == labels
+
+    # Sort by confidence, highest first: threshold = confidence[i] sends the
+    # first i + 1 images to stage 1 and the rest to stage 2
+    order = np.argsort(-confidence, kind="stable")
+    confidence, correct1, correct2 = confidence[order], correct1[order], correct2[order]
+    n = len(labels)
+    stage1_correct = np.cumsum(correct1)
+    stage2_correct = correct2.sum() - np.cumsum(correct2)
+    accuracy = (stage1_correct + stage2_correct) / n
+
+    # Ties: only the last index of each confidence value is a real threshold
+    last_of_value = np.append(confidence[1:] != confidence[:-1], True)
+    thresholds = confidence[last_of_value]
+    return {
+        "thresholds": thresholds,
+        "accuracy": accuracy[last_of_value],
+        "stage1_fraction": (np.flatnonzero(last_of_value) + 1) / n,
+        "full_model_accuracy": float(correct2.mean()),
+        "stage1_accuracy": float(correct1.mean())
+    }
+
+
+def choose_threshold(curve, target_accuracy):
+    """Lowest threshold whose cascade accuracy meets the target, or None"""
+    meets = np.flatnonzero(curve["accuracy"] >= target_accuracy)
+    if len(meets) == 0:
+        return None
+    # Thresholds are in descending order; the last qualifying one is the lowest
+    best = meets[-1]
+    return {
+        "threshold": float(curve["thresholds"][best]),
+        "accuracy": float(curve["accuracy"][best]),
+        "stage1_fraction": float(curve["stage1_fraction"][best])
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Choose the cascade confidence threshold")
+    parser.add_argument("source", help="Labelled validation directory or tar shard")
+    parser.add_argument("--stage1-model", required=True, help="Small first-stage model (.keras or .tflite)")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--target-accuracy", type=float, help="Absolute cascade accuracy to meet")
+    target.add_argument("--max-accuracy-drop", type=float, default=0.005,
+                        help="Allowed accuracy loss versus the full model (default 0.005)")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    # The full model is loaded through the serving code path; the cascade
+    # itself must stay off so the full model's probabilities are unbiased
+    os.environ.pop("CASCADE_MODEL_PATH", None)
+    import main as service
+
+    if not service.load_model_and_classes():
+        print(f"❌ Model could not be loaded: {service.model_loading_error}", file=sys.stderr)
+        sys.exit(2)
+    stage1 = service.backend_for_path(args.stage1_model)
+    stage1.load()
+
+    print(f"🔍 Running both models on {args.source}...", file=sys.stderr)
+    labels, probs1, probs2, (time1, time2) = collect_predictions(
+        args.source, service, stage1, args.batch_size, args.workers)
+    if len(labels) == 0:
+        print("❌ No labelled images found", file=sys.stderr)
+        sys.exit(2)
+
+    curve = threshold_curve(labels, probs1, probs2)
+    target_accuracy = (args.target_accuracy if args.target_accuracy is not None
+                       else curve["full_model_accuracy"] - args.max_accuracy_drop)
+    chosen = choose_threshold(curve, target_accuracy)
+
+    # Expected per-image cost relative to always running the full model
+    cost1, cost2 = time1 / len(labels), time2 / len(labels)
+    if chosen:
+        expected = cost1 + (1 - chosen["stage1_fraction"]) * cost2
+        chosen["expected_speedup"] = cost2 / expected if expected else None
+
+    step = max(1, len(curve["thresholds"]) // 50)
+    report = {
+        "num_images": int(len(labels)),
+        "stage1_model": args.stage1_model,
+        "full_model_accuracy": curve["full_model_accuracy"],
+        "stage1_accuracy": curve["stage1_accuracy"],
+        "target_accuracy": target_accuracy,
+        "chosen": chosen,
+        "stage1_ms_per_image": 1000 * cost1,
+        "full_model_ms_per_image": 1000 * cost2,
+        "curve": [
+            {"threshold": float(t), "accuracy": float(a), "stage1_fraction": float(f)}
+            for t, a, f in zip(curve["thresholds"][::step], curve["accuracy"][::step],
+                               curve["stage1_fraction"][::step])
+        ]
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if chosen is None:
+        print(f"❌ No threshold reaches accuracy {target_accuracy:.4f}", file=sys.stderr)
+        sys.exit(1)
+    print(f"✅ CASCADE_THRESHOLD={chosen['threshold']:.4f}: accuracy {chosen['accuracy']:.4f}, "
+          f"{chosen['stage1_fraction']:.1%} answered by stage 1", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
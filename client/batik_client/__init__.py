@@ -0,0 +1,8 @@
+"""
+Python client for the Batik Classification API.
+"""
+
+from .client import BatikAPIError, BatikClient
+
+__all__ = ["BatikAPIError", "BatikClient"]
+__version__ = "0.1.0"
@@ -0,0 +1,242 @@
+"""
+Async client for the Batik Classification API.
+"""
+
+import io
+import os
+import random
+import asyncio
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import httpx
+from PIL import Image
+
+ImageInput = Union[bytes, str, "os.PathLike[str]", Image.Image]
+
+MAX_BATCH_SIZE = 10  # /predict-batch limit
+
+
+class BatikAPIError(Exception):
+    """A request the API rejected (any 4xx/5xx left after retries)"""
+
+    def __init__(self, status_code: int, detail: Any):
+        super().__init__(f"HTTP {status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+
+class BatikClient:
+    """
+    Async client with a pooled keep-alive connection, a concurrency limit,
+    retries with exponential backoff on 503 (model still loading) and
+    connection errors, and automatic batching into `/predict-batch`.
+
+    With `resize=True` images are resized on the client to the input size
+    the server advertises in `/model-info` and uploaded as small JPEGs; the
+    server recognizes uploads of that size and does not resize them again.
+    The pixels differ slightly from a server-side resize of the original
+    (draft decoding and JPEG re-encoding), so use `resize=False` when results
+    must match uploading the original file exactly.
+
+    Usage:
+        async with BatikClient("http://localhost:8000") as client:
+            await client.wait_until_ready()
+            result = await client.predict("kawung.jpg")
+            results = await client.predict_many(paths)
+    """
+
+    def __init__(self,
+                 base_url: str = "http://localhost:8000",
+                 max_connections: int = 10,
+                 max_concurrency: int = 8,
+                 timeout: float = 30.0,
+                 retries: int = 5,
+                 backoff: float = 0.5,
+                 max_backoff: float = 10.0,
+                 resize: bool = True,
+                 jpeg_quality: int = 95,
+                 batch_size: int = MAX_BATCH_SIZE,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        """
+        Args:
+            base_url: API root URL.
+            max_connections: Size of the keep-alive connection pool.
+            max_concurrency: Requests in flight at once.
+            timeout: Per-request timeout in seconds.
+            retries: Attempts after the first one on 503 or connection errors.
+            backoff: First retry delay in seconds; doubles per attempt, with jitter.
+            max_backoff: Upper bound for one retry delay.
+            resize: Resize images client-side to the server's input size.
+            jpeg_quality: JPEG quality of resized uploads.
+            batch_size: Images per `/predict-batch` call (at most 10).
+            transport: Custom httpx transport, e.g. for tests.
+        """
+        self.base_url = base_url.rstrip("/")
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.resize = resize
+        self.jpeg_quality = jpeg_quality
+        self.batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+        self.max_concurrency = max_concurrency
+        # Created on first use, inside the running event loop (on Python 3.9
+        # a semaphore binds to the loop that is current when it is created)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._http = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections),
+            transport=transport
+        )
+        self._model_info: Optional[Dict[str, Any]] = None
+
+    async def __aenter__(self) -> "BatikClient":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        await self._http.aclose()
+
+    async def _request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """Send a request, retrying 503s and connection errors with backoff"""
+        for attempt in range(self.retries + 1):
+            retry_after = None
+            try:
+                if self._semaphore is None:
+                    self._semaphore = asyncio.Semaphore(self.max_concurrency)
+                async with self._semaphore:
+                    response = await self._http.request(method, path, **kwargs)
+                if response.status_code != 503:
+                    if response.status_code >= 400:
+                        try:
+                            detail = response.json().get("detail", response.text)
+                        except ValueError:
+                            detail = response.text
+                        raise BatikAPIError(response.status_code, detail)
+                    return response
+                if attempt == self.retries:
+                    raise BatikAPIError(503, response.text)
+                retry_after = response.headers.get("Retry-After")
+            except httpx.TransportError:
+                if attempt == self.retries:
+                    raise
+
+            delay = min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, float(retry_after))
+            await asyncio.sleep(delay)
+
+    async def health(self) -> Dict[str, Any]:
+        return (await self._request("GET", "/health")).json()
+
+    async def wait_until_ready(self, timeout: float = 300.0, interval: float = 2.0):
+        """Poll /readyz until the model is loaded and warmed up"""
+        deadline = asyncio.get_running_loop().time() + timeout
+        while True:
+            try:
+                response = await self._http.get("/readyz")
+                if response.status_code == 200:
+                    return response.json()
+            except httpx.TransportError:
+                pass
+            if asyncio.get_running_loop().time() >= deadline:
+                raise TimeoutError(f"API at {self.base_url} not ready after {timeout:.0f}s")
+            await asyncio.sleep(interval)
+
+    async def model_info(self, refresh: bool = False) -> Dict[str, Any]:
+        """`/model-info`, cached after the first call"""
+        if self._model_info is None or refresh:
+            self._model_info = (await self._request("GET", "/model-info")).json()
+        return self._model_info
+
+    async def input_size(self):
+        """(width, height) the server classifies at"""
+        info = await self.model_info()
+        size = info.get("input_size") or info["input_shape"][:2]
+        return int(size[1]), int(size[0])
+
+    async def prepare(self, image: ImageInput, filename: Optional[str] = None):
+        """Return (filename, upload bytes, content type), resizing on the client if enabled"""
+        if isinstance(image, (str, os.PathLike)):
+            filename = filename or os.path.basename(os.fspath(image))
+        filename = filename or "image.jpg"
+        if not self.resize:
+            data = await asyncio.to_thread(_read_bytes, image)
+            return filename, data, _content_type(filename)
+
+        size = await self.input_size()
+        data = await asyncio.to_thread(_resize_to_jpeg, image, size, self.jpeg_quality)
+        return os.path.splitext(filename)[0] + ".jpg", data, "image/jpeg"
+
+    async def predict(self, image: ImageInput, filename: Optional[str] = None) -> Dict[str, Any]:
+        """Classify one image with `/predict` (top-10 predictions)"""
+        name, data, content_type = await self.prepare(image, filename)
+        response = await self._request("POST", "/predict", files={"file": (name, data, content_type)})
+        return response.json()
+
+    async def predict_many(self, images: Sequence[ImageInput],
+                           filenames: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Classify many images via concurrent `/predict-batch` calls.
+
+        Results are in input order. Images the server could not classify
+        have an "error" entry instead of raising.
+        """
+        filenames = list(filenames) if filenames is not None else [None] * len(images)
+        prepared = await asyncio.gather(*(self.prepare(image, name) for image, name in zip(images, filenames)))
+
+        async def send(chunk):
+            files = [("files", item) for item in chunk]
+            response = await self._request("POST", "/predict-batch", files=files)
+            return response.json()["predictions"]
+
+        chunks = [prepared[i:i + self.batch_size] for i in range(0, len(prepared), self.batch_size)]
+        results = await asyncio.gather(*(send(chunk) for chunk in chunks))
+        return [prediction for chunk in results for prediction in chunk]
+
+
+def _read_bytes(image: ImageInput) -> bytes:
+    if isinstance(image, bytes):
+        return image
+    if isinstance(image, Image.Image):
+        buffer = io.BytesIO()
+        image.convert("RGB").save(buffer, format="PNG")
+        return buffer.getvalue()
+    with open(image, "rb") as f:
+        return f.read()
+
+
+def _resize_to_jpeg(image: ImageInput, size, quality: int) -> bytes:
+    """
+    Shrink to the model input size with PIL's default filter and encode as JPEG.
+
+    Close to, but not pixel-identical with, the server resizing the original:
+    large JPEGs are first downscaled by the decoder (`draft`), and the result
+    is re-encoded lossily.
+    """
+    if isinstance(image, Image.Image):
+        img = image
+    else:
+        img = Image.open(io.BytesIO(_read_bytes(image)))
+        # Let the JPEG decoder shrink large photos while decoding
+        img.draft("RGB", (size[0] * 2, size[1] * 2))
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    if img.size != tuple(size):
+        img = img.resize(tuple(size))
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def _content_type(filename: str) -> str:
+    extension = os.path.splitext(filename)[1].lower()
+    return {
+        ".png": "image/png",
+        ".bmp": "image/bmp",
+        ".gif": "image/gif",
+        ".webp": "image/webp"
+    }.get(extension, "image/jpeg")
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Find near-duplicate images within and across the train/val/test splits and
+write a deduplicated manifest for the training loaders.
+
+Every image is hashed (64-bit perceptual hash of the image at the model
+input size, see image_hash.py) in parallel worker processes. Pairs within
+--max-distance bits are found with a Hamming index, linked into clusters,
+and each cluster keeps a single image: the one in the first split of
+--keep-order (test, then val, then train by default, so evaluation sets stay
+intact and their copies leave the training set), then the largest, then by
+path. Clusters whose images carry different class labels are reported for
+review.
+
+Outputs:
+    dedup_manifest.json     kept images per split, removed images with the
+                            image they duplicate, cluster statistics
+    image_hash_index.npz    hash index of the kept images; main.py loads it
+                            (IMAGE_HASH_INDEX_PATH) to recognise uploads that
+                            are near-duplicates of dataset images
+
+Usage:
+    python dedup_dataset.py data/splits/dataset_split
+    python dedup_dataset.py data/splits/dataset_split --max-distance 4 --workers 16
+    python dedup_dataset.py data/splits/dataset_split --keep-order test,val,train --dry-run
+"""
+
+import os
+import json
+import time
+import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from image_hash import HammingIndex, clusters, hash_to_hex, phash
+
+MANIFEST_VERSION = 1
+DEFAULT_SPLITS = ("train", "val", "test")
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp')
+IMG_SIZE = (160, 160)  # main.IMG_SIZE, without importing the service
+
+
+def list_split_images(base_dir: str, splits) -> List[Dict[str, Any]]:
+    """One record per image under `base_dir/<split>/<class name>/`"""
+    images = []
+    for split in splits:
+        split_dir = os.path.join(base_dir, split)
+        if not os.path.isdir(split_dir):
+            print(f"⚠️ No {split} directory in {base_dir}, skipping")
+            continue
+        for label in sorted(os.listdir(split_dir)):
+            class_dir = os.path.join(split_dir, label)
+            if not os.path.isdir(class_dir):
+                continue
+            for filename in sorted(os.listdir(class_dir)):
+                if filename.lower().endswith(IMAGE_EXTENSIONS):
+                    images.append({"path": os.path.join(split, label, filename), "label": label, "split": split})
+    return images
+
+
+def hash_image_file(path: str) -> Tuple[Optional[int], int, Optional[str]]:
+    """(hash, pixel count, error) of one image, resized like preprocess_image does"""
+    try:
+        with Image.open(path) as img:
+            pixels = img.width * img.height
+            return phash(np.asarray(img.convert('RGB').resize(IMG_SIZE))), pixels, None
+    except Exception as e:
+        return None, 0, str(e)
+
+
+def hash_images(base_dir: str, images: List[Dict[str, Any]], workers: int) -> List[Dict[str, Any]]:
+    """Hash all images in parallel; returns the records that could not be read"""
+    paths = [os.path.join(base_dir, image["path"]) for image in images]
+    failures = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for image, (value, pixels, error) in zip(images, pool.map(hash_image_file, paths, chunksize=64)):
+            image["hash"], image["pixels"] = value, pixels
+            if error is not None:
+                failures.append({"path": image["path"], "error": error})
+    return failures
+
+
+def deduplicate(images: List[Dict[str, Any]], max_distance: int, keep_order: List[str]) -> Dict[str, Any]:
+    """Cluster near-duplicates and choose which image of each cluster to keep"""
+    index = HammingIndex(max_distance)
+    for position, image in enumerate(images):
+        index.add(image["hash"], position)
+    pairs = index.pairs()
+    groups = clusters(len(images), pairs)
+    distance = {(i, j): d for i, j, d in pairs}
+
+    rank = {split: i for i, split in enumerate(keep_order)}
+    removed, conflicts = [], []
+    within, across = Counter(), 0
+    for members in groups:
+        keeper = min(members, key=lambda i: (rank.get(images[i]["split"], len(rank)),
+                                             -images[i]["pixels"], images[i]["path"]))
+        splits = {images[i]["split"] for i in members}
+        if len(splits) > 1:
+            across += 1
+        else:
+            within[splits.pop()] += 1
+        labels = sorted({images[i]["label"] for i in members})
+        if len(labels) > 1:
+            conflicts.append({"labels": labels, "paths": sorted(images[i]["path"] for i in members)})
+        for i in members:
+            if i != keeper:
+                images[i]["removed"] = True
+                removed.append({
+                    "path": images[i]["path"],
+                    "split": images[i]["split"],
+                    "duplicate_of": images[keeper]["path"],
+                    # Members are linked through chains, so not every one is a direct pair of the keeper
+                    "distance": distance.get((min(i, keeper), max(i, keeper)))
+                })
+    return {
+        "clusters": len(groups),
+        "clusters_within_split": dict(within),
+        "clusters_across_splits": across,
+        "removed": sorted(removed, key=lambda r: r["path"]),
+        "label_conflicts": conflicts
+    }
+
+
+def write_index(images: List[Dict[str, Any]], max_distance: int, path: str):
+    """Hash index of the kept images with their label and split, for serving"""
+    index = HammingIndex(max_distance)
+    for image in images:
+        if not image.get("removed") and image["hash"] is not None:
+            index.add(image["hash"], {"path": image["path"], "label": image["label"], "split": image["split"]})
+    index.save(path)
+    print(f"✅ Hash index of {len(index)} images written to {path}")
+
+
+def manifest_entries(manifest_path: str, split: str) -> List[Dict[str, str]]:
+    """
+    Kept images of one split as [{"path", "label"}], paths relative to the
+    manifest's base_dir; e.g. pd.DataFrame(...) for flow_from_dataframe.
+    """
+    with open(manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("manifest_version") != MANIFEST_VERSION:
+        raise ValueError(f"{manifest_path} has manifest version {manifest.get('manifest_version')}, "
+                         f"expected {MANIFEST_VERSION}")
+    return manifest["splits"][split]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Near-duplicate detection and dedup manifest for the dataset splits")
+    parser.add_argument("base_dir", help="Directory with train/val/test sub-folders of class folders")
+    parser.add_argument("--splits", default=",".join(DEFAULT_SPLITS))
+    parser.add_argument("--keep-order", default="test,val,train",
+                        help="Split preference for the image kept from each duplicate cluster")
+    parser.add_argument("--max-distance", type=int, default=6,
+                        help="Hamming distance (of 64 bits) at which images count as duplicates")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--output", default="dedup_manifest.json")
+    parser.add_argument("--index", default="image_hash_index.npz",
+                        help="Hash index for main.py (empty to skip)")
+    parser.add_argument("--dry-run", action="store_true", help="Report only, write nothing")
+    args = parser.parse_args()
+
+    splits = [s for s in args.splits.split(",") if s]
+    images = list_split_images(args.base_dir, splits)
+    print(f"🔍 Hashing {len(images)} images with {args.workers} workers...")
+    started = time.perf_counter()
+    failures = hash_images(args.base_dir, images, args.workers)
+    elapsed = time.perf_counter() - started
+    print(f"✅ Hashed in {elapsed:.1f}s ({len(images) / max(elapsed, 1e-9):.0f} images/s)")
+    for failure in failures:
+        print(f"⚠️ Could not read {failure['path']}: {failure['error']}")
+    images = [image for image in images if image["hash"] is not None]
+
+    result = deduplicate(images, args.max_distance, args.keep_order.split(","))
+    counts_before = Counter(image["split"] for image in images)
+    kept = {split: [{"path": image["path"], "label": image["label"]}
+                    for image in images if image["split"] == split and not image.get("removed")]
+            for split in splits}
+
+    print(f"📊 {result['clusters']} duplicate clusters "
+          f"({result['clusters_across_splits']} spanning splits), {len(result['removed'])} images removed")
+    for split in splits:
+        print(f"  {split:6s} {counts_before[split]:6d} -> {len(kept[split]):6d}")
+    if result["label_conflicts"]:
+        print(f"⚠️ {len(result['label_conflicts'])} clusters contain different labels, see label_conflicts")
+
+    if args.dry_run:
+        return
+
+    manifest = {
+        "manifest_version": MANIFEST_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "base_dir": os.path.abspath(args.base_dir),
+        "hash": "phash64",
+        "image_size": list(IMG_SIZE),
+        "max_distance": args.max_distance,
+        "keep_order": args.keep_order.split(","),
+        "counts": {split: {"before": counts_before[split], "after": len(kept[split])} for split in splits},
+        "splits": kept,
+        "hashes": {image["path"]: hash_to_hex(image["hash"]) for image in images},
+        "unreadable": failures,
+        **result
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    print(f"✅ Manifest written to {args.output}")
+    if args.index:
+        write_index(images, args.max_distance, args.index)
+
+
+if __name__ == "__main__":
+    main()
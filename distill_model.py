@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Distill the served (GA-tuned) model into a compact student model.
+
+The teacher's outputs for every training and validation image are computed
+once, with the serving preprocessing, and cached on disk keyed by the
+teacher's checksum and the dataset listing; later runs (other student
+sizes, temperatures, ...) reuse the cache instead of rerunning the teacher.
+The student is a narrow MobileNetV2 trained on a mix of the hard labels and
+the teacher's temperature-softened distribution, exported as a `.keras`
+file that main.py serves directly (in place of MODEL_PATH, or via
+CASCADE_MODEL_PATH as the cascade's first stage).
+
+Usage:
+    python distill_model.py data/train data/val --test-dir data/test
+    python distill_model.py data/train data/val --alpha 0.5 --input-size 128 --output batik_student_050.keras
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import evaluate_model
+import main as service
+
+DEFAULT_CACHE_DIR = "distillation_cache"
+DEFAULT_OUTPUT = "batik_student.keras"
+
+
+def _file_checksum(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def list_images(root: str):
+    """Return (paths, labels) in the alphabetical class order flow_from_directory trains with"""
+    classes = evaluate_model.list_labels(root)
+    paths, labels = [], []
+    for index, label in enumerate(classes):
+        class_dir = os.path.join(root, label)
+        for filename in sorted(os.listdir(class_dir)):
+            if filename.lower().endswith(evaluate_model.IMAGE_EXTENSIONS):
+                paths.append(os.path.join(class_dir, filename))
+                labels.append(index)
+    return paths, np.asarray(labels, dtype=np.int64)
+
+
+def teacher_log_probs(root: str, teacher_checksum: str, cache_dir: str,
+                      batch_size: int = 64, workers: int = 8):
+    """
+    Teacher log-probabilities for every image under `root`, cached on disk.
+
+    The cache file name covers the teacher checksum and every image's path,
+    size and modification time, so a retrained teacher or a changed dataset
+    never reuses stale targets.
+    """
+    paths, labels = list_images(root)
+    listing = hashlib.sha256(teacher_checksum.encode())
+    for path in paths:
+        stat = os.stat(path)
+        listing.update(f"{path}|{stat.st_size}|{stat.st_mtime_ns}\n".encode())
+    cache_path = os.path.join(cache_dir, f"teacher_{listing.hexdigest()[:16]}.npz")
+
+    if os.path.exists(cache_path):
+        print(f"✅ Using cached teacher outputs: {cache_path}")
+        cached = np.load(cache_path)
+        return paths, labels, cached["log_probs"]
+
+    print(f"🔄 Running the teacher over {len(paths)} images in {root}...")
+
+    def read(path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    log_probs = []
+    samples = ((str(label), path, read(path)) for path, label in zip(paths, labels))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for batch in evaluate_model._batched(samples, batch_size):
+            arrays, kept, failures = evaluate_model._decode_batch(pool, service.preprocess_image, batch)
+            if failures:
+                raise RuntimeError(f"Could not decode {failures[0]['sample']}: {failures[0]['error']}")
+            probabilities = service.model.predict(np.concatenate(arrays, axis=0), verbose=0)
+            log_probs.append(np.log(np.clip(probabilities, 1e-8, 1.0)).astype(np.float32))
+    log_probs = np.concatenate(log_probs)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    np.savez_compressed(cache_path, log_probs=log_probs, labels=labels)
+    print(f"✅ Cached teacher outputs: {cache_path}")
+    return paths, labels, log_probs
+
+
+def make_dataset(tf, paths, labels, log_probs, batch_size: int, training: bool):
+    """tf.data pipeline yielding (image, [one-hot label | teacher log-probs])"""
+    num_classes = log_probs.shape[1]
+    targets = np.concatenate([np.eye(num_classes, dtype=np.float32)[labels], log_probs], axis=1)
+
+    def load(path, target):
+        image = tf.io.decode_image(tf.io.read_file(path), channels=3, expand_animations=False)
+        image = tf.image.resize(image, service.IMG_SIZE) / 255.0
+        if training:
+            # The cached teacher targets are for the unaugmented image, so only
+            # label-preserving flips are applied
+            image = tf.image.random_flip_left_right(image)
+        return image, target
+
+    dataset = tf.data.Dataset.from_tensor_slices((paths, targets))
+    if training:
+        dataset = dataset.shuffle(len(paths), seed=42, reshuffle_each_iteration=True)
+    return (dataset.map(load, num_parallel_calls=tf.data.AUTOTUNE)
+            .batch(batch_size)
+            .prefetch(tf.data.AUTOTUNE))
+
+
+def distillation_loss(tf, num_classes: int, temperature: float, hard_label_weight: float):
+    """Hard-label cross-entropy plus T²-scaled KL divergence to the softened teacher"""
+    def loss(y, logits):
+        hard, teacher = y[:, :num_classes], y[:, num_classes:]
+        cross_entropy = tf.keras.losses.categorical_crossentropy(hard, logits, from_logits=True)
+        teacher_log_soft = tf.nn.log_softmax(teacher / temperature)
+        student_log_soft = tf.nn.log_softmax(logits / temperature)
+        kl = tf.reduce_sum(tf.exp(teacher_log_soft) * (teacher_log_soft - student_log_soft), axis=-1)
+        return (hard_label_weight * cross_entropy
+                + (1 - hard_label_weight) * temperature ** 2 * kl)
+    return loss
+
+
+def label_accuracy(tf, num_classes: int):
+    def accuracy(y, logits):
+        return tf.keras.metrics.categorical_accuracy(y[:, :num_classes], logits)
+    return accuracy
+
+
+def build_student(tf, num_classes: int, alpha: float, input_size: int):
+    """
+    Returns (serving model with softmax output, training model with logits output).
+
+    Both share weights. The serving model takes IMG_SIZE images like the
+    teacher and resizes internally when the student runs at a lower resolution.
+    """
+    inputs = tf.keras.Input(shape=(*service.IMG_SIZE, 3))
+    x = inputs
+    if input_size != service.IMG_SIZE[0]:
+        x = tf.keras.layers.Resizing(input_size, input_size)(x)
+    backbone = tf.keras.applications.MobileNetV2(
+        input_shape=(input_size, input_size, 3),
+        include_top=False,
+        weights='imagenet',
+        alpha=alpha
+    )
+    backbone.trainable = False
+    # BatchNorm stays in inference mode, also while fine-tuning
+    x = backbone(x, training=False)
+    x = tf.keras.layers.GlobalAveragePooling2D()(x)
+    x = tf.keras.layers.Dropout(0.2)(x)
+    logits = tf.keras.layers.Dense(num_classes, name='logits')(x)
+    probabilities = tf.keras.layers.Activation('softmax', name='probabilities')(logits)
+    serving_model = tf.keras.Model(inputs, probabilities, name=f'batik_student_{alpha}_{input_size}')
+    training_model = tf.keras.Model(inputs, logits)
+    return serving_model, training_model, backbone
+
+
+def train_student(tf, training_model, backbone, train_ds, val_ds, args, num_classes: int):
+    loss = distillation_loss(tf, num_classes, args.temperature, args.hard_label_weight)
+    metrics = [label_accuracy(tf, num_classes)]
+
+    def callbacks():
+        return [
+            tf.keras.callbacks.EarlyStopping(monitor='val_loss', patience=3, restore_best_weights=True, verbose=1),
+            tf.keras.callbacks.ReduceLROnPlateau(monitor='val_loss', factor=0.5, patience=2, min_lr=1e-6, verbose=1)
+        ]
+
+    print(f"\n==== DISTILASI: HEAD ({args.epochs} epoch) ====")
+    training_model.compile(optimizer=tf.keras.optimizers.Adam(args.learning_rate), loss=loss, metrics=metrics)
+    training_model.fit(train_ds, validation_data=val_ds, epochs=args.epochs, callbacks=callbacks(), verbose=1)
+
+    if args.fine_tune_epochs > 0 and args.fine_tune_layers > 0:
+        print(f"\n==== DISTILASI: FINE-TUNE {args.fine_tune_layers} LAYER TERAKHIR "
+              f"({args.fine_tune_epochs} epoch) ====")
+        backbone.trainable = True
+        for layer in backbone.layers[:-args.fine_tune_layers]:
+            layer.trainable = False
+        training_model.compile(optimizer=tf.keras.optimizers.Adam(args.learning_rate / 10),
+                               loss=loss, metrics=metrics)
+        training_model.fit(train_ds, validation_data=val_ds, epochs=args.fine_tune_epochs,
+                           callbacks=callbacks(), verbose=1)
+
+
+def cpu_latency_ms(tf, keras_model, runs: int = 50) -> float:
+    """Median single-image CPU latency; an untrained CPU clone is timed since weights don't matter"""
+    with tf.device('/CPU:0'):
+        cpu_model = tf.keras.models.clone_model(keras_model)
+        sample = np.random.random((1, *service.IMG_SIZE, 3)).astype('float32')
+        for _ in range(3):
+            cpu_model(sample, training=False)
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            cpu_model(sample, training=False)
+            timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1000)
+
+
+def compare(tf, teacher, student, test_dir: str, args):
+    """Accuracy on `test_dir` (via evaluate_model) plus size and CPU latency of both models"""
+    class_names = service.load_batik_names()
+    label_index = evaluate_model.build_label_index(evaluate_model.list_labels(test_dir), class_names)
+    report = {}
+    for name, keras_model, path in (("teacher", teacher, service.MODEL_PATH), ("student", student, args.output)):
+        print(f"🔍 Evaluating the {name} on {test_dir}...")
+        result = evaluate_model.evaluate(
+            evaluate_model.iter_labelled_samples(test_dir),
+            label_index,
+            class_names,
+            predict_fn=lambda batch, m=keras_model: m.predict(batch, verbose=0),
+            preprocess_fn=service.preprocess_image,
+            batch_size=args.batch_size,
+            workers=args.workers
+        )
+        report[name] = {
+            "model_path": path,
+            "accuracy": result["accuracy"],
+            "macro_f1": result["macro_avg"]["f1"],
+            "num_images": result["num_images"],
+            "params": int(keras_model.count_params()),
+            "file_size_mb": os.path.getsize(path) / (1024 * 1024),
+            "cpu_latency_ms": cpu_latency_ms(tf, keras_model, args.latency_runs),
+            "images_per_sec": result["throughput"]["images_per_sec"]
+        }
+    report["accuracy_drop"] = report["teacher"]["accuracy"] - report["student"]["accuracy"]
+    report["latency_speedup"] = report["teacher"]["cpu_latency_ms"] / report["student"]["cpu_latency_ms"]
+    report["size_ratio"] = report["student"]["file_size_mb"] / report["teacher"]["file_size_mb"]
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distill the served model into a compact student")
+    parser.add_argument("train_dir", help="Training directory with one sub-folder per class")
+    parser.add_argument("val_dir", help="Validation directory with one sub-folder per class")
+    parser.add_argument("--test-dir", help="Labelled directory for the teacher/student report (default: val_dir)")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--report", default="distillation_report.json")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Where teacher outputs are cached")
+    parser.add_argument("--alpha", type=float, default=0.35, help="Student MobileNetV2 width multiplier")
+    parser.add_argument("--input-size", type=int, default=service.IMG_SIZE[0],
+                        help="Student backbone resolution (96, 128 or 160)")
+    parser.add_argument("--temperature", type=float, default=4.0)
+    parser.add_argument("--hard-label-weight", type=float, default=0.1,
+                        help="Weight of the hard-label loss; the rest goes to matching the teacher")
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--fine-tune-epochs", type=int, default=10)
+    parser.add_argument("--fine-tune-layers", type=int, default=30, help="Backbone layers unfrozen for fine-tuning")
+    parser.add_argument("--learning-rate", type=float, default=1e-3)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--latency-runs", type=int, default=50)
+    args = parser.parse_args()
+
+    if not service.load_model_with_fallback():
+        print(f"❌ Teacher could not be loaded: {service.model_loading_error}", file=sys.stderr)
+        sys.exit(2)
+    tf = service.tf
+    teacher = service.model
+    teacher_checksum = _file_checksum(service.MODEL_PATH)
+
+    train_paths, train_labels, train_targets = teacher_log_probs(
+        args.train_dir, teacher_checksum, args.cache_dir, workers=args.workers)
+    val_paths, val_labels, val_targets = teacher_log_probs(
+        args.val_dir, teacher_checksum, args.cache_dir, workers=args.workers)
+    num_classes = train_targets.shape[1]
+    teacher_agreement = float(np.mean(np.argmax(train_targets, axis=1) == train_labels))
+    print(f"📊 Teacher top-1 agreement with training labels: {teacher_agreement:.4f}")
+
+    train_ds = make_dataset(tf, train_paths, train_labels, train_targets, args.batch_size, training=True)
+    val_ds = make_dataset(tf, val_paths, val_labels, val_targets, args.batch_size, training=False)
+
+    student, training_model, backbone = build_student(tf, num_classes, args.alpha, args.input_size)
+    print(f"🎓 Student: MobileNetV2 alpha={args.alpha}, {args.input_size}px, "
+          f"{student.count_params():,} params (teacher: {teacher.count_params():,})")
+    train_student(tf, training_model, backbone, train_ds, val_ds, args, num_classes)
+
+    student.save(args.output)
+    print(f"✅ Student saved as '{args.output}'")
+
+    report = compare(tf, teacher, student, args.test_dir or args.val_dir, args)
+    report["config"] = {
+        "alpha": args.alpha,
+        "input_size": args.input_size,
+        "temperature": args.temperature,
+        "hard_label_weight": args.hard_label_weight,
+        "teacher_sha256": teacher_checksum
+    }
+    with open(args.report, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    print("\n==== TEACHER vs STUDENT ====")
+    for name in ("teacher", "student"):
+        r = report[name]
+        print(f"{name:8s} acc={r['accuracy']:.4f}  latency={r['cpu_latency_ms']:.1f} ms  "
+              f"size={r['file_size_mb']:.1f} MB  params={r['params']:,}")
+    print(f"📉 Accuracy drop: {report['accuracy_drop']:.4f}, "
+          f"⚡ {report['latency_speedup']:.2f}x faster, report saved to {args.report}")
+    print(f"🔍 Serve it as the cascade's first stage with CASCADE_MODEL_PATH={args.output} "
+          f"(pick the threshold with calibrate_cascade.py), or in place of {service.MODEL_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+"""
+Offline evaluator for the Batik Classification API.
+
+Streams a labelled dataset through exactly the same `preprocess_image` and
+`predict_probabilities` functions that `main.py` serves with, in large
+batches with parallel decoding, and reports accuracy, per-class metrics,
+the confusion matrix and throughput as JSON. The exit code makes it usable
+as a combined accuracy and latency gate in CI.
+
+It also reads the service's prediction log (see prediction_log.py) and
+summarizes what was served: class distribution, confidence, latency and the
+least confident inputs for relabelling. Given a dataset as well, it reports
+how far the served class distribution has drifted from the evaluation set's.
+
+Usage:
+    python evaluate_model.py data/test --batch-size 64 --workers 8
+    python evaluate_model.py shard-000.tar --min-accuracy 0.85 --min-images-per-sec 40
+    python evaluate_model.py --prediction-log prediction_logs/
+    python evaluate_model.py data/test --prediction-log prediction_logs/ --max-drift 0.2
+"""
+
+import os
+import sys
+import json
+import time
+import tarfile
+import argparse
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+from prediction_log import read_prediction_log
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp')
+
+# (label name, sample name, encoded image bytes)
+Sample = Tuple[str, str, bytes]
+
+
+def iter_directory_samples(root: str) -> Iterator[Sample]:
+    """Yield samples from a `root/<class name>/<image>` directory tree"""
+    for label in sorted(os.listdir(root)):
+        class_dir = os.path.join(root, label)
+        if not os.path.isdir(class_dir):
+            continue
+        for filename in sorted(os.listdir(class_dir)):
+            if not filename.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            path = os.path.join(class_dir, filename)
+            with open(path, 'rb') as f:
+                yield label, path, f.read()
+
+
+@functools.lru_cache(maxsize=8)
+def _read_tar_members(shard_path: str, mtime_ns: int, size: int) -> Tuple[tarfile.TarInfo, ...]:
+    with tarfile.open(shard_path, 'r:*') as tar:
+        return tuple(m for m in tar.getmembers()
+                     if m.isfile() and m.name.lower().endswith(IMAGE_EXTENSIONS) and '/' in m.name.strip('/'))
+
+
+def tar_members(shard_path: str) -> Tuple[tarfile.TarInfo, ...]:
+    """
+    Image members of a tar shard. The header scan is cached per shard file,
+    so listing its labels and then reading its samples scans it only once.
+    """
+    stat = os.stat(shard_path)
+    return _read_tar_members(shard_path, stat.st_mtime_ns, stat.st_size)
+
+
+def iter_tar_samples(shard_path: str) -> Iterator[Sample]:
+    """Yield samples from a tar shard whose members are named `<class name>/<image>`"""
+    members = tar_members(shard_path)
+    with tarfile.open(shard_path, 'r:*') as tar:
+        # Members are read by their cached offsets, in archive order
+        for member in members:
+            yield member.name.strip('/').split('/')[-2], member.name, tar.extractfile(member).read()
+
+
+def iter_labelled_samples(source: str) -> Iterator[Sample]:
+    """Yield samples from a labelled directory or a tar shard"""
+    if os.path.isdir(source):
+        return iter_directory_samples(source)
+    if tarfile.is_tarfile(source):
+        return iter_tar_samples(source)
+    raise ValueError(f"Unsupported dataset source: {source}")
+
+
+def list_labels(source: str) -> List[str]:
+    """Return the sorted label names present in a dataset source"""
+    if os.path.isdir(source):
+        return sorted(d for d in os.listdir(source) if os.path.isdir(os.path.join(source, d)))
+    return sorted({m.name.strip('/').split('/')[-2] for m in tar_members(source)})
+
+
+def build_label_index(labels: List[str], class_names: List[str]) -> Dict[str, int]:
+    """
+    Map dataset label names to model output indices.
+
+    Labels are matched against the served class names (labels.txt) by name.
+    If none of them match, the dataset is assumed to follow the alphabetical
+    class order `flow_from_directory` used during training.
+    """
+    by_name = {name.lower(): i for i, name in enumerate(class_names)}
+    index = {label: by_name[label.lower()] for label in labels if label.lower() in by_name}
+    if index:
+        return index
+    print("⚠️ No dataset labels match the served class names, using alphabetical order",
+          file=sys.stderr)
+    return {label: i for i, label in enumerate(sorted(labels))}
+
+
+def _batched(samples: Iterable[Sample], batch_size: int) -> Iterator[List[Sample]]:
+    batch = []
+    for sample in samples:
+        batch.append(sample)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _decode_batch(pool: ThreadPoolExecutor,
+                  preprocess_fn: Callable[[bytes], np.ndarray],
+                  batch: List[Sample]):
+    """Decode a batch in parallel, returning (arrays, samples, failures)"""
+    def decode(sample):
+        try:
+            return preprocess_fn(sample[2])
+        except Exception as e:
+            return e
+
+    arrays, kept, failures = [], [], []
+    for sample, result in zip(batch, pool.map(decode, batch)):
+        if isinstance(result, Exception):
+            failures.append({"sample": sample[1], "error": str(getattr(result, 'detail', result))})
+        else:
+            arrays.append(result)
+            kept.append(sample)
+    return arrays, kept, failures
+
+
+def classification_metrics(y_true: np.ndarray, y_pred: np.ndarray,
+                           class_names: List[str]) -> Dict[str, Any]:
+    """Accuracy, per-class precision/recall/F1 and the confusion matrix"""
+    # The model may have more outputs than labels.txt has names
+    num_classes = max([len(class_names), *(y_true + 1), *(y_pred + 1)])
+    class_names = list(class_names) + [f"class_{i}" for i in range(len(class_names), num_classes)]
+    cm = np.bincount(y_true * num_classes + y_pred,
+                     minlength=num_classes * num_classes).reshape(num_classes, num_classes)
+    tp = np.diag(cm).astype(np.float64)
+    support = cm.sum(axis=1)
+    predicted = cm.sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.nan_to_num(tp / predicted)
+        recall = np.nan_to_num(tp / support)
+        f1 = np.nan_to_num(2 * precision * recall / (precision + recall))
+
+    per_class = {}
+    for i, name in enumerate(class_names):
+        if support[i] == 0 and predicted[i] == 0:
+            continue
+        per_class[name] = {
+            "precision": float(precision[i]),
+            "recall": float(recall[i]),
+            "f1": float(f1[i]),
+            "support": int(support[i])
+        }
+
+    present = support > 0
+    total = int(support.sum())
+    return {
+        "accuracy": float(tp.sum() / total) if total else 0.0,
+        "macro_avg": {
+            "precision": float(precision[present].mean()) if present.any() else 0.0,
+            "recall": float(recall[present].mean()) if present.any() else 0.0,
+            "f1": float(f1[present].mean()) if present.any() else 0.0
+        },
+        "weighted_avg": {
+            "precision": float((precision * support).sum() / total) if total else 0.0,
+            "recall": float((recall * support).sum() / total) if total else 0.0,
+            "f1": float((f1 * support).sum() / total) if total else 0.0
+        },
+        "per_class": per_class,
+        "confusion_matrix": cm.tolist()
+    }
+
+
+def evaluate(samples: Iterable[Sample],
+             label_index: Dict[str, int],
+             class_names: List[str],
+             predict_fn: Callable[[np.ndarray], np.ndarray],
+             preprocess_fn: Callable[[bytes], np.ndarray],
+             batch_size: int = 64,
+             workers: int = 8) -> Dict[str, Any]:
+    """
+    Stream samples through `preprocess_fn` and `predict_fn` and compute metrics.
+
+    Decoding of the next batch overlaps with inference on the current one.
+    """
+    y_true, y_pred, batch_latencies = [], [], []
+    failures, skipped_labels = [], {}
+    inference_time = 0.0
+    start = time.perf_counter()
+
+    # `prefetch` runs one batch ahead; it fans each batch out over `pool`
+    with ThreadPoolExecutor(max_workers=workers) as pool, \
+            ThreadPoolExecutor(max_workers=1) as prefetch:
+        batches = _batched(samples, batch_size)
+        pending = prefetch.submit(_decode_batch, pool, preprocess_fn, next(batches, []))
+        while True:
+            arrays, kept, batch_failures = pending.result()
+            upcoming = next(batches, None)
+            if upcoming is not None:
+                pending = prefetch.submit(_decode_batch, pool, preprocess_fn, upcoming)
+            failures.extend(batch_failures)
+
+            if arrays:
+                t0 = time.perf_counter()
+                probabilities = predict_fn(np.concatenate(arrays, axis=0))
+                elapsed = time.perf_counter() - t0
+                inference_time += elapsed
+                batch_latencies.append(elapsed)
+
+                for (label, name, _), probs in zip(kept, probabilities):
+                    if label not in label_index:
+                        skipped_labels[label] = skipped_labels.get(label, 0) + 1
+                        continue
+                    y_true.append(label_index[label])
+                    y_pred.append(int(np.argmax(probs)))
+
+            if upcoming is None:
+                break
+
+    total_time = time.perf_counter() - start
+    evaluated = len(y_true)
+    report = classification_metrics(np.asarray(y_true, dtype=np.int64),
+                                    np.asarray(y_pred, dtype=np.int64),
+                                    class_names)
+    latencies_ms = np.asarray(batch_latencies) * 1000
+    report.update({
+        "num_images": evaluated,
+        "num_failed": len(failures),
+        "failures": failures[:20],
+        "skipped_labels": skipped_labels,
+        "batch_size": batch_size,
+        "workers": workers,
+        "throughput": {
+            "images_per_sec": evaluated / total_time if total_time else 0.0,
+            "inference_images_per_sec": evaluated / inference_time if inference_time else 0.0,
+            "total_seconds": total_time,
+            "batch_latency_ms_p50": float(np.percentile(latencies_ms, 50)) if latencies_ms.size else None,
+            "batch_latency_ms_p95": float(np.percentile(latencies_ms, 95)) if latencies_ms.size else None
+        }
+    })
+    return report
+
+
+def summarize_prediction_log(records: Iterable[Dict[str, Any]],
+                             class_names: List[str],
+                             low_confidence: float = 0.5,
+                             num_relabel: int = 50) -> Dict[str, Any]:
+    """
+    Summarize logged predictions.
+
+    Counts are weighted by each record's `sample_weight`, undoing the
+    sampling the logger applies under load.
+    """
+    class_weights: Dict[int, float] = {}
+    endpoints: Dict[str, int] = {}
+    versions: Dict[str, int] = {}
+    confidences, weights, latencies, hashes = [], [], [], set()
+    least_confident = []
+    num_records = 0
+
+    for record in records:
+        num_records += 1
+        weight = float(record.get("sample_weight", 1.0))
+        index = int(record["predicted_index"])
+        class_weights[index] = class_weights.get(index, 0.0) + weight
+        endpoints[record.get("endpoint")] = endpoints.get(record.get("endpoint"), 0) + 1
+        versions[record.get("model_version")] = versions.get(record.get("model_version"), 0) + 1
+        confidences.append(float(record["confidence"]))
+        weights.append(weight)
+        if record.get("latency_ms") is not None:
+            latencies.append(float(record["latency_ms"]))
+        hashes.add(record.get("sha256"))
+        least_confident.append((float(record["confidence"]), record.get("sha256"), record.get("filename")))
+        if len(least_confident) > 4 * num_relabel:
+            least_confident = sorted(least_confident)[:2 * num_relabel]
+
+    # The same input may have been classified many times
+    unique_least_confident = {}
+    for confidence, sha, filename in sorted(least_confident):
+        if len(unique_least_confident) == num_relabel:
+            break
+        unique_least_confident.setdefault(sha, (confidence, filename))
+
+    confidences = np.asarray(confidences)
+    weights = np.asarray(weights)
+    total_weight = float(weights.sum())
+    latencies = np.asarray(latencies)
+    distribution = {(class_names[i] if i < len(class_names) else f"class_{i}"): w / total_weight
+                    for i, w in sorted(class_weights.items(), key=lambda kv: -kv[1])} if total_weight else {}
+    return {
+        "num_records": num_records,
+        "estimated_requests": total_weight,
+        "unique_inputs": len(hashes),
+        "endpoints": endpoints,
+        "model_versions": versions,
+        "mean_confidence": float(np.average(confidences, weights=weights)) if num_records else None,
+        "low_confidence_fraction": float(weights[confidences < low_confidence].sum() / total_weight)
+        if total_weight else None,
+        "latency_ms_p50": float(np.percentile(latencies, 50)) if latencies.size else None,
+        "latency_ms_p95": float(np.percentile(latencies, 95)) if latencies.size else None,
+        "predicted_class_distribution": distribution,
+        "relabel_candidates": [
+            {"sha256": sha, "filename": filename, "confidence": confidence}
+            for sha, (confidence, filename) in unique_least_confident.items()
+        ],
+        "predicted_index_counts": {str(i): w for i, w in sorted(class_weights.items())}
+    }
+
+
+def class_distribution_drift(served: Dict[str, float], confusion_matrix: List[List[int]]) -> float:
+    """
+    Total variation distance between the served predicted-class distribution
+    (`predicted_index_counts` of a log summary) and the evaluation set's
+    """
+    served = {int(i): w for i, w in served.items()}
+    reference = np.asarray(confusion_matrix).sum(axis=0).astype(np.float64)
+    size = max(len(reference), max(served, default=-1) + 1)
+    reference = np.pad(reference, (0, size - len(reference)))
+    observed = np.zeros(size)
+    for index, weight in served.items():
+        observed[index] = weight
+    if not reference.sum() or not observed.sum():
+        return 0.0
+    return float(0.5 * np.abs(observed / observed.sum() - reference / reference.sum()).sum())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the served model on a labelled dataset")
+    parser.add_argument("source", nargs="?", help="Directory with one sub-folder per class, or a tar shard")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4,
+                        help="Parallel image decoding threads")
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    parser.add_argument("--min-accuracy", type=float, help="Fail if accuracy is below this value")
+    parser.add_argument("--min-images-per-sec", type=float, help="Fail if throughput is below this value")
+    parser.add_argument("--prediction-log", help="Prediction log directory or file to summarize")
+    parser.add_argument("--model-version", help="Only read logged predictions of this model version")
+    parser.add_argument("--labels", default="labels.txt",
+                        help="Class names file for a log-only summary (the served model's labels.txt)")
+    parser.add_argument("--max-drift", type=float,
+                        help="Fail if the served class distribution drifts further than this from the dataset's")
+    args = parser.parse_args()
+    if not args.source and not args.prediction_log:
+        parser.error("a dataset source or --prediction-log is required")
+
+    if not args.source:
+        # Log-only summary: no model, and no import of the service module (TensorFlow, app setup)
+        class_names = []
+        if os.path.exists(args.labels):
+            with open(args.labels, encoding='utf-8') as f:
+                class_names = [line.strip() for line in f if line.strip()]
+        summary = summarize_prediction_log(read_prediction_log(args.prediction_log, args.model_version),
+                                           class_names)
+        print(json.dumps({"prediction_log": summary}, indent=2, ensure_ascii=False))
+        print(f"✅ {summary['num_records']} logged predictions summarized", file=sys.stderr)
+        return
+
+    # Import the service module so evaluation uses the serving code path verbatim
+    import main as service
+
+    if not service.load_model_and_classes():
+        print(f"❌ Model could not be loaded: {service.model_loading_error}", file=sys.stderr)
+        sys.exit(2)
+
+    label_index = build_label_index(list_labels(args.source), service.class_names)
+    print(f"🔍 Evaluating {args.source} with batch size {args.batch_size} and {args.workers} workers",
+          file=sys.stderr)
+    report = evaluate(
+        iter_labelled_samples(args.source),
+        label_index,
+        service.class_names,
+        predict_fn=service.predict_probabilities,
+        preprocess_fn=service.preprocess_image,
+        batch_size=args.batch_size,
+        workers=args.workers
+    )
+    report["source"] = args.source
+    report["model_path"] = service.backend.model_path
+    report["inference_backend"] = service.backend.name
+
+    gate_failures = []
+    if args.prediction_log:
+        summary = summarize_prediction_log(read_prediction_log(args.prediction_log, args.model_version),
+                                           service.class_names)
+        summary["class_distribution_drift"] = class_distribution_drift(
+            summary["predicted_index_counts"], report["confusion_matrix"])
+        report["prediction_log"] = summary
+        if args.max_drift is not None and summary["class_distribution_drift"] > args.max_drift:
+            gate_failures.append(f"class distribution drift {summary['class_distribution_drift']:.3f} "
+                                 f"> {args.max_drift}")
+    if args.min_accuracy is not None and report["accuracy"] < args.min_accuracy:
+        gate_failures.append(f"accuracy {report['accuracy']:.4f} < {args.min_accuracy}")
+    images_per_sec = report["throughput"]["images_per_sec"]
+    if args.min_images_per_sec is not None and images_per_sec < args.min_images_per_sec:
+        gate_failures.append(f"throughput {images_per_sec:.1f} img/s < {args.min_images_per_sec}")
+    report["gate_failures"] = gate_failures
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+
+    print(f"✅ Accuracy: {report['accuracy']:.4f} on {report['num_images']} images, "
+          f"{images_per_sec:.1f} img/s", file=sys.stderr)
+    if gate_failures:
+        for failure in gate_failures:
+            print(f"❌ Gate failed: {failure}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Export the served Keras model to a TFLite flatbuffer for the slim
+`INFERENCE_BACKEND=tflite` runtime.
+
+Usage:
+    python export_tflite.py                       # float32, top-1 identical to Keras
+    python export_tflite.py --quantize float16    # ~half the size
+    python export_tflite.py --quantize dynamic    # int8 weights, float activations
+"""
+
+import os
+import argparse
+
+import main as service
+
+
+def export_tflite(output_path: str, quantize: str = "none") -> str:
+    """Convert the Keras model loaded by main.py and write it to `output_path`"""
+    if not service.load_model_with_fallback():
+        raise RuntimeError(f"Model could not be loaded: {service.model_loading_error}")
+    tf = service.tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(service.model)
+    if quantize in ("float16", "dynamic"):
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantize == "float16":
+        converter.target_spec.supported_types = [tf.float16]
+
+    print(f"🔄 Converting {service.MODEL_PATH} (quantize={quantize})...")
+    flatbuffer = converter.convert()
+    with open(output_path, 'wb') as f:
+        f.write(flatbuffer)
+
+    keras_size = os.path.getsize(service.MODEL_PATH) / (1024 * 1024)
+    tflite_size = len(flatbuffer) / (1024 * 1024)
+    print(f"✅ Saved {output_path}: {tflite_size:.2f} MB (Keras model: {keras_size:.2f} MB)")
+    return output_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the Keras model to TFLite")
+    parser.add_argument("--output", default=service.TFLITE_MODEL_PATH)
+    parser.add_argument("--quantize", choices=["none", "float16", "dynamic"], default="none")
+    args = parser.parse_args()
+    export_tflite(args.output, args.quantize)
+    print("🔍 Run test_backend_parity.py to check top-1 agreement with the Keras backend")
@@ -0,0 +1,161 @@
+"""
+Grad-CAM explanations for the served Keras model.
+
+The model is split at its last spatial (4-D) activation, normally the
+MobileNetV2 feature map or the GA head's optional conv block. One forward
+pass returns both those activations and the class probabilities; the
+activations can be cached by image content hash, so explaining an image
+that was just classified only reruns the small head. Gradients for all
+requested classes come from a single backward pass over a batch holding one
+copy of the activations per class.
+
+Heatmaps are rendered as 8-bit palette PNGs blended over the model input.
+"""
+
+import io
+import threading
+from collections import OrderedDict
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+
+def _jet_colormap() -> np.ndarray:
+    """256-entry blue-cyan-yellow-red colormap as uint8 RGB"""
+    stops = [0.0, 0.125, 0.375, 0.625, 0.875, 1.0]
+    channels = [
+        [0.0, 0.0, 0.0, 1.0, 1.0, 0.5],  # red
+        [0.0, 0.0, 1.0, 1.0, 0.0, 0.0],  # green
+        [0.5, 1.0, 1.0, 0.0, 0.0, 0.0],  # blue
+    ]
+    x = np.linspace(0.0, 1.0, 256)
+    return np.round(np.stack([np.interp(x, stops, c) for c in channels], axis=1) * 255).astype(np.uint8)
+
+COLORMAP = _jet_colormap()
+
+
+class GradCAM:
+    """Forward pass with activations, and batched Grad-CAM over top-k classes"""
+
+    def __init__(self, model, tf):
+        """
+        Args:
+            model: A Keras model whose layers run in sequence (as the GA builds them).
+            tf: The TensorFlow module, imported lazily by the caller.
+        """
+        self.tf = tf
+        layers = model.layers
+        inputs = tf.keras.Input(shape=model.input_shape[1:])
+        outputs = []
+        x = inputs
+        for layer in layers:
+            x = layer(x)
+            outputs.append(x)
+        split = max((i for i, output in enumerate(outputs) if len(output.shape) == 4), default=None)
+        if split is None or split == len(layers) - 1:
+            raise ValueError(f"{model.name} has no spatial activations followed by a classifier head")
+        features = outputs[split]
+        self.forward_model = tf.keras.Model(inputs, [features, outputs[-1]])
+
+        # Gradients are taken of the logits: a saturated softmax has almost none
+        head_inputs = tf.keras.Input(shape=features.shape[1:])
+        x = head_inputs
+        for layer in layers[split + 1:]:
+            if layer is layers[-1] and layer.get_config().get("activation") == "softmax":
+                config = {**layer.get_config(), "activation": "linear", "name": f"{layer.name}_logits"}
+                logits_layer = layer.__class__.from_config(config)
+                x = logits_layer(x)
+                logits_layer.set_weights(layer.get_weights())
+            else:
+                x = layer(x)
+        self.head_model = tf.keras.Model(head_inputs, x)
+        self.layer_name = layers[split].name
+        self.feature_shape = tuple(int(d) for d in features.shape[1:])
+        self.feature_bytes = int(np.prod(self.feature_shape)) * 4
+        self.num_classes = int(x.shape[-1])
+
+    def forward(self, batch: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(activations, probabilities) for a preprocessed batch, in one pass"""
+        features, probabilities = self.forward_model(batch, training=False)
+        return features.numpy(), probabilities.numpy()
+
+    def predict(self, batch: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(activations, probabilities) through Keras' batched predict loop, as used for serving"""
+        features, probabilities = self.forward_model.predict(batch, verbose=0)
+        return features, probabilities
+
+    def heatmaps(self, features: np.ndarray, class_indices: Sequence[int]) -> np.ndarray:
+        """
+        Grad-CAM maps in [0, 1] for one image's activations, one per class.
+
+        Returns an array of shape (len(class_indices), h, w) at feature-map resolution.
+        """
+        tf = self.tf
+        tiled = tf.constant(np.repeat(features[np.newaxis], len(class_indices), axis=0))
+        selector = tf.one_hot(list(class_indices), self.num_classes)
+        with tf.GradientTape() as tape:
+            tape.watch(tiled)
+            scores = tf.reduce_sum(self.head_model(tiled, training=False) * selector, axis=1)
+        # Each row's score depends only on its own copy of the activations
+        gradients = tape.gradient(scores, tiled)
+        weights = tf.reduce_mean(gradients, axis=(1, 2), keepdims=True)
+        cams = tf.nn.relu(tf.reduce_sum(weights * tiled, axis=-1)).numpy()
+        peaks = cams.max(axis=(1, 2), keepdims=True)
+        return np.divide(cams, peaks, out=np.zeros_like(cams), where=peaks > 0)
+
+
+def overlay_png(image: np.ndarray, heatmap: np.ndarray, alpha: float = 0.5) -> bytes:
+    """
+    Blend a [0, 1] heatmap over an RGB image (uint8 or [0, 1] float) and
+    encode the result as an 8-bit palette PNG.
+    """
+    if image.dtype != np.uint8:
+        image = np.round(np.clip(image, 0.0, 1.0) * 255).astype(np.uint8)
+    height, width = image.shape[:2]
+    heat = np.asarray(Image.fromarray(np.round(heatmap * 255).astype(np.uint8))
+                      .resize((width, height), Image.BILINEAR))
+    weight = (heat.astype(np.float32) / 255.0 * alpha)[..., np.newaxis]
+    blended = image * (1 - weight) + COLORMAP[heat] * weight
+    png = Image.fromarray(np.round(blended).astype(np.uint8)).quantize(colors=256)
+    buffer = io.BytesIO()
+    png.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+
+class FeatureCache:
+    """Thread-safe LRU of (activations, probabilities) keyed by image content hash"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, key: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry
+
+    def put(self, key: str, features: np.ndarray, probabilities: np.ndarray):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (features, probabilities)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "mb": round(sum(f.nbytes + p.nbytes for f, p in self._entries.values()) / (1024 * 1024), 1),
+                **self.stats
+            }
@@ -0,0 +1,209 @@
+"""
+Perceptual hashing and a Hamming-distance index for near-duplicate images.
+
+`phash` is the classic 64-bit DCT hash: the image is reduced to 32x32
+grayscale, the lowest 8x8 DCT frequencies are compared with their median
+and each comparison gives one bit. Re-encoding, resizing, small crops and
+colour shifts change only a few bits, so near-duplicates are hashes within
+a small Hamming distance of each other.
+
+Images are hashed after being resized to the model input size, exactly as
+main.py's `preprocess_image` sees them, so hashes from dedup_dataset.py and
+from served uploads are comparable.
+
+`HammingIndex` finds all hashes within `max_distance` bits of a query
+without comparing it to every stored hash (multi-index hashing): the 64 bits
+are cut into `max_distance + 1` bands, and two hashes within that distance
+must agree exactly on at least one band (pigeonhole), so only hashes that
+share a band value with the query are compared.
+"""
+
+import json
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+HASH_BITS = 64
+HASH_SIZE = 8
+HIGHFREQ_FACTOR = 4
+INDEX_VERSION = 1
+PAIR_BLOCK_ROWS = 1024
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    """Orthonormal DCT-II matrix, so the 2-D DCT of X is D @ X @ D.T"""
+    k = np.arange(n)[:, np.newaxis]
+    matrix = np.cos(np.pi * (2 * np.arange(n) + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+_DCT = _dct_matrix(HASH_SIZE * HIGHFREQ_FACTOR)[:HASH_SIZE]
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+_BIT_WEIGHTS = np.uint64(1) << np.arange(HASH_BITS - 1, -1, -1, dtype=np.uint64)
+
+
+def phash(image: np.ndarray) -> int:
+    """
+    64-bit perceptual hash of an RGB image, as an int.
+
+    Args:
+        image: (H, W, 3) uint8 pixels, or floats in [0, 1] (a preprocessed model input).
+    """
+    if image.dtype != np.uint8:
+        image = np.round(np.clip(image, 0.0, 1.0) * 255).astype(np.uint8)
+    side = HASH_SIZE * HIGHFREQ_FACTOR
+    gray = np.asarray(Image.fromarray(image).convert("L").resize((side, side), Image.BOX), dtype=np.float64)
+    low = _DCT @ gray @ _DCT.T
+    # The DC term only measures overall brightness and is left out of the median
+    bits = (low > np.median(low.flat[1:])).ravel()
+    return int((bits.astype(np.uint64) * _BIT_WEIGHTS).sum())
+
+
+def hash_to_hex(value: int) -> str:
+    return f"{value:016x}"
+
+
+def hamming_distances(hashes: np.ndarray, value: int) -> np.ndarray:
+    """Bit differences between each uint64 in `hashes` and `value`"""
+    xor = np.bitwise_xor(hashes, np.uint64(value))
+    return _POPCOUNT8[xor.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+class HammingIndex:
+    """
+    Near-duplicate index of 64-bit hashes, each with a JSON-serializable item
+    (e.g. {"path": ..., "label": ..., "split": ...}). Thread-safe.
+    """
+
+    def __init__(self, max_distance: int = 6):
+        if not 0 <= max_distance < HASH_BITS:
+            raise ValueError(f"max_distance must be between 0 and {HASH_BITS - 1}")
+        self.max_distance = max_distance
+        bands = max_distance + 1
+        edges = np.linspace(0, HASH_BITS, bands + 1).astype(int).tolist()
+        # (shift, mask) of each band, from the most significant bits down
+        self._bands = [(HASH_BITS - end, (1 << (end - start)) - 1) for start, end in zip(edges[:-1], edges[1:])]
+        self._tables = [defaultdict(list) for _ in self._bands]
+        self._hashes = np.empty(0, dtype=np.uint64)
+        self._pending: List[int] = []
+        self.items: List[Any] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def _band_keys(self, value: int):
+        return [(value >> shift) & mask for shift, mask in self._bands]
+
+    def add(self, value: int, item: Any = None) -> int:
+        """Store a hash and return its position"""
+        with self._lock:
+            position = len(self.items)
+            self.items.append(item)
+            self._pending.append(value)
+            for table, key in zip(self._tables, self._band_keys(value)):
+                table[key].append(position)
+            return position
+
+    def hashes(self) -> np.ndarray:
+        """All stored hashes as a uint64 array, in insertion order"""
+        with self._lock:
+            if self._pending:
+                self._hashes = np.concatenate([self._hashes, np.array(self._pending, dtype=np.uint64)])
+                self._pending = []
+            return self._hashes
+
+    def query(self, value: int, max_distance: Optional[int] = None) -> List[Tuple[int, int]]:
+        """
+        (position, distance) of every stored hash within `max_distance` bits,
+        nearest first. Distances above the index's own `max_distance` are not
+        guaranteed to be found.
+        """
+        max_distance = self.max_distance if max_distance is None else max_distance
+        hashes = self.hashes()
+        candidates = set()
+        for table, key in zip(self._tables, self._band_keys(value)):
+            candidates.update(table.get(key, ()))
+        if not candidates:
+            return []
+        positions = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        distances = hamming_distances(hashes[positions], value)
+        keep = distances <= max_distance
+        order = np.lexsort((positions[keep], distances[keep]))
+        return [(int(p), int(d)) for p, d in zip(positions[keep][order], distances[keep][order])]
+
+    def nearest(self, value: int, max_distance: Optional[int] = None) -> Optional[Tuple[Any, int]]:
+        """(item, distance) of the closest stored hash within `max_distance`, or None"""
+        matches = self.query(value, max_distance)
+        if not matches:
+            return None
+        position, distance = matches[0]
+        return self.items[position], distance
+
+    def pairs(self, max_distance: Optional[int] = None) -> List[Tuple[int, int, int]]:
+        """Every (i, j, distance) with i < j and distance <= max_distance"""
+        max_distance = self.max_distance if max_distance is None else max_distance
+        hashes = self.hashes()
+        found = {}
+        for table in self._tables:
+            for bucket in table.values():
+                if len(bucket) < 2:
+                    continue
+                members = np.asarray(bucket, dtype=np.int64)
+                # Row blocks bound the memory of large buckets (e.g. plain backgrounds)
+                for start in range(0, len(members) - 1, PAIR_BLOCK_ROWS):
+                    rows = members[start:start + PAIR_BLOCK_ROWS]
+                    cols = members[start + 1:]
+                    xor = np.bitwise_xor(hashes[rows][:, np.newaxis], hashes[cols][np.newaxis, :])
+                    distances = _POPCOUNT8[xor.view(np.uint8)].reshape(len(rows), len(cols), 8).sum(axis=2)
+                    # Row r is member start + r; only columns after it (col index >= r) are new pairs
+                    r, c = np.nonzero((distances <= max_distance)
+                                      & (np.arange(len(cols)) >= np.arange(len(rows))[:, np.newaxis]))
+                    for i, j, d in zip(rows[r].tolist(), cols[c].tolist(), distances[r, c].tolist()):
+                        found[(i, j)] = d
+        return sorted((i, j, d) for (i, j), d in found.items())
+
+    def save(self, path: str):
+        """Write the hashes and items as a .npz file"""
+        np.savez_compressed(path,
+                            version=np.array(INDEX_VERSION),
+                            max_distance=np.array(self.max_distance),
+                            hashes=self.hashes(),
+                            items=np.array(json.dumps(self.items, ensure_ascii=False)))
+
+    @classmethod
+    def load(cls, path: str) -> "HammingIndex":
+        with np.load(path, allow_pickle=False) as data:
+            if int(data["version"]) != INDEX_VERSION:
+                raise ValueError(f"{path} is index version {int(data['version'])}, expected {INDEX_VERSION}")
+            index = cls(int(data["max_distance"]))
+            items = json.loads(str(data["items"]))
+            for value, item in zip(data["hashes"].tolist(), items):
+                index.add(int(value), item)
+        return index
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"images": len(self), "max_distance": self.max_distance, "bands": len(self._bands)}
+
+
+def clusters(size: int, pairs: Sequence[Tuple[int, int, int]]) -> List[List[int]]:
+    """Connected groups (of two or more) among `size` items linked by `pairs`"""
+    parent = list(range(size))
+
+    def root(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j, _ in pairs:
+        a, b = root(i), root(j)
+        if a != b:
+            parent[max(a, b)] = min(a, b)
+    groups = defaultdict(list)
+    for i in range(size):
+        groups[root(i)].append(i)
+    return [members for members in groups.values() if len(members) > 1]
@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+"""
+Fast, TensorFlow-free model inspection.
+
+Reads a `.keras` zip archive (config.json, metadata.json, model.weights.h5)
+or a legacy HDF5 `.h5` file without importing TensorFlow, walks the layer
+graph, infers output shapes and estimates parameters and multiply-accumulate
+operations (MACs) per layer. The per-layer compute breakdown shows where
+inference time goes. Weight shapes are read from the HDF5 metadata only
+(no tensor data) when h5py is installed.
+
+Usage:
+    python inspect_model.py
+    python inspect_model.py final_tuned_genetic_algorithm_model.keras --top 15 --weights
+    python inspect_model.py model.keras --json > model_profile.json
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import zipfile
+import argparse
+from typing import Any, Dict, List, Optional, Tuple
+
+_START = time.perf_counter()
+
+DEFAULT_MODEL_PATH = "final_tuned_genetic_algorithm_model.keras"
+CONTAINER_TYPES = ('Sequential', 'Functional', 'Model')
+
+Shape = Tuple[Optional[int], ...]
+
+
+# ---------------------------------------------------------------------------
+# Container reading
+# ---------------------------------------------------------------------------
+
+def read_container(model_path: str) -> Dict[str, Any]:
+    """Return the model config, metadata and weights location without loading tensors"""
+    with open(model_path, 'rb') as f:
+        header = f.read(8)
+
+    if header.startswith(b'PK'):
+        with zipfile.ZipFile(model_path) as zf:
+            names = zf.namelist()
+            config = json.loads(zf.read('config.json'))
+            metadata = json.loads(zf.read('metadata.json')) if 'metadata.json' in names else {}
+            weights_member = next((n for n in names if n.endswith('.weights.h5')), None)
+        return {"format": "keras-zip", "config": config, "metadata": metadata,
+                "weights_member": weights_member, "members": names}
+
+    if header.startswith(b'\x89HDF'):
+        import h5py  # only needed for legacy HDF5 models
+
+        with h5py.File(model_path, 'r') as f:
+            raw = f.attrs.get('model_config')
+            if raw is None:
+                raise ValueError("HDF5 file has no model_config attribute")
+            if isinstance(raw, bytes):
+                raw = raw.decode('utf-8')
+            metadata = {k: (v.decode('utf-8') if isinstance(v, bytes) else str(v))
+                        for k, v in f.attrs.items() if k in ('keras_version', 'backend')}
+        return {"format": "hdf5", "config": json.loads(raw), "metadata": metadata,
+                "weights_member": None, "members": []}
+
+    raise ValueError(f"Unrecognized model container (header {header.hex()})")
+
+
+def read_weight_shapes(model_path: str, container: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    List every weight tensor's path, shape, dtype and size from HDF5 metadata;
+    empty for a .keras archive without a weights file (e.g. saved unbuilt)
+    """
+    if container["format"] == "keras-zip" and container["weights_member"] is None:
+        return []
+
+    import h5py
+
+    entries = []
+
+    def visit(name, obj):
+        if isinstance(obj, h5py.Dataset):
+            entries.append({
+                "path": name,
+                "shape": list(obj.shape),
+                "dtype": str(obj.dtype),
+                "bytes": int(obj.size * obj.dtype.itemsize)
+            })
+
+    if container["format"] == "keras-zip":
+        with zipfile.ZipFile(model_path) as zf:
+            with zf.open(container["weights_member"]) as member:
+                with h5py.File(member, 'r') as f:
+                    f.visititems(visit)
+    else:
+        with h5py.File(model_path, 'r') as f:
+            f.visititems(visit)
+    return entries
+
+
+# ---------------------------------------------------------------------------
+# Shape inference and cost estimation
+# ---------------------------------------------------------------------------
+
+def _pair(value) -> Tuple[int, int]:
+    if isinstance(value, (list, tuple)):
+        return int(value[0]), int(value[1])
+    return int(value), int(value)
+
+
+def _conv_out(size: Optional[int], kernel: int, stride: int, padding: str, dilation: int = 1) -> Optional[int]:
+    if size is None:
+        return None
+    if padding == 'same':
+        return math.ceil(size / stride)
+    effective = (kernel - 1) * dilation + 1
+    return (size - effective) // stride + 1
+
+
+def _numel(shape: Shape) -> int:
+    total = 1
+    for dim in shape[1:]:
+        total *= dim or 1
+    return total
+
+
+def layer_cost(class_name: str, cfg: Dict[str, Any], inputs: List[Shape]) -> Tuple[Shape, int, int]:
+    """
+    Infer the output shape, parameter count and MACs of one (non-container) layer.
+
+    Unknown layers are treated as shape-preserving with no parameters.
+    """
+    x = inputs[0] if inputs else (None,)
+
+    if class_name == 'InputLayer':
+        shape = cfg.get('batch_shape') or cfg.get('batch_input_shape')
+        return tuple(shape), 0, 0
+
+    if class_name in ('Conv2D', 'DepthwiseConv2D', 'SeparableConv2D'):
+        _, h, w, cin = x
+        kh, kw = _pair(cfg.get('kernel_size', 1))
+        sh, sw = _pair(cfg.get('strides', 1))
+        dh, dw = _pair(cfg.get('dilation_rate', 1))
+        padding = cfg.get('padding', 'valid')
+        oh = _conv_out(h, kh, sh, padding, dh)
+        ow = _conv_out(w, kw, sw, padding, dw)
+        use_bias = cfg.get('use_bias', True)
+        spatial = (oh or 1) * (ow or 1)
+
+        if class_name == 'Conv2D':
+            cout = cfg['filters']
+            groups = cfg.get('groups', 1) or 1
+            params = kh * kw * (cin // groups) * cout + (cout if use_bias else 0)
+            macs = spatial * kh * kw * (cin // groups) * cout
+        elif class_name == 'DepthwiseConv2D':
+            multiplier = cfg.get('depth_multiplier', 1)
+            cout = cin * multiplier
+            params = kh * kw * cin * multiplier + (cout if use_bias else 0)
+            macs = spatial * kh * kw * cin * multiplier
+        else:
+            multiplier = cfg.get('depth_multiplier', 1)
+            cout = cfg['filters']
+            params = kh * kw * cin * multiplier + cin * multiplier * cout + (cout if use_bias else 0)
+            macs = spatial * (kh * kw * cin * multiplier + cin * multiplier * cout)
+        return (None, oh, ow, cout), params, macs
+
+    if class_name == 'Dense':
+        units = cfg['units']
+        fan_in = x[-1]
+        params = fan_in * units + (units if cfg.get('use_bias', True) else 0)
+        return x[:-1] + (units,), params, _numel(x) * units
+
+    if class_name == 'BatchNormalization':
+        channels = x[-1]
+        params = channels * (2 + int(cfg.get('center', True)) + int(cfg.get('scale', True)))
+        # Folded into the preceding conv at inference, but counted as one MAC per element here
+        return x, params, _numel(x)
+
+    if class_name == 'ZeroPadding2D':
+        pad = cfg.get('padding', 1)
+        if isinstance(pad, int):
+            (top, bottom), (left, right) = (pad, pad), (pad, pad)
+        else:
+            top_bottom, left_right = pad
+            top, bottom = _pair(top_bottom)
+            left, right = _pair(left_right)
+        _, h, w, c = x
+        return (None, h + top + bottom if h else None, w + left + right if w else None, c), 0, 0
+
+    if class_name in ('MaxPooling2D', 'AveragePooling2D'):
+        _, h, w, c = x
+        ph, pw = _pair(cfg.get('pool_size', 2))
+        strides = cfg.get('strides') or (ph, pw)
+        sh, sw = _pair(strides)
+        padding = cfg.get('padding', 'valid')
+        oh, ow = _conv_out(h, ph, sh, padding), _conv_out(w, pw, sw, padding)
+        return (None, oh, ow, c), 0, (oh or 1) * (ow or 1) * c * ph * pw
+
+    if class_name in ('GlobalAveragePooling2D', 'GlobalMaxPooling2D'):
+        _, h, w, c = x
+        out = (None, 1, 1, c) if cfg.get('keepdims') else (None, c)
+        return out, 0, _numel(x)
+
+    if class_name == 'Add':
+        return x, 0, _numel(x) * (len(inputs) - 1)
+
+    if class_name == 'Concatenate':
+        axis = cfg.get('axis', -1)
+        out = list(x)
+        out[axis] = sum(shape[axis] or 0 for shape in inputs)
+        return tuple(out), 0, 0
+
+    if class_name == 'Flatten':
+        return (None, _numel(x)), 0, 0
+
+    if class_name == 'Reshape':
+        return (None,) + tuple(cfg['target_shape']), 0, 0
+
+    if class_name == 'Resizing':
+        return (None, cfg['height'], cfg['width'], x[-1]), 0, 0
+
+    # ReLU, Activation, Dropout, Rescaling, Softmax, ... are elementwise
+    return x, 0, 0
+
+
+def _layer_name(layer: Dict[str, Any]) -> str:
+    return layer.get('name') or layer.get('config', {}).get('name', layer.get('class_name', '?'))
+
+
+def _inbound_names(layer: Dict[str, Any]) -> List[Tuple[str, int, int]]:
+    """Return (layer name, node index, tensor index) for the first call of a layer"""
+    nodes = layer.get('inbound_nodes') or []
+    if not nodes:
+        return []
+    node = nodes[0]
+
+    # Keras 3: {"args": [tensor | [tensors]], "kwargs": {...}}
+    if isinstance(node, dict):
+        found = []
+
+        def collect(value):
+            if isinstance(value, dict) and value.get('class_name') == '__keras_tensor__':
+                history = value['config']['keras_history']
+                found.append((history[0], history[1], history[2]))
+            elif isinstance(value, (list, tuple)):
+                for item in value:
+                    collect(item)
+
+        collect(node.get('args', []))
+        return found
+
+    # Keras 2: [[name, node_index, tensor_index, kwargs], ...]
+    return [(entry[0], entry[1], entry[2]) for entry in node]
+
+
+def walk(config: Dict[str, Any], input_shape: Optional[Shape], prefix: str,
+         rows: List[Dict[str, Any]]) -> Shape:
+    """Append a row per leaf layer to `rows` and return the container's output shape"""
+    class_name = config.get('class_name')
+    cfg = config.get('config', {})
+    layers = cfg.get('layers', [])
+
+    if class_name == 'Sequential':
+        shape = input_shape
+        build = cfg.get('build_config') or config.get('build_config') or {}
+        if shape is None and build.get('input_shape'):
+            shape = tuple(build['input_shape'])
+        for layer in layers:
+            if layer.get('class_name') == 'InputLayer':
+                shape = tuple(layer['config'].get('batch_shape') or layer['config']['batch_input_shape'])
+                continue
+            if shape is None:
+                first = layer.get('config', {})
+                declared = first.get('batch_input_shape') or first.get('batch_shape')
+                shape = tuple(declared) if declared else None
+            shape = visit_layer(layer, [shape], prefix, rows)
+        return shape
+
+    # Functional graph: layers are stored in topological order
+    outputs: Dict[str, Shape] = {}
+    input_names = [entry[0] for entry in cfg.get('input_layers', [])]
+    if input_names and isinstance(input_names[0], list):
+        input_names = [entry[0] for entry in input_names]
+    for layer in layers:
+        name = _layer_name(layer)
+        if layer.get('class_name') == 'InputLayer':
+            declared = layer['config'].get('batch_shape') or layer['config'].get('batch_input_shape')
+            outputs[name] = input_shape if (input_shape is not None and name in input_names) else tuple(declared)
+            continue
+        inputs = [outputs[src] for src, _, _ in _inbound_names(layer) if src in outputs]
+        outputs[name] = visit_layer(layer, inputs, prefix, rows)
+
+    output_layers = cfg.get('output_layers', [])
+    if output_layers and isinstance(output_layers[0], list):
+        return outputs[output_layers[0][0]]
+    if output_layers:
+        return outputs[output_layers[0]]
+    return outputs[_layer_name(layers[-1])]
+
+
+def visit_layer(layer: Dict[str, Any], inputs: List[Shape], prefix: str,
+                rows: List[Dict[str, Any]]) -> Shape:
+    class_name = layer.get('class_name')
+    name = f"{prefix}{_layer_name(layer)}"
+    if class_name in CONTAINER_TYPES:
+        return walk(layer, inputs[0] if inputs else None, f"{name}/", rows)
+
+    shape, params, macs = layer_cost(class_name, layer.get('config', {}), inputs)
+    rows.append({
+        "name": name,
+        "class_name": class_name,
+        "output_shape": list(shape),
+        "params": int(params),
+        "macs": int(macs),
+        "trainable": layer.get('config', {}).get('trainable', True)
+    })
+    return shape
+
+
+def profile(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Compute the per-layer breakdown and totals for a model config"""
+    rows: List[Dict[str, Any]] = []
+    output_shape = walk(config, None, "", rows)
+    total_macs = sum(row["macs"] for row in rows) or 1
+    for row in rows:
+        row["macs_percent"] = 100.0 * row["macs"] / total_macs
+
+    by_type: Dict[str, Dict[str, float]] = {}
+    for row in rows:
+        bucket = by_type.setdefault(row["class_name"], {"layers": 0, "params": 0, "macs": 0})
+        bucket["layers"] += 1
+        bucket["params"] += row["params"]
+        bucket["macs"] += row["macs"]
+    for bucket in by_type.values():
+        bucket["macs_percent"] = 100.0 * bucket["macs"] / total_macs
+
+    return {
+        "model_class": config.get('class_name'),
+        "output_shape": list(output_shape),
+        "num_layers": len(rows),
+        "total_params": sum(row["params"] for row in rows),
+        "total_macs": sum(row["macs"] for row in rows),
+        "total_flops": 2 * sum(row["macs"] for row in rows),
+        "by_type": dict(sorted(by_type.items(), key=lambda item: -item[1]["macs"])),
+        "layers": rows
+    }
+
+
+# ---------------------------------------------------------------------------
+# Reporting
+# ---------------------------------------------------------------------------
+
+def _human(value: float, unit: str = '') -> str:
+    for suffix in ('', 'K', 'M', 'G'):
+        if abs(value) < 1000:
+            return f"{value:.1f}{suffix}{unit}" if suffix else f"{value:.0f}{unit}"
+        value /= 1000.0
+    return f"{value:.1f}T{unit}"
+
+
+def print_report(model_path: str, container: Dict[str, Any], report: Dict[str, Any],
+                 top: int, show_all: bool, weights: Optional[List[Dict[str, Any]]]):
+    print(f"🔍 Model: {model_path} ({os.path.getsize(model_path) / (1024*1024):.2f} MB, {container['format']})")
+    if container["metadata"]:
+        print(f"📋 Metadata: {container['metadata']}")
+    print(f"📋 {report['model_class']} with {report['num_layers']} layers, output {report['output_shape']}")
+    print(f"📊 Parameters: {report['total_params']:,} ({report['total_params'] * 4 / (1024*1024):.2f} MB as float32)")
+    print(f"📊 Compute: {_human(report['total_macs'])} MACs ({_human(report['total_flops'], 'FLOPs')}) per image")
+
+    print("\n📊 Compute by layer type:")
+    print(f"  {'type':<24} {'layers':>6} {'params':>12} {'MACs':>10} {'share':>7}")
+    for class_name, bucket in report["by_type"].items():
+        print(f"  {class_name:<24} {bucket['layers']:>6} {bucket['params']:>12,} "
+              f"{_human(bucket['macs']):>10} {bucket['macs_percent']:>6.1f}%")
+
+    rows = report["layers"] if show_all else sorted(report["layers"], key=lambda r: -r["macs"])[:top]
+    title = "All layers" if show_all else f"Top {len(rows)} layers by compute"
+    print(f"\n📊 {title}:")
+    print(f"  {'layer':<48} {'type':<22} {'output':<20} {'params':>10} {'MACs':>9} {'share':>7}")
+    for row in rows:
+        shape = 'x'.join('?' if d is None else str(d) for d in row["output_shape"][1:])
+        print(f"  {row['name'][-48:]:<48} {row['class_name']:<22} {shape:<20} {row['params']:>10,} "
+              f"{_human(row['macs']):>9} {row['macs_percent']:>6.1f}%")
+
+    if weights == []:
+        print("\n💾 Stored weights: no weights")
+    elif weights is not None:
+        total_bytes = sum(w["bytes"] for w in weights)
+        print(f"\n💾 Stored weights: {len(weights)} tensors, {total_bytes / (1024*1024):.2f} MB")
+        for entry in sorted(weights, key=lambda w: -w["bytes"])[:top]:
+            print(f"  {entry['path'][-60:]:<60} {str(entry['shape']):<22} {entry['dtype']:<8} "
+                  f"{entry['bytes'] / 1024:>10.1f} KB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect a Keras model without importing TensorFlow")
+    parser.add_argument("model_path", nargs='?', default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--top", type=int, default=10, help="Number of layers/weights to list")
+    parser.add_argument("--all", action='store_true', help="List every layer in graph order")
+    parser.add_argument("--weights", action='store_true', help="Read weight shapes (requires h5py)")
+    parser.add_argument("--json", action='store_true', help="Print the full report as JSON")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.model_path):
+        print(f"❌ Model file not found: {args.model_path}", file=sys.stderr)
+        sys.exit(1)
+
+    container = read_container(args.model_path)
+    report = profile(container["config"])
+
+    weights = None
+    if args.weights:
+        try:
+            weights = read_weight_shapes(args.model_path, container)
+        except ImportError:
+            print("⚠️ h5py is not installed, skipping weight shapes", file=sys.stderr)
+
+    if args.json:
+        report.update({"model_path": args.model_path, "format": container["format"],
+                       "metadata": container["metadata"], "weights": weights})
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(args.model_path, container, report, args.top, args.all, weights)
+        print(f"\n⏱️ Inspected in {time.perf_counter() - _START:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,46 @@
+import time
+_IMPORT_STARTED = time.perf_counter()
+
 import os
 import io
+import sys
 import json
+import math
+import base64
+import asyncio
+import logging
+import hashlib
+import threading
+from contextlib import ExitStack, contextmanager
 import numpy as np
 from typing import List, Dict, Any, Union, Optional
 from PIL import Image
-import tensorflow as tf
-from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing import image
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
 from pydantic import BaseModel
 import uvicorn
 
+from prediction_log import PredictionLogger
+from memory_governor import BufferPool, MemoryBudgetExceeded, MemoryGovernor, worker_memory_budget
+from gradcam import FeatureCache, GradCAM, overlay_png
+from image_hash import HammingIndex, hash_to_hex, phash
+from single_flight import SingleFlight
+from structured_log import (current_request_id, logging_stats, record_stage, setup_logging,
+                            stage, start_request, stop_logging)
+
+# Optional fast encoders; the standard library is used when they are missing
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Batik Classification API",
@@ -20,6 +48,16 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Structured request logs go through a queue to a background writer thread.
+# LOG_SAMPLE_RATE keeps that share of routine per-request records; warnings,
+# errors and 5xx responses are always written. Probe endpoints are not logged.
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json")
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", "1.0"))
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+LOG_SKIP_PATHS = {"/livez", "/readyz", "/health", "/metrics"}
+logger = logging.getLogger("batik.api")
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -36,26 +74,370 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+class RequestLogMiddleware:
+    """
+    Give every request an ID and write one structured record with its stage timings.
+    
+    A plain ASGI middleware: unlike `@app.middleware("http")` it does not
+    wrap each request and response body in extra tasks and streams.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        request_id = Headers(scope=scope).get("x-request-id", "")[:64] or None
+        context = start_request(request_id)
+        started = time.perf_counter()
+        status = {"code": 500}
+        
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                MutableHeaders(scope=message).append("X-Request-ID", context["request_id"])
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        except Exception:
+            logger.exception("request failed", extra={"fields": {
+                "method": scope["method"], "path": scope["path"], "stages": context["stages"]}})
+            raise
+        if scope["path"] not in LOG_SKIP_PATHS or status["code"] >= 500:
+            logger.log(
+                logging.WARNING if status["code"] >= 500 else logging.INFO,
+                "request",
+                extra={"sample": True, "fields": {
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status["code"],
+                    "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+                    "stages": context["stages"]
+                }}
+            )
+
+app.add_middleware(RequestLogMiddleware)
+
 # Global variables
 MODEL_PATH = "final_tuned_genetic_algorithm_model.keras"
 LABELS_PATH = "labels.txt"
 IMG_SIZE = (160, 160)
 NUM_CLASSES = 60
+TOP_K = 10
+
+# Tiled whole-fabric mode: tiles per short side at each scale, overlap
+# between neighbouring tiles and an upper bound on tiles per request
+TILED_DEFAULT_SCALES = (2, 4)
+TILED_DEFAULT_OVERLAP = 0.5
+TILED_MAX_TILES = int(os.environ.get("TILED_MAX_TILES", "96"))
+# A scale of n tiles along the short side has at least n * n tiles
+TILED_MAX_SCALE = max(1, math.isqrt(TILED_MAX_TILES))
+MSGPACK_MEDIA_TYPE = "application/x-msgpack"
+
+# /predict-batch: files per request, and the opt-in NDJSON streaming mode
+# (?stream=true or Accept: application/x-ndjson), which classifies files in
+# chunks of STREAM_CHUNK_SIZE and writes each result as soon as it is ready
+BATCH_MAX_FILES = 10
+STREAM_BATCH_MAX_FILES = int(os.environ.get("STREAM_BATCH_MAX_FILES", "100"))
+STREAM_CHUNK_SIZE = int(os.environ.get("STREAM_CHUNK_SIZE", "4"))
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Inference runtime: "keras" (full TensorFlow) or "tflite" (slim interpreter)
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "keras")
+TFLITE_MODEL_PATH = os.environ.get("TFLITE_MODEL_PATH", "final_tuned_genetic_algorithm_model.tflite")
+INFERENCE_THREADS = int(os.environ["INFERENCE_THREADS"]) if os.environ.get("INFERENCE_THREADS") else None
+
+# "xla" backend: the Keras model compiled with XLA for fixed batch-size buckets.
+# The traced graph and XLA executables are cached under INFERENCE_CACHE_DIR,
+# keyed by model checksum and TensorFlow version, so replicas started from the
+# same node image skip tracing and compilation.
+INFERENCE_CACHE_DIR = os.environ.get("INFERENCE_CACHE_DIR", "inference_cache")
+JIT_BATCH_BUCKETS = tuple(sorted(int(n) for n in os.environ.get("JIT_BATCH_BUCKETS", "1,2,4,8,16,32").split(",")))
+
+# "ensemble" backend: GA-tuned heads on one shared backbone, fused by
+# build_ensemble.py. The backbone runs once per image and all heads in the
+# same call; ENSEMBLE_COMBINE is "mean" (average of the heads' softmax) or
+# "vote" (share of heads voting for a class, ties broken by the mean).
+ENSEMBLE_MODEL_PATH = os.environ.get("ENSEMBLE_MODEL_PATH", "ensemble_model.keras")
+ENSEMBLE_COMBINE = os.environ.get("ENSEMBLE_COMBINE", "mean")
+
+# Runtime tuning (see autotune.py): TensorFlow thread pools, oneDNN, the
+# largest batch handed to the backend in one call and the uvicorn worker
+# count. Values come from the tuning profile unless set explicitly here.
+# AUTOTUNE=1 tunes before `python main.py` serves if there is no profile yet,
+# AUTOTUNE=force retunes on every start.
+TUNING_PROFILE_PATH = os.environ.get("TUNING_PROFILE_PATH", "tuning_profile.json")
+AUTOTUNE = os.environ.get("AUTOTUNE", "")
+
+def load_tuning_profile(path: str = TUNING_PROFILE_PATH) -> Optional[Dict[str, Any]]:
+    """Read the tuning profile written by autotune.py, if any"""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            profile = json.load(f)
+        print(f"✅ Tuning profile loaded from {path}: {profile['settings']}")
+        if profile.get("cpu_count") != os.cpu_count():
+            print(f"⚠️ Tuning profile was made on {profile.get('cpu_count')} CPUs, this host has {os.cpu_count()}")
+        return profile
+    except Exception as e:
+        print(f"⚠️ Ignoring tuning profile {path}: {e}")
+        return None
+
+def tuned_setting(env_name: str, profile_key: str) -> Optional[int]:
+    """An explicit environment variable wins over the tuning profile"""
+    if os.environ.get(env_name):
+        return int(os.environ[env_name])
+    if tuning_profile and tuning_profile["settings"].get(profile_key) is not None:
+        return int(tuning_profile["settings"][profile_key])
+    return None
+
+tuning_profile = load_tuning_profile()
+TF_INTRA_OP_THREADS = tuned_setting("TF_INTRA_OP_THREADS", "intra_op_threads")
+TF_INTER_OP_THREADS = tuned_setting("TF_INTER_OP_THREADS", "inter_op_threads")
+INFERENCE_BATCH_SIZE = tuned_setting("INFERENCE_BATCH_SIZE", "batch_size")
+SERVER_WORKERS = tuned_setting("WEB_CONCURRENCY", "workers") or 1
+if tuning_profile and tuning_profile["settings"].get("onednn") is not None:
+    # Read by TensorFlow at import time, which happens later in the loader thread
+    os.environ.setdefault("TF_ENABLE_ONEDNN_OPTS", "1" if tuning_profile["settings"]["onednn"] else "0")
+
+# Two-stage cascade: a small first-stage model (.keras or .tflite) answers when
+# its top-1 confidence reaches the threshold; other images go to the full model.
+# Pick the threshold with calibrate_cascade.py.
+CASCADE_MODEL_PATH = os.environ.get("CASCADE_MODEL_PATH")
+CASCADE_THRESHOLD = float(os.environ.get("CASCADE_THRESHOLD", "0.9"))
+
+# Write-behind log of every classification (input hash, top-k, model version,
+# latency) as rotated .jsonl.gz files; an empty PREDICTION_LOG_DIR disables it.
+# Above 80% queue fill only PREDICTION_LOG_BUSY_SAMPLE_RATE of records are kept.
+PREDICTION_LOG_DIR = os.environ.get("PREDICTION_LOG_DIR", "prediction_logs")
+PREDICTION_LOG_QUEUE = int(os.environ.get("PREDICTION_LOG_QUEUE", "10000"))
+PREDICTION_LOG_BUSY_SAMPLE_RATE = float(os.environ.get("PREDICTION_LOG_BUSY_SAMPLE_RATE", "0.1"))
+PREDICTION_LOG_TOP_K = 5
+
+# Inference runs in worker threads; HTTP requests and WebSocket sessions share
+# INFERENCE_CONCURRENCY slots. WS_MAX_SESSIONS bounds open camera streams.
+INFERENCE_CONCURRENCY = int(os.environ.get("INFERENCE_CONCURRENCY", "2"))
+WS_MAX_SESSIONS = int(os.environ.get("WS_MAX_SESSIONS", "32"))
+WS_DEFAULT_TOP_K = 5
+
+# Memory budget of one worker process: defaults to the container's cgroup limit
+# divided by the worker count, since each worker only measures its own RSS.
+# MEMORY_BUDGET_MB, when set, is the per-worker budget. New work is rejected
+# with 503 above MEMORY_REJECT_FRACTION of it and inference batches shrink above
+# MEMORY_SHRINK_FRACTION. INFERENCE_BYTES_PER_IMAGE estimates the backend's
+# working memory per image; uploads larger than MAX_UPLOAD_MB are refused.
+MEMORY_BUDGET_MB = float(os.environ["MEMORY_BUDGET_MB"]) if os.environ.get("MEMORY_BUDGET_MB") else None
+MEMORY_REJECT_FRACTION = float(os.environ.get("MEMORY_REJECT_FRACTION", "0.9"))
+MEMORY_SHRINK_FRACTION = float(os.environ.get("MEMORY_SHRINK_FRACTION", "0.75"))
+INFERENCE_BYTES_PER_IMAGE = int(float(os.environ.get("INFERENCE_MB_PER_IMAGE", "8")) * 1024 * 1024)
+MAX_UPLOAD_BYTES = int(float(os.environ.get("MAX_UPLOAD_MB", "20")) * 1024 * 1024)
+
+# /explain: Grad-CAM heatmaps for the top classes (keras backend only). The last
+# spatial activations of recent /predict and /explain images are kept by content
+# hash, so explaining an image that was just classified skips the backbone.
+# /predict gets them from the same batched Keras pass that classifies the image.
+EXPLAIN_CACHE_SIZE = int(os.environ.get("EXPLAIN_CACHE_SIZE", "64"))
+EXPLAIN_MAX_TOP_K = 5
+
+# Perceptual-hash index of the dataset images, written by dedup_dataset.py.
+# When it exists, /predict reports an upload that is within
+# IMAGE_HASH_MAX_DISTANCE bits of a known image as `seen_image`.
+IMAGE_HASH_INDEX_PATH = os.environ.get("IMAGE_HASH_INDEX_PATH", "image_hash_index.npz")
+IMAGE_HASH_MAX_DISTANCE = int(os.environ.get("IMAGE_HASH_MAX_DISTANCE", "4"))
+
+# Concurrent /predict uploads with identical bytes (same sha256) share one
+# preprocessing and inference run; COALESCE_PREDICTIONS=0 turns this off.
+COALESCE_PREDICTIONS = os.environ.get("COALESCE_PREDICTIONS", "1") != "0"
+
 model = None
+backend = None
+cascade_backend = None
 class_names = None
 model_loading_error = None
+model_version = None
+prediction_logger = None
+explainer = None
+feature_cache = FeatureCache(EXPLAIN_CACHE_SIZE)
+image_index = None
+single_flight = SingleFlight()
+
+# TensorFlow is imported by the background loader, not at module import time,
+# so uvicorn can bind the port (and answer /livez) within a second of starting.
+tf = None
+
+# Model lifecycle: pending -> loading -> warming_up -> ready, or failed
+model_state = {
+    "status": "pending",
+    "stage": "waiting for startup",
+    "started_at": None,
+    "ready_at": None,
+    "load_seconds": None,
+    "cold_to_fast_seconds": None  # process start until requests run on warmed-up code paths
+}
 
 # Pydantic models for request/response
 class PredictionResponse(BaseModel):
     predicted_class: str
     confidence: float
     all_predictions: List[Dict[str, Any]]
+    stage: Optional[int] = None  # cascade stage that answered (1 = small model, 2 = full model)
+    seen_image: Optional[Dict[str, Any]] = None  # near-duplicate dataset image, when the hash index is loaded
+
+# Counters exposed on /metrics
+metrics = {
+    "images_classified": 0,
+    "inference_batches": 0,
+    "inference_seconds": 0.0,
+    "cascade_stage1_answered": 0,
+    "cascade_stage2_answered": 0,
+    "presized_uploads": 0,
+    "ws_sessions_total": 0,
+    "ws_sessions_rejected": 0,
+    "ws_frames_received": 0,
+    "ws_frames_classified": 0,
+    "ws_frames_dropped": 0,
+    "explanations": 0,
+    "hash_lookups": 0,
+    "hash_matches": 0
+}
+metrics_lock = threading.Lock()
+
+memory_governor = MemoryGovernor(
+    int(MEMORY_BUDGET_MB * 1024 * 1024) if MEMORY_BUDGET_MB else worker_memory_budget(SERVER_WORKERS),
+    reject_fraction=MEMORY_REJECT_FRACTION,
+    shrink_fraction=MEMORY_SHRINK_FRACTION
+)
+# Preallocated model inputs, reused across requests
+input_pool = BufferPool((*IMG_SIZE, 3))
+
+# Shared by HTTP and WebSocket inference; created lazily inside the event loop
+inference_slots = None
+inference_waiting = 0
+ws_sessions_active = 0
+
+def count_metric(name: str, value: float = 1):
+    """Thread-safe increment of a /metrics counter"""
+    with metrics_lock:
+        metrics[name] = metrics.get(name, 0) + value
 
 class HealthResponse(BaseModel):
     status: str
     model_loaded: bool
     model_path: str
     model_error: Optional[str] = None
+    model_status: Optional[str] = None
+    loading_stage: Optional[str] = None
+    memory: Optional[Dict[str, Any]] = None
+
+def dumps_json(content: Any) -> bytes:
+    """Compact JSON bytes, with orjson (NumPy-aware) when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """JSON response encoded with orjson (NumPy-aware) when it is installed"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps_json(content)
+
+def render_response(request: Request, content: Dict[str, Any], status_code: int = 200) -> Response:
+    """
+    Serialize data the server built itself, without Pydantic re-validation.
+    
+    Clients that send `Accept: application/x-msgpack` get MessagePack.
+    """
+    if msgpack is not None and MSGPACK_MEDIA_TYPE in request.headers.get("accept", ""):
+        return Response(
+            content=msgpack.packb(content, use_bin_type=True),
+            status_code=status_code,
+            media_type=MSGPACK_MEDIA_TYPE
+        )
+    return FastJSONResponse(content=content, status_code=status_code)
+
+def class_label(index: int) -> str:
+    """Name of a model output index, tolerating outputs beyond labels.txt"""
+    if index < len(class_names):
+        return class_names[index]
+    return f"batik_class_{index}"
+
+def top_k_predictions(probabilities: np.ndarray, k: int = TOP_K) -> List[Dict[str, Any]]:
+    """Top-k classes of one probability vector, highest first"""
+    k = min(k, probabilities.shape[0])
+    top = np.argpartition(-probabilities, k - 1)[:k]
+    top = top[np.argsort(-probabilities[top], kind="stable")]
+    # tolist() converts to Python floats/ints in one pass
+    return [
+        {"class": class_label(index), "confidence": confidence, "rank": index + 1}
+        for index, confidence in zip(top.tolist(), probabilities[top].tolist())
+    ]
+
+def file_version(path: str) -> str:
+    """Model version recorded in the prediction log: file name plus content hash"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return f"{os.path.basename(path)}@{digest.hexdigest()[:12]}"
+
+def log_prediction(endpoint: str, image_bytes: bytes, probabilities: np.ndarray,
+                   stage: Optional[int], latency_seconds: float, filename: Optional[str] = None,
+                   image_hash: Optional[str] = None):
+    """Queue a prediction record for the write-behind log; never blocks or raises"""
+    if prediction_logger is None:
+        return
+    try:
+        k = min(PREDICTION_LOG_TOP_K, probabilities.shape[0])
+        top = np.argpartition(-probabilities, k - 1)[:k]
+        top = top[np.argsort(-probabilities[top], kind="stable")]
+        prediction_logger.log({
+            "ts": time.time(),
+            "endpoint": endpoint,
+            "sha256": hashlib.sha256(image_bytes).hexdigest(),
+            "phash": image_hash,
+            "filename": filename,
+            "predicted_index": int(top[0]),
+            "predicted_class": class_label(int(top[0])),
+            "confidence": float(probabilities[top[0]]),
+            "top_k": [[i, round(c, 6)] for i, c in zip(top.tolist(), probabilities[top].tolist())],
+            "stage": stage,
+            "latency_ms": round(latency_seconds * 1000, 3),
+            "model_version": model_version,
+            "backend": backend.name if backend else None,
+            "request_id": current_request_id()
+        })
+    except Exception as e:
+        logger.warning("could not log prediction", extra={"fields": {"error": str(e)}})
+
+def set_model_state(status: str, stage: str):
+    """Record loading progress for /readyz, /livez and /health"""
+    model_state["status"] = status
+    model_state["stage"] = stage
+    print(f"📋 Model status: {status} ({stage})")
+
+def load_tensorflow():
+    """Import TensorFlow on first use; it is the slowest part of startup"""
+    global tf
+    if tf is None:
+        set_model_state("loading", "importing tensorflow")
+        started = time.perf_counter()
+        import tensorflow
+        tf = tensorflow
+        print(f"✅ TensorFlow {tf.__version__} imported in {time.perf_counter() - started:.2f}s")
+        # Thread pools can only be sized before TensorFlow runs its first op
+        if TF_INTRA_OP_THREADS:
+            tf.config.threading.set_intra_op_parallelism_threads(TF_INTRA_OP_THREADS)
+        if TF_INTER_OP_THREADS:
+            tf.config.threading.set_inter_op_parallelism_threads(TF_INTER_OP_THREADS)
+        if TF_INTRA_OP_THREADS or TF_INTER_OP_THREADS:
+            print(f"🔧 TensorFlow threads: intra-op {TF_INTRA_OP_THREADS or 'default'}, "
+                  f"inter-op {TF_INTER_OP_THREADS or 'default'}")
+    return tf
 
 def load_batik_names():
     """Load batik names from labels.txt"""
@@ -76,6 +458,10 @@ def load_model_with_fallback():
     """Load model with fallback for different TensorFlow versions"""
     global model, model_loading_error
     
+    load_tensorflow()
+    from tensorflow.keras.models import load_model
+    set_model_state("loading", "loading model weights")
+    
     print(f"🔍 Starting model loading process...")
     print(f"📁 Model path: {os.path.abspath(MODEL_PATH)}")
     print(f"📁 Model exists: {os.path.exists(MODEL_PATH)}")
@@ -208,93 +594,767 @@ def load_model_with_fallback():
                     model_loading_error = f"Model loading failed after multiple attempts. Last error: {str(e4)}"
                     return False
 
+class InferenceBackend:
+    """Common interface for the runtimes that can serve the classifier"""
+    name = "base"
+    model_path = None
+    input_size = IMG_SIZE
+
+    def load(self):
+        """Load the model; raise on failure"""
+        raise NotImplementedError
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        """Return class probabilities for a preprocessed (N, H, W, 3) batch"""
+        raise NotImplementedError
+
+class KerasBackend(InferenceBackend):
+    """The full TensorFlow/Keras model, loaded with the version fallbacks above"""
+    name = "keras"
+
+    def __init__(self, model_path: str = MODEL_PATH):
+        self.model_path = model_path
+        self.model = None
+
+    def load(self):
+        if self.model_path == MODEL_PATH:
+            if not load_model_with_fallback():
+                raise RuntimeError(model_loading_error or "Keras model loading failed")
+            self.model = model
+        else:
+            # Auxiliary models (e.g. the cascade's first stage) need no fallbacks
+            self.model = load_tensorflow().keras.models.load_model(self.model_path, compile=False)
+        self.input_size = tuple(self.model.input_shape[1:3])
+        if INFERENCE_THREADS:
+            print("⚠️ INFERENCE_THREADS is only applied by the tflite backend, use TF_INTRA_OP_THREADS")
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return self.model.predict(batch, verbose=0)
+
+class TFLiteBackend(InferenceBackend):
+    """
+    A TFLite interpreter running a graph exported with export_tflite.py.
+    
+    Uses the standalone `tflite_runtime` package when installed (see
+    requirements-lite.txt), so the serving image does not need TensorFlow.
+    """
+    name = "tflite"
+
+    def __init__(self, model_path: str = TFLITE_MODEL_PATH,
+                 num_threads: Optional[int] = INFERENCE_THREADS or TF_INTRA_OP_THREADS):
+        self.model_path = model_path
+        self.num_threads = num_threads
+        self.interpreter = None
+        # The interpreter holds mutable input/output buffers
+        self._lock = threading.Lock()
+
+    def load(self):
+        set_model_state("loading", "loading tflite interpreter")
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            Interpreter = load_tensorflow().lite.Interpreter
+        self.interpreter = Interpreter(model_path=self.model_path, num_threads=self.num_threads)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self.input_size = tuple(int(d) for d in self._input['shape'][1:3])
+        print(f"✅ TFLite model loaded: input {self._input['shape']} {self._input['dtype'].__name__}, "
+              f"output {self._output['shape']}")
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        with self._lock:
+            if tuple(self._input['shape']) != batch.shape:
+                self.interpreter.resize_tensor_input(self._input['index'], batch.shape)
+                self.interpreter.allocate_tensors()
+                self._input = self.interpreter.get_input_details()[0]
+                self._output = self.interpreter.get_output_details()[0]
+
+            scale, zero_point = self._input['quantization']
+            if scale:
+                batch = np.round(batch / scale + zero_point)
+            self.interpreter.set_tensor(self._input['index'], batch.astype(self._input['dtype']))
+            self.interpreter.invoke()
+            output = self.interpreter.get_tensor(self._output['index'])
+
+            scale, zero_point = self._output['quantization']
+            if scale:
+                output = (output.astype(np.float32) - zero_point) * scale
+            return np.array(output, dtype=np.float32)
+
+class XLABackend(KerasBackend):
+    """
+    The Keras model as XLA-compiled functions, one per batch-size bucket.
+    
+    Batches are zero-padded up to the next bucket so only len(buckets)
+    executables ever exist, and all of them are compiled during warm-up.
+    A SavedModel with one signature per bucket and XLA's persistent
+    executable cache live in a cache directory keyed by the model checksum
+    and TensorFlow version; a warm cache skips Keras loading, tracing and
+    compilation.
+    """
+    name = "xla"
+
+    def __init__(self, model_path: str = MODEL_PATH, buckets=JIT_BATCH_BUCKETS):
+        super().__init__(model_path)
+        self.buckets = buckets
+        self.functions = {}
+        self.cache_path = None
+        self.cache_hit = False
+        self.bucket_timings = {}
+
+    def cache_key(self) -> str:
+        """Model checksum plus TensorFlow version, known without importing TensorFlow"""
+        from importlib.metadata import PackageNotFoundError, version
+        try:
+            tf_version = version("tensorflow")
+        except PackageNotFoundError:
+            tf_version = "unknown"
+        return f"{file_version(self.model_path).split('@')[1]}-tf{tf_version}"
+
+    def load(self):
+        self.cache_path = os.path.abspath(os.path.join(INFERENCE_CACHE_DIR, self.cache_key()))
+        saved_model_path = os.path.join(self.cache_path, "saved_model")
+        os.makedirs(os.path.join(self.cache_path, "xla"), exist_ok=True)
+        # XLA reads its flags when it first compiles, so this must precede any compilation
+        xla_flags = os.environ.get("TF_XLA_FLAGS", "")
+        if "tf_xla_persistent_cache_directory" not in xla_flags:
+            os.environ["TF_XLA_FLAGS"] = (f"{xla_flags} --tf_xla_persistent_cache_directory="
+                                          f"{os.path.join(self.cache_path, 'xla')}").strip()
+        tf = load_tensorflow()
+
+        if os.path.exists(os.path.join(saved_model_path, "saved_model.pb")):
+            set_model_state("loading", "loading compiled graph from cache")
+            try:
+                loaded = tf.saved_model.load(saved_model_path)
+                self.functions = {n: loaded.signatures[f"serve_b{n}"] for n in self.buckets}
+                self.input_size = tuple(int(d) for d in
+                                        self.functions[self.buckets[0]].structured_input_signature[1]["images"].shape[1:3])
+                self.model = loaded
+                self.cache_hit = True
+                print(f"✅ Compiled graph loaded from cache: {self.cache_path}")
+                return
+            except Exception as e:
+                print(f"⚠️ Compiled graph cache unusable, rebuilding: {e}")
+
+        super().load()
+        set_model_state("loading", "tracing XLA graph")
+        keras_model = self.model
+        module = tf.Module()
+        module.model = keras_model
+        signatures = {}
+        for n in self.buckets:
+            spec = tf.TensorSpec((n, *self.input_size, 3), tf.float32, name="images")
+            function = tf.function(lambda images: {"probabilities": keras_model(images, training=False)},
+                                   jit_compile=True, input_signature=[spec])
+            signatures[f"serve_b{n}"] = function.get_concrete_function()
+        self.functions = {n: signatures[f"serve_b{n}"] for n in self.buckets}
+        try:
+            tf.saved_model.save(module, saved_model_path, signatures=signatures)
+            print(f"✅ Compiled graph cached in {self.cache_path}")
+        except Exception as e:
+            print(f"⚠️ Could not cache the compiled graph: {e}")
+
+    def compile_buckets(self):
+        """Run every bucket twice: the first call compiles (or loads the cached executable)"""
+        for n in self.buckets:
+            batch = np.zeros((n, *self.input_size, 3), dtype=np.float32)
+            timings = []
+            for _ in range(2):
+                started = time.perf_counter()
+                self._call(n, batch)
+                timings.append(time.perf_counter() - started)
+            self.bucket_timings[n] = {"first_ms": round(timings[0] * 1000, 1),
+                                      "steady_ms": round(timings[1] * 1000, 1)}
+            print(f"⚡ Bucket {n:3d}: first call {timings[0] * 1000:8.1f} ms, then {timings[1] * 1000:6.1f} ms")
+
+    def _call(self, bucket: int, batch: np.ndarray) -> np.ndarray:
+        return self.functions[bucket](images=tf.constant(batch))["probabilities"].numpy()
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        largest = self.buckets[-1]
+        if len(batch) > largest:
+            return np.concatenate([self.predict(batch[i:i + largest]) for i in range(0, len(batch), largest)])
+        bucket = next(n for n in self.buckets if n >= len(batch))
+        padded = batch.astype(np.float32, copy=False)
+        if bucket != len(batch):
+            padded = np.concatenate([padded, np.zeros((bucket - len(batch), *batch.shape[1:]), np.float32)])
+        return self._call(bucket, padded)[:len(batch)]
+
+class EnsembleBackend(KerasBackend):
+    """
+    Several GA heads fused onto one backbone by build_ensemble.py.
+    
+    The model returns (N, heads, classes); the heads' softmax outputs are
+    combined into one distribution so the rest of the service is unchanged.
+    """
+    name = "ensemble"
+    COMBINE_RULES = ("mean", "vote")
+
+    def __init__(self, model_path: str = ENSEMBLE_MODEL_PATH, combine: str = ENSEMBLE_COMBINE):
+        if combine not in self.COMBINE_RULES:
+            raise ValueError(f"Unknown ENSEMBLE_COMBINE '{combine}', expected one of {self.COMBINE_RULES}")
+        super().__init__(model_path)
+        self.combine = combine
+        self.num_heads = None
+
+    def load(self):
+        super().load()
+        if len(self.model.output_shape) != 3:
+            raise RuntimeError(f"{self.model_path} is not a fused ensemble, build it with build_ensemble.py")
+        self.num_heads = int(self.model.output_shape[1])
+        print(f"✅ Ensemble of {self.num_heads} heads on a shared backbone, combined by {self.combine}")
+
+    def combine_heads(self, head_probs: np.ndarray) -> np.ndarray:
+        mean = head_probs.mean(axis=1)
+        if self.combine == "mean":
+            return mean
+        votes = np.zeros_like(mean)
+        rows = np.arange(len(head_probs))[:, np.newaxis]
+        np.add.at(votes, (rows, head_probs.argmax(axis=2)), 1.0)
+        # Whole votes always outweigh the mean, which only breaks ties
+        return (votes + mean) / (head_probs.shape[1] + 1)
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return self.combine_heads(np.asarray(self.model.predict(batch, verbose=0)))
+
+BACKENDS = {
+    "keras": KerasBackend,
+    "tflite": TFLiteBackend,
+    "xla": XLABackend,
+    "ensemble": EnsembleBackend
+}
+
+def create_backend(name: str = INFERENCE_BACKEND) -> InferenceBackend:
+    """Instantiate the configured inference backend"""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown INFERENCE_BACKEND '{name}', expected one of {sorted(BACKENDS)}")
+    return BACKENDS[name]()
+
+def backend_for_path(model_path: str) -> InferenceBackend:
+    """Backend for an auxiliary model file, chosen by its extension"""
+    if model_path.endswith('.tflite'):
+        return TFLiteBackend(model_path)
+    return KerasBackend(model_path)
+
+def load_cascade_backend():
+    """Load the cascade's first-stage model; the service runs without it on failure"""
+    global cascade_backend
+    if not CASCADE_MODEL_PATH:
+        return
+    try:
+        set_model_state("loading", "loading cascade first-stage model")
+        candidate = backend_for_path(CASCADE_MODEL_PATH)
+        candidate.load()
+        candidate.predict(np.zeros((1, *candidate.input_size, 3), dtype=np.float32))
+        cascade_backend = candidate
+        print(f"✅ Cascade stage 1 loaded: {CASCADE_MODEL_PATH} "
+              f"(input {candidate.input_size}, threshold {CASCADE_THRESHOLD})")
+    except Exception as e:
+        cascade_backend = None
+        print(f"⚠️ Cascade stage 1 could not be loaded, serving the full model only: {e}")
+
+def load_explainer():
+    """Build the Grad-CAM explainer for /explain; only the keras backend has the graph for it"""
+    global explainer
+    explainer = None
+    if backend.name != "keras":
+        print(f"ℹ️ /explain is unavailable with the {backend.name} backend")
+        return
+    try:
+        set_model_state("warming_up", "building Grad-CAM explainer")
+        candidate = GradCAM(backend.model, load_tensorflow())
+        # Trace both paths: the batched one used by /predict and the one for heatmaps
+        features, _ = candidate.predict(np.zeros((1, *IMG_SIZE, 3), dtype=np.float32))
+        candidate.heatmaps(features[0], [0])
+        explainer = candidate
+        print(f"✅ Grad-CAM explainer ready on layer '{explainer.layer_name}' {explainer.feature_shape}")
+    except Exception as e:
+        print(f"⚠️ Grad-CAM explainer could not be built, /explain is unavailable: {e}")
+
+def load_image_index():
+    """Load the dataset's perceptual-hash index if dedup_dataset.py has written one"""
+    global image_index
+    if not IMAGE_HASH_INDEX_PATH or not os.path.exists(IMAGE_HASH_INDEX_PATH):
+        return
+    try:
+        image_index = HammingIndex.load(IMAGE_HASH_INDEX_PATH)
+        note = ""
+        if IMAGE_HASH_MAX_DISTANCE > image_index.max_distance:
+            note = f" (built for {image_index.max_distance} bits, larger distances may be missed)"
+        print(f"✅ Image hash index loaded: {len(image_index)} images{note}")
+    except Exception as e:
+        print(f"⚠️ Could not load image hash index {IMAGE_HASH_INDEX_PATH}: {e}")
+
+def find_seen_image(image: np.ndarray) -> Optional[Dict[str, Any]]:
+    """
+    Look up a preprocessed image (H, W, 3) in the hash index. Returns its
+    hash and, for a near-duplicate of a dataset image, that image's record.
+    """
+    value = phash(image)
+    match = image_index.nearest(value, IMAGE_HASH_MAX_DISTANCE)
+    count_metric("hash_lookups")
+    result = {"phash": hash_to_hex(value), "match": None}
+    if match is not None:
+        count_metric("hash_matches")
+        item, distance = match
+        result["match"] = {**item, "distance": distance}
+    return result
+
+def warm_up_model():
+    """Run the first predictions once so requests never hit cold code paths"""
+    set_model_state("warming_up", "running warm-up predictions")
+    if isinstance(backend, XLABackend):
+        backend.compile_buckets()
+    
+    # Test model with a dummy input
+    test_input = np.random.random((1, *IMG_SIZE, 3)).astype(np.float32)
+    test_prediction = backend.predict(test_input)
+    print(f"✅ Model test prediction successful: {test_prediction.shape}")
+    
+    # Validate that we're using the original model, not a fallback:
+    # a model without proper weights gives the same value for every class
+    unique_values = len(np.unique(test_prediction))
+    if unique_values <= 1:
+        raise RuntimeError("Model appears to be using fallback (random predictions). Please check model loading.")
+    print(f"✅ Model validation passed: {unique_values} unique prediction values")
+
 def load_model_and_classes():
-    """Load the trained model and class names"""
-    global model, class_names, model_loading_error
+    """Load the configured inference backend and class names"""
+    global backend, class_names, model_loading_error, model_version
     
+    model_state["started_at"] = time.time()
     try:
+        candidate = create_backend()
+        
         # Check if model file exists
-        if not os.path.exists(MODEL_PATH):
-            error_msg = f"Model file not found: {MODEL_PATH}"
+        if not os.path.exists(candidate.model_path):
+            error_msg = f"Model file not found: {candidate.model_path}"
             print(f"❌ {error_msg}")
             model_loading_error = error_msg
+            set_model_state("failed", error_msg)
             return False
         
         # Check file size
-        file_size = os.path.getsize(MODEL_PATH)
-        print(f"📁 Model file found: {MODEL_PATH} ({file_size / (1024*1024):.2f} MB)")
+        file_size = os.path.getsize(candidate.model_path)
+        print(f"📁 Model file found: {candidate.model_path} ({file_size / (1024*1024):.2f} MB)")
         
-        # Load the model with fallback
-        success = load_model_with_fallback()
-        if not success:
-            return False
+        # Load the model (the keras backend applies its version fallbacks)
+        candidate.load()
+        backend = candidate
         
-        print(f"✅ Model berhasil dimuat dari: {MODEL_PATH}")
+        print(f"✅ Model berhasil dimuat dari: {backend.model_path} (backend: {backend.name})")
+        model_version = file_version(backend.model_path)
+        if tuning_profile and tuning_profile.get("model_version") not in (None, model_version):
+            print(f"⚠️ Tuning profile was made for {tuning_profile['model_version']}, "
+                  f"rerun autotune.py for {model_version}")
         
         # Load batik names from labels.txt
         class_names = load_batik_names()
         print(f"✅ Batik names loaded: {len(class_names)} classes")
         
-        # Test model with a dummy input
-        test_input = np.random.random((1, *IMG_SIZE, 3))
-        test_prediction = model.predict(test_input, verbose=0)
-        print(f"✅ Model test prediction successful: {test_prediction.shape}")
+        warm_up_model()
+        load_cascade_backend()
+        load_explainer()
+        load_image_index()
         
         model_loading_error = None
+        model_state["ready_at"] = time.time()
+        model_state["load_seconds"] = model_state["ready_at"] - model_state["started_at"]
+        model_state["cold_to_fast_seconds"] = time.perf_counter() - _IMPORT_STARTED
+        set_model_state("ready", f"ready in {model_state['load_seconds']:.1f}s")
+        cache_note = ""
+        if isinstance(backend, XLABackend):
+            cache_note = f" (compiled graph cache {'hit' if backend.cache_hit else 'miss'})"
+        print(f"⚡ Cold start to first fast request: {model_state['cold_to_fast_seconds']:.1f}s{cache_note}")
         return True
         
     except Exception as e:
         error_msg = f"Error loading model: {str(e)}"
         print(f"❌ {error_msg}")
         model_loading_error = error_msg
+        set_model_state("failed", error_msg)
         return False
 
-def preprocess_image(image_file: bytes) -> np.ndarray:
-    """Preprocess image for model prediction"""
+def background_load():
+    """Load TensorFlow and the model off the event loop"""
+    success = load_model_and_classes()
+    if not success:
+        print("⚠️ Warning: Model could not be loaded. API will not function properly.")
+        print(f"🔍 Model loading error: {model_loading_error}")
+
+def require_model():
+    """Raise 503 unless the model is loaded and warmed up"""
+    if model_state["status"] != "ready":
+        raise HTTPException(
+            status_code=503,
+            detail=f"Model not loaded. Status: {model_state['status']} ({model_state['stage']}). "
+                   f"Error: {model_loading_error or 'None'}",
+            headers={"Retry-After": "5"}
+        )
+
+@contextmanager
+def reserve_memory(nbytes: int):
+    """Hold part of the memory budget for a request; 503 when it does not fit"""
+    try:
+        with memory_governor.reserve(nbytes):
+            yield
+    except MemoryBudgetExceeded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "2"})
+
+def request_memory(upload_bytes: int, images: int) -> int:
+    """Memory one request needs besides decoding: upload, model inputs and inference"""
+    return upload_bytes + images * (IMG_SIZE[0] * IMG_SIZE[1] * 3 * 4 + INFERENCE_BYTES_PER_IMAGE)
+
+async def read_upload(file: UploadFile) -> bytes:
+    """Read an upload, refusing ones above MAX_UPLOAD_BYTES before buffering them"""
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Image larger than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB")
+    with stage("read"):
+        return await file.read()
+
+def preprocess_image(image_file: bytes, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Preprocess image for model prediction.
+    
+    With `out` (a float32 array of shape (*IMG_SIZE, 3), e.g. a row of a
+    pooled batch) the result is written there instead of a new array.
+    """
+    started = time.perf_counter()
     try:
         # Convert bytes to PIL Image
         img = Image.open(io.BytesIO(image_file))
         
-        # Convert to RGB if necessary
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
+        # Decoding needs the full-resolution pixels in memory at once
+        with memory_governor.reserve(img.width * img.height * 4):
+            # Convert to RGB if necessary
+            if img.mode != 'RGB':
+                img = img.convert('RGB')
+            
+            # Resize image; uploads already at the model size (e.g. resized by
+            # batik_client) skip this step
+            if img.size != IMG_SIZE:
+                img = img.resize(IMG_SIZE)
+            else:
+                count_metric("presized_uploads")
         
-        # Resize image
-        img = img.resize(IMG_SIZE)
+        # Normalize pixel values to [0, 1] (in float32, as before)
+        if out is None:
+            out = np.empty((*IMG_SIZE, 3), dtype=np.float32)
+        np.divide(np.asarray(img), np.float32(255.0), out=out, casting='unsafe')
         
-        # Convert to numpy array
-        img_array = image.img_to_array(img)
+        # Add batch dimension
+        return out[np.newaxis]
+    except MemoryBudgetExceeded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "2"})
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error preprocessing image: {str(e)}")
+    finally:
+        record_stage("decode", time.perf_counter() - started)
+
+def resize_batch(batch: np.ndarray, size) -> np.ndarray:
+    """Resize a preprocessed [0, 1] batch, e.g. for a lower-resolution cascade stage"""
+    if tuple(batch.shape[1:3]) == tuple(size):
+        return batch
+    pixels = np.round(batch * 255.0).astype(np.uint8)
+    resized = [np.asarray(Image.fromarray(p).resize((size[1], size[0])), dtype=np.float32) for p in pixels]
+    return np.stack(resized) / 255.0
+
+def predict_chunked(runtime: InferenceBackend, batch: np.ndarray) -> np.ndarray:
+    """Call the backend with at most INFERENCE_BATCH_SIZE images at a time (fewer when memory is tight)"""
+    # Under memory pressure the governor shrinks the chunk size
+    size = memory_governor.batch_limit(INFERENCE_BATCH_SIZE or len(batch))
+    if len(batch) <= size:
+        return runtime.predict(batch)
+    return np.concatenate([runtime.predict(batch[i:i + size]) for i in range(0, len(batch), size)])
+
+def predict_with_features(batch: np.ndarray, cache_keys: List[str]) -> np.ndarray:
+    """
+    Full keras model with the explainer's activations kept for /explain.
+    
+    Chunked like `predict_chunked`; each chunk goes through Keras' batched
+    predict loop on the split model, whose layers are the served model's.
+    A chunk whose activations do not fit the memory budget is classified
+    without them.
+    """
+    size = memory_governor.batch_limit(INFERENCE_BATCH_SIZE or len(batch))
+    probabilities = []
+    for i in range(0, len(batch), size):
+        chunk = batch[i:i + size]
+        try:
+            with memory_governor.reserve(len(chunk) * explainer.feature_bytes):
+                features, chunk_probabilities = explainer.predict(chunk)
+        except MemoryBudgetExceeded:
+            probabilities.append(backend.predict(chunk))
+            continue
+        for key, image_features, image_probabilities in zip(cache_keys[i:i + size], features, chunk_probabilities):
+            feature_cache.put(key, image_features, image_probabilities)
+        probabilities.append(chunk_probabilities)
+    return probabilities[0] if len(probabilities) == 1 else np.concatenate(probabilities)
+
+def predict_full_model(batch: np.ndarray, cache_keys: Optional[List[str]] = None) -> np.ndarray:
+    """Run the full model; with `cache_keys` (content hashes) and an explainer, also cache activations"""
+    if cache_keys is None or explainer is None or not EXPLAIN_CACHE_SIZE:
+        return predict_chunked(backend, batch)
+    return predict_with_features(batch, cache_keys)
+
+def run_inference(batch: np.ndarray, cache_keys: Optional[List[str]] = None):
+    """
+    Classify a preprocessed batch, returning (probabilities, stages).
+    
+    Without a cascade every image is answered by the full model (stage 2).
+    With one, the small stage-1 model sees the whole batch and only images
+    whose top-1 confidence is below CASCADE_THRESHOLD are re-run on the full
+    model. `cache_keys` (image content hashes) keep the full model's
+    activations for /explain.
+    """
+    started = time.perf_counter()
+    stages = np.full(len(batch), 2, dtype=np.int8)
+    
+    if cascade_backend is None:
+        probabilities = predict_full_model(batch, cache_keys)
+    else:
+        probabilities = np.asarray(predict_chunked(cascade_backend, resize_batch(batch, cascade_backend.input_size)))
+        confident = probabilities.max(axis=1) >= CASCADE_THRESHOLD
+        stages[confident] = 1
+        uncertain = np.flatnonzero(~confident)
+        if len(uncertain):
+            probabilities = probabilities.copy()
+            probabilities[uncertain] = predict_full_model(
+                batch[uncertain], [cache_keys[i] for i in uncertain] if cache_keys else None)
+        count_metric("cascade_stage1_answered", int(confident.sum()))
+        count_metric("cascade_stage2_answered", int(len(uncertain)))
+    
+    count_metric("images_classified", len(batch))
+    count_metric("inference_batches")
+    count_metric("inference_seconds", time.perf_counter() - started)
+    return probabilities, stages
+
+async def run_inference_async(fn, *args):
+    """
+    Run a blocking inference function in a worker thread once a shared
+    inference slot is free, so the event loop keeps serving other requests.
+    
+    A cancelled caller is only released once the worker thread has finished:
+    the thread cannot be interrupted and may still be reading the caller's
+    pooled input buffers, which must not go back to the pool before then.
+    """
+    global inference_slots, inference_waiting
+    if inference_slots is None:
+        inference_slots = asyncio.Semaphore(INFERENCE_CONCURRENCY)
+    inference_waiting += 1
+    try:
+        with stage("queue_wait"):
+            await inference_slots.acquire()
+    finally:
+        inference_waiting -= 1
+    try:
+        with stage("inference"):
+            work = asyncio.ensure_future(run_in_threadpool(fn, *args))
+            try:
+                return await asyncio.shield(work)
+            except asyncio.CancelledError:
+                while not work.done():
+                    try:
+                        await asyncio.wait([work])
+                    except asyncio.CancelledError:
+                        pass
+                if not work.cancelled():
+                    work.exception()  # nobody will read the result
+                raise
+    finally:
+        inference_slots.release()
+
+def predict_probabilities(batch: np.ndarray) -> np.ndarray:
+    """Run the loaded model on a preprocessed batch and return class probabilities"""
+    return run_inference(batch)[0]
+
+def _tile_positions(length: int, tile: int, stride: int) -> List[int]:
+    """Tile offsets along one axis; the last tile is aligned to the edge"""
+    if length <= tile:
+        return [0]
+    positions = list(range(0, length - tile + 1, stride))
+    if positions[-1] != length - tile:
+        positions.append(length - tile)
+    return positions
+
+def _tile_grid(width: int, height: int, tiles_per_side: int, overlap: float):
+    """Resized image size and tile offsets for one scale"""
+    tile = IMG_SIZE[0]
+    factor = tile * tiles_per_side / min(width, height)
+    size = (max(tile, round(width * factor)), max(tile, round(height * factor)))
+    stride = max(1, int(round(tile * (1.0 - overlap))))
+    return size, _tile_positions(size[1], tile, stride), _tile_positions(size[0], tile, stride)
+
+class TileLimitExceeded(ValueError):
+    """Even one scale without overlap needs more tiles than allowed"""
+
+def plan_tiles(width: int, height: int, scales: List[int], overlap: float, max_tiles: int):
+    """
+    Choose scales and overlap so the tile count stays within `max_tiles`.
+    
+    The cap is met by first reducing overlap, then dropping the finest
+    scales, then coarsening the last remaining scale, so latency stays
+    bounded even on 24 MP photographs. A very elongated image can need more
+    tiles than `max_tiles` even at scale 1; that raises TileLimitExceeded.
+    """
+    scales = sorted(set(max(1, int(n)) for n in scales))
+    overlap = min(max(overlap, 0.0), 0.75)
+
+    def count(levels, ov):
+        total = 0
+        for n in levels:
+            _, ys, xs = _tile_grid(width, height, n, ov)
+            total += len(ys) * len(xs)
+        return total
+
+    capped = False
+    while count(scales, overlap) > max_tiles and overlap > 0:
+        overlap = max(0.0, overlap - 0.25)
+        capped = True
+    while count(scales, overlap) > max_tiles and len(scales) > 1:
+        scales.pop()
+        capped = True
+    if count(scales, overlap) > max_tiles and scales[0] > 1:
+        # The tile count grows with the scale: bisect for the finest one that fits
+        low, high = 1, scales[0] - 1
+        while low < high:
+            middle = (low + high + 1) // 2
+            if count([middle], overlap) <= max_tiles:
+                low = middle
+            else:
+                high = middle - 1
+        scales = [low]
+        capped = True
+    tiles = count(scales, overlap)
+    if tiles > max_tiles:
+        raise TileLimitExceeded(f"Image needs {tiles} tiles at the coarsest scale, "
+                                f"more than max_tiles={max_tiles}")
+    return scales, overlap, capped
+
+def extract_tiles(img: Image.Image, tiles_per_side: int, overlap: float):
+    """
+    Cut one scale of the image into overlapping model-sized tiles.
+    
+    The image is resized once; tiles are taken as a strided view of the
+    array and gathered in one vectorized indexing step (no per-tile crops).
+    Returns the (N, H, W, 3) float tiles and the (rows, cols) grid shape.
+    """
+    tile = IMG_SIZE[0]
+    size, ys, xs = _tile_grid(img.width, img.height, tiles_per_side, overlap)
+    pixels = np.asarray(img.resize(size, Image.BILINEAR), dtype=np.uint8)
+    windows = np.lib.stride_tricks.sliding_window_view(pixels, (tile, tile), axis=(0, 1))
+    # windows[y, x] has shape (3, tile, tile); pick the grid and move channels last
+    tiles = windows[np.ix_(ys, xs)].reshape(len(ys) * len(xs), 3, tile, tile).transpose(0, 2, 3, 1)
+    return tiles.astype(np.float32) / 255.0, (len(ys), len(xs))
+
+def classify_tiled(image_file: bytes, scales: List[int], overlap: float, max_tiles: int) -> Dict[str, Any]:
+    """Classify all tiles of all scales in one batched pass and aggregate them"""
+    started = time.perf_counter()
+    try:
+        img = Image.open(io.BytesIO(image_file))
+        width, height = img.size
+        scales, overlap, capped = plan_tiles(width, height, scales, overlap, max_tiles)
         
-        # Normalize pixel values to [0, 1]
-        img_array = img_array / 255.0
+        # Let the JPEG decoder downscale while decoding, which is much cheaper
+        # than decoding all 24 MP and resizing afterwards
+        target = IMG_SIZE[0] * scales[-1] / min(width, height)
+        img.draft('RGB', (int(width * target), int(height * target)))
         
-        # Add batch dimension
-        img_array = np.expand_dims(img_array, axis=0)
+        # Tiles are cut from the drafted image, which may be a little smaller
+        # than requested, so the tile count is planned again on its size
+        scales, overlap, recapped = plan_tiles(img.width, img.height, scales, overlap, max_tiles)
+        capped = capped or recapped
         
-        return img_array
+        # The decoded pixels are the largest allocation of the request
+        with memory_governor.reserve(img.width * img.height * 4):
+            if img.mode != 'RGB':
+                img = img.convert('RGB')
+            levels = [extract_tiles(img, n, overlap) for n in scales]
+    except MemoryBudgetExceeded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "2"})
+    except TileLimitExceeded as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error preprocessing image: {str(e)}")
+    
+    batch = np.concatenate([tiles for tiles, _ in levels], axis=0)
+    probabilities = predict_probabilities(batch)
+    tile_classes = np.argmax(probabilities, axis=1)
+    tile_confidence = probabilities[np.arange(len(tile_classes)), tile_classes]
+    
+    # Soft vote: mean probability over all tiles; hard vote: tiles per top-1 class
+    mean_probabilities = probabilities.mean(axis=0)
+    all_predictions = top_k_predictions(mean_probabilities)
+    log_prediction("predict-tiled", image_file, mean_probabilities, None, time.perf_counter() - started)
+    votes = np.bincount(tile_classes, minlength=probabilities.shape[1])
+    voted = np.flatnonzero(votes)
+    voted = voted[np.argsort(-votes[voted], kind="stable")]
+    
+    tile_maps = []
+    offset = 0
+    for n, (tiles, (rows, cols)) in zip(scales, levels):
+        count = rows * cols
+        tile_maps.append({
+            "tiles_per_side": n,
+            "rows": rows,
+            "cols": cols,
+            "classes": tile_classes[offset:offset + count].reshape(rows, cols).tolist(),
+            "confidence": np.round(tile_confidence[offset:offset + count], 4).reshape(rows, cols).tolist()
+        })
+        offset += count
+    
+    return {
+        "predicted_class": all_predictions[0]["class"],
+        "confidence": all_predictions[0]["confidence"],
+        "all_predictions": all_predictions,
+        "votes": [{"class": class_label(i), "class_index": i, "tiles": v}
+                  for i, v in zip(voted.tolist(), votes[voted].tolist())],
+        "tile_maps": tile_maps,
+        "class_legend": {str(i): class_label(i) for i in np.unique(tile_classes).tolist()},
+        "num_tiles": int(len(batch)),
+        "overlap": overlap,
+        "capped": capped,
+        "image_size": [width, height]
+    }
 
 @app.on_event("startup")
 async def startup_event():
-    """Load model on startup"""
+    """Start loading the model in the background so the port binds immediately"""
     print("🚀 Starting Batik Classification API...")
+    print(f"⏱️ Module imported in {IMPORT_SECONDS:.3f}s")
     print(f"📂 Current working directory: {os.getcwd()}")
     print(f"📁 Model path: {os.path.abspath(MODEL_PATH)}")
     print(f"📁 Labels path: {os.path.abspath(LABELS_PATH)}")
-    print(f"🔧 TensorFlow version: {tf.__version__}")
+    print(f"🔧 Inference backend: {INFERENCE_BACKEND}")
     
     # List files in current directory
     print("📋 Files in current directory:")
     for file in os.listdir('.'):
-        if file.endswith('.keras') or file.endswith('.h5') or file.endswith('.txt'):
+        if file.endswith(('.keras', '.h5', '.tflite', '.txt')):
             file_size = os.path.getsize(file)
             print(f"  - {file} ({file_size / (1024*1024):.2f} MB)")
     
-    success = load_model_and_classes()
-    if not success:
-        print("⚠️ Warning: Model could not be loaded. API will not function properly.")
-        print(f"🔍 Model loading error: {model_loading_error}")
+    setup_logging(LOG_LEVEL, LOG_SAMPLE_RATE, LOG_FORMAT, LOG_QUEUE_SIZE)
+    print(f"📝 Request logs: {LOG_FORMAT} via background writer (level {LOG_LEVEL}, sample rate {LOG_SAMPLE_RATE})")
+    
+    threading.Thread(target=background_load, name="model-loader", daemon=True).start()
+    
+    global prediction_logger
+    if PREDICTION_LOG_DIR:
+        prediction_logger = PredictionLogger(
+            PREDICTION_LOG_DIR,
+            max_queue=PREDICTION_LOG_QUEUE,
+            busy_sample_rate=PREDICTION_LOG_BUSY_SAMPLE_RATE
+        ).start()
+        print(f"📝 Prediction log: {os.path.abspath(PREDICTION_LOG_DIR)}")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Flush the prediction log and the request logs"""
+    if prediction_logger is not None:
+        prediction_logger.close()
+    stop_logging()
 
 @app.get("/", response_model=Dict[str, Any])
 async def root():
@@ -304,9 +1364,15 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "health": "/health",
+            "livez": "/livez",
+            "readyz": "/readyz",
             "predict": "/predict",
             "predict_batch": "/predict-batch",
+            "predict_tiled": "/predict-tiled",
+            "predict_stream": "/ws/predict",
+            "explain": "/explain",
             "model_info": "/model-info",
+            "metrics": "/metrics",
             "debug": "/debug"
         }
     }
@@ -314,151 +1380,557 @@ async def root():
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     """Health check endpoint"""
+    if model_state["status"] == "ready":
+        status = "healthy"
+    elif model_state["status"] == "failed":
+        status = "unhealthy"
+    else:
+        status = "loading"
     return HealthResponse(
-        status="healthy",
-        model_loaded=model is not None,
-        model_path=MODEL_PATH,
-        model_error=model_loading_error
+        status=status,
+        model_loaded=model_state["status"] == "ready",
+        model_path=backend.model_path if backend else MODEL_PATH,
+        model_error=model_loading_error,
+        model_status=model_state["status"],
+        loading_stage=model_state["stage"],
+        memory=memory_governor.snapshot()
     )
 
+@app.get("/livez")
+async def liveness():
+    """Liveness probe: the process is up, even while the model is still loading"""
+    body = {"status": "alive", "model_status": model_state["status"], "stage": model_state["stage"]}
+    if model_state["status"] == "failed":
+        # Loading will not recover on its own; let the orchestrator restart us
+        return JSONResponse(status_code=500, content=body)
+    return body
+
+@app.get("/readyz")
+async def readiness():
+    """Readiness probe: only a loaded and warmed-up model receives traffic"""
+    body = {
+        "ready": model_state["status"] == "ready",
+        "model_status": model_state["status"],
+        "stage": model_state["stage"],
+        "load_seconds": model_state["load_seconds"],
+        "cold_to_fast_seconds": model_state["cold_to_fast_seconds"],
+        "loading_for_seconds": (time.time() - model_state["started_at"])
+        if model_state["started_at"] and model_state["status"] != "ready" else None
+    }
+    if not body["ready"]:
+        return JSONResponse(status_code=503, content=body, headers={"Retry-After": "5"})
+    return body
+
+async def classify_upload(image_bytes: bytes, key: str) -> Dict[str, Any]:
+    """Preprocess and classify one upload; identical concurrent uploads share one call"""
+    with reserve_memory(request_memory(0, 1)), input_pool.borrow(1) as buffer:
+        # Preprocess image into the pooled input tensor
+        processed_image = preprocess_image(image_bytes, buffer[0])
+        
+        # Make prediction; with an explainer the activations are kept for /explain
+        predictions, stages = await run_inference_async(run_inference, processed_image, [key])
+        return {
+            "probabilities": predictions[0],
+            "stage": int(stages[0]) if cascade_backend is not None else None,
+            "seen": find_seen_image(processed_image[0]) if image_index is not None else None
+        }
+
 @app.post("/predict", response_model=PredictionResponse)
-async def predict_single_image(file: UploadFile = File(...)):
+async def predict_single_image(request: Request, file: UploadFile = File(...)):
     """Predict single image"""
-    if model is None:
-        raise HTTPException(
-            status_code=503, 
-            detail=f"Model not loaded. Error: {model_loading_error or 'Unknown error'}"
-        )
-    
-    # Validate that we're using the original model, not a fallback
-    try:
-        # Test prediction to check if model has proper weights
-        test_input = np.random.random((1, 160, 160, 3))
-        test_prediction = model.predict(test_input, verbose=0)
-        
-        # Check if predictions are random (all same value)
-        unique_values = len(np.unique(test_prediction))
-        if unique_values <= 1:
-            raise HTTPException(
-                status_code=503,
-                detail="Model appears to be using fallback (random predictions). Please check model loading."
-            )
-        
-        print(f"✅ Model validation passed: {unique_values} unique prediction values")
-        
-    except Exception as e:
-        print(f"⚠️ Model validation failed: {e}")
-        raise HTTPException(
-            status_code=503,
-            detail=f"Model validation failed: {str(e)}"
-        )
+    require_model()
     
     # Validate file type
     if not file.content_type.startswith('image/'):
         raise HTTPException(status_code=400, detail="File must be an image")
     
+    with reserve_memory(file.size or 0):
+        try:
+            # Read image file
+            image_bytes = await read_upload(file)
+            started = time.perf_counter()
+            
+            # The first request for these bytes does the work, concurrent duplicates wait for it
+            key = hashlib.sha256(image_bytes).hexdigest()
+            if COALESCE_PREDICTIONS:
+                outcome, shared = await single_flight.run(key, lambda: classify_upload(image_bytes, key))
+            else:
+                outcome, shared = await classify_upload(image_bytes, key), False
+            if shared:
+                record_stage("coalesced_wait", time.perf_counter() - started)
+            answered_stage, seen = outcome["stage"], outcome["seen"]
+            log_prediction("predict", image_bytes, outcome["probabilities"], answered_stage,
+                           time.perf_counter() - started, file.filename,
+                           seen["phash"] if seen else None)
+            
+            # Top 10 predictions, the first one is the predicted class
+            all_predictions = top_k_predictions(outcome["probabilities"])
+            
+            # Returning a Response skips response_model validation;
+            # PredictionResponse still documents the schema
+            result = {
+                "predicted_class": all_predictions[0]["class"],
+                "confidence": all_predictions[0]["confidence"],
+                "all_predictions": all_predictions
+            }
+            if answered_stage is not None:
+                result["stage"] = answered_stage
+            if seen is not None and seen["match"] is not None:
+                result["seen_image"] = seen["match"]
+            return render_response(request, result)
+            
+        except HTTPException as e:
+            if e.status_code in (413, 503):
+                raise
+            raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
+
+@app.post("/predict-tiled")
+async def predict_tiled_image(request: Request,
+                              file: UploadFile = File(...),
+                              scales: str = ",".join(str(n) for n in TILED_DEFAULT_SCALES),
+                              overlap: float = TILED_DEFAULT_OVERLAP,
+                              max_tiles: int = TILED_MAX_TILES):
+    """
+    Classify a large photograph of a whole cloth from overlapping tiles.
+    
+    `scales` lists how many tiles fit along the image's short side at each
+    scale (e.g. "2,4"), at most TILED_MAX_SCALE; `max_tiles` is capped by
+    TILED_MAX_TILES.
+    """
+    require_model()
+    
+    if not file.content_type.startswith('image/'):
+        raise HTTPException(status_code=400, detail="File must be an image")
     try:
-        # Read image file
-        image_bytes = await file.read()
-        
-        # Preprocess image
-        processed_image = preprocess_image(image_bytes)
-        
-        # Make prediction
-        predictions = model.predict(processed_image, verbose=0)
-        
-        # Get predicted class and confidence
-        predicted_class_idx = np.argmax(predictions[0])
-        confidence = float(predictions[0][predicted_class_idx])
-        predicted_class = class_names[predicted_class_idx]
-        
-        # Prepare all predictions
-        all_predictions = []
-        for i, (class_name, prob) in enumerate(zip(class_names, predictions[0])):
-            all_predictions.append({
-                "class": class_name,
-                "confidence": float(prob),
-                "rank": i + 1
-            })
-        
-        # Sort by confidence (descending)
-        all_predictions.sort(key=lambda x: x["confidence"], reverse=True)
-        
-        return PredictionResponse(
-            predicted_class=predicted_class,
-            confidence=confidence,
-            all_predictions=all_predictions[:10]  # Return top 10 predictions
-        )
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
+        scale_list = [int(n) for n in scales.split(",") if n.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="scales must be a comma-separated list of integers")
+    if not scale_list:
+        raise HTTPException(status_code=400, detail="At least one scale is required")
+    if not all(1 <= n <= TILED_MAX_SCALE for n in scale_list):
+        raise HTTPException(status_code=400, detail=f"scales must be between 1 and {TILED_MAX_SCALE}")
+    
+    max_tiles = min(max(max_tiles, 1), TILED_MAX_TILES)
+    with reserve_memory(request_memory(file.size or 0, max_tiles)):
+        image_bytes = await read_upload(file)
+        result = await run_inference_async(classify_tiled, image_bytes, scale_list, overlap, max_tiles)
+    return render_response(request, result)
 
-@app.post("/predict-batch")
-async def predict_batch_images(files: List[UploadFile] = File(...)):
-    """Predict multiple images"""
-    if model is None:
-        raise HTTPException(
-            status_code=503, 
-            detail=f"Model not loaded. Error: {model_loading_error or 'Unknown error'}"
-        )
+def batch_result(filename: str, probabilities: np.ndarray, stage: Optional[int]) -> Dict[str, Any]:
+    """One file's entry in a /predict-batch response"""
+    predicted_class_idx = int(np.argmax(probabilities))
+    result = {
+        "filename": filename,
+        "predicted_class": class_label(predicted_class_idx),
+        "confidence": float(probabilities[predicted_class_idx]),
+        "success": True
+    }
+    if stage is not None:
+        result["stage"] = stage
+    return result
+
+class StreamResources:
+    """
+    Memory reservation and pooled chunk buffers of one streamed batch.
+    
+    `release` frees them once no inference task started for the stream is
+    still running, since those read the pooled buffers from a worker thread.
+    """
+    
+    def __init__(self):
+        self.stack = ExitStack()
+        self.tasks = []
+    
+    def release(self):
+        running = [task for task in self.tasks if not task.done()]
+        if running:
+            running[0].add_done_callback(lambda _: self.release())
+            return
+        for task in self.tasks:
+            # Results of chunks nobody waited for (client went away) are dropped quietly
+            if not task.cancelled():
+                task.exception()
+        self.tasks = []
+        self.stack.close()
+
+class StreamingBatchResponse(StreamingResponse):
+    """NDJSON batch stream that releases its resources however the response ends"""
+    
+    def __init__(self, content, resources: StreamResources, **kwargs):
+        super().__init__(content, **kwargs)
+        self.resources = resources
+    
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            # Also covers a client that disconnects before the body is iterated
+            self.resources.release()
+
+async def stream_batch_predictions(files: List[UploadFile], resources: StreamResources, buffers):
+    """
+    Yield one NDJSON line per file as soon as it is classified, then a summary.
     
-    if len(files) > 10:  # Limit batch size
-        raise HTTPException(status_code=400, detail="Maximum 10 images per batch")
+    A producer task reads and decodes files into one of two pooled chunk
+    buffers and starts inference for each full chunk, while this generator
+    writes every chunk's results the moment its inference finishes. Decoding
+    the next chunk therefore overlaps inference of the current one, and
+    memory stays at two chunks however many files there are. Lines carry the
+    file's `index`; rejected files are reported in reading order, so lines
+    may arrive out of order.
+    """
+    summary = {"done": True, "total": len(files), "succeeded": 0, "failed": 0}
+    # ("failed", index, filename, error), ("chunk", task, chunk, start time), or None when done
+    events = asyncio.Queue()
     
-    results = []
+    def failure(index: int, filename: str, error: str) -> bytes:
+        summary["failed"] += 1
+        return dumps_json({"index": index, "filename": filename, "error": error, "success": False}) + b"\n"
     
-    for file in files:
+    async def produce():
         try:
-            # Validate file type
-            if not file.content_type.startswith('image/'):
-                results.append({
-                    "filename": file.filename,
-                    "error": "File must be an image"
-                })
+            in_use = [None, None]  # inference task still reading each buffer
+            chunk, chunk_started, current = [], None, 0
+            for index, file in enumerate(files):
+                if not file.content_type.startswith('image/'):
+                    await events.put(("failed", index, file.filename, "File must be an image"))
+                else:
+                    try:
+                        image_bytes = await read_upload(file)
+                        chunk_started = chunk_started or time.perf_counter()
+                        if not chunk and in_use[current] is not None:
+                            # The buffer is free again once the chunk before last is classified
+                            await asyncio.wait([in_use[current]])
+                        preprocess_image(image_bytes, buffers[current][len(chunk)])
+                        chunk.append((index, file, image_bytes))
+                    except HTTPException as e:
+                        await events.put(("failed", index, file.filename, str(e.detail)))
+                
+                if chunk and (len(chunk) == STREAM_CHUNK_SIZE or index == len(files) - 1):
+                    task = asyncio.ensure_future(run_inference_async(run_inference, buffers[current][:len(chunk)]))
+                    resources.tasks.append(task)
+                    in_use[current] = task
+                    await events.put(("chunk", task, chunk, chunk_started))
+                    chunk, chunk_started, current = [], None, 1 - current
+        finally:
+            events.put_nowait(None)
+    
+    producer = asyncio.ensure_future(produce())
+    resources.tasks.append(producer)
+    try:
+        while True:
+            event = await events.get()
+            if event is None:
+                break
+            if event[0] == "failed":
+                yield failure(*event[1:])
                 continue
             
-            # Read image file
-            image_bytes = await file.read()
-            
-            # Preprocess image
-            processed_image = preprocess_image(image_bytes)
-            
-            # Make prediction
-            predictions = model.predict(processed_image, verbose=0)
-            
-            # Get predicted class and confidence
-            predicted_class_idx = np.argmax(predictions[0])
-            confidence = float(predictions[0][predicted_class_idx])
-            predicted_class = class_names[predicted_class_idx]
-            
-            results.append({
-                "filename": file.filename,
-                "predicted_class": predicted_class,
+            _, task, chunk, chunk_started = event
+            try:
+                predictions, stages = await task
+            except Exception as e:
+                for index, file, _ in chunk:
+                    yield failure(index, file.filename, str(e))
+                continue
+            latency = time.perf_counter() - chunk_started
+            for row, (index, file, image_bytes) in enumerate(chunk):
+                stage = int(stages[row]) if cascade_backend is not None else None
+                log_prediction("predict-batch", image_bytes, predictions[row], stage, latency, file.filename)
+                summary["succeeded"] += 1
+                yield dumps_json({"index": index, **batch_result(file.filename, predictions[row], stage)}) + b"\n"
+        
+        # Re-raise an unexpected error from reading or decoding
+        await producer
+        yield dumps_json(summary) + b"\n"
+    finally:
+        # If the client went away mid-stream, the buffers are released once the running chunk finishes
+        producer.cancel()
+        resources.release()
+
+@app.post("/predict-batch")
+async def predict_batch_images(request: Request, files: List[UploadFile] = File(...), stream: bool = False):
+    """
+    Predict multiple images.
+    
+    With `?stream=true` (or `Accept: application/x-ndjson`) results are
+    streamed as newline-delimited JSON, one line per file as soon as it is
+    ready, followed by a `{"done": true, ...}` summary line.
+    """
+    require_model()
+    
+    if stream or NDJSON_MEDIA_TYPE in request.headers.get("accept", ""):
+        if len(files) > STREAM_BATCH_MAX_FILES:
+            raise HTTPException(status_code=400, detail=f"Maximum {STREAM_BATCH_MAX_FILES} images per streamed batch")
+        resources = StreamResources()
+        try:
+            # Two chunks in flight at most: one decoding, one in inference
+            chunk_bytes = max((file.size or 0 for file in files), default=0) * STREAM_CHUNK_SIZE
+            resources.stack.enter_context(reserve_memory(request_memory(2 * chunk_bytes, 2 * STREAM_CHUNK_SIZE)))
+            buffers = [resources.stack.enter_context(input_pool.borrow(STREAM_CHUNK_SIZE)) for _ in range(2)]
+        except BaseException:
+            resources.release()
+            raise
+        return StreamingBatchResponse(stream_batch_predictions(files, resources, buffers), resources,
+                                      media_type=NDJSON_MEDIA_TYPE)
+    
+    if len(files) > BATCH_MAX_FILES:  # Limit batch size
+        raise HTTPException(status_code=400, detail=f"Maximum {BATCH_MAX_FILES} images per batch")
+    
+    results = [None] * len(files)
+    uploads = []  # (position in files, image bytes)
+    upload_bytes = sum(file.size or 0 for file in files)
+    
+    with reserve_memory(request_memory(upload_bytes, len(files))), input_pool.borrow(len(files)) as buffer:
+        started = time.perf_counter()
+        
+        # Decode every image into one row of the pooled input batch
+        for position, file in enumerate(files):
+            try:
+                # Validate file type
+                if not file.content_type.startswith('image/'):
+                    results[position] = {
+                        "filename": file.filename,
+                        "error": "File must be an image"
+                    }
+                    continue
+                
+                # Read image file
+                image_bytes = await read_upload(file)
+                
+                # Preprocess image
+                preprocess_image(image_bytes, buffer[len(uploads)])
+                uploads.append((position, image_bytes))
+                
+            except Exception as e:
+                results[position] = {
+                    "filename": file.filename,
+                    "error": str(e.detail) if isinstance(e, HTTPException) else str(e),
+                    "success": False
+                }
+        
+        if uploads:
+            try:
+                # One inference call for all decoded images
+                predictions, stages = await run_inference_async(run_inference, buffer[:len(uploads)])
+                latency = time.perf_counter() - started
+                
+                for row, (position, image_bytes) in enumerate(uploads):
+                    file = files[position]
+                    stage = int(stages[row]) if cascade_backend is not None else None
+                    log_prediction("predict-batch", image_bytes, predictions[row], stage, latency, file.filename)
+                    results[position] = batch_result(file.filename, predictions[row], stage)
+            except Exception as e:
+                for position, _ in uploads:
+                    results[position] = {
+                        "filename": files[position].filename,
+                        "error": str(e),
+                        "success": False
+                    }
+    
+    return render_response(request, {"predictions": results})
+
+def explain_image(image_bytes: bytes, batch: np.ndarray, top_k: int, alpha: float) -> Dict[str, Any]:
+    """Grad-CAM overlays for the top-k classes of one image (runs in a worker thread)"""
+    key = hashlib.sha256(image_bytes).hexdigest()
+    cached = feature_cache.get(key)
+    if cached is None:
+        features, probabilities = explainer.forward(batch)
+        features, probabilities = features[0], probabilities[0]
+        feature_cache.put(key, features, probabilities)
+    else:
+        features, probabilities = cached
+    
+    top = np.argsort(-probabilities, kind="stable")[:top_k]
+    heatmaps = explainer.heatmaps(features, top.tolist())
+    count_metric("explanations")
+    return {
+        "predicted_class": class_label(int(top[0])),
+        "confidence": float(probabilities[top[0]]),
+        "explanations": [
+            {
+                "class": class_label(index),
                 "confidence": confidence,
-                "success": True
-            })
-            
+                "heatmap_png": base64.b64encode(overlay_png(batch[0], heatmap, alpha)).decode("ascii")
+            }
+            for index, confidence, heatmap in zip(top.tolist(), probabilities[top].tolist(), heatmaps)
+        ],
+        "layer": explainer.layer_name,
+        "heatmap_size": list(IMG_SIZE),
+        "features_cached": cached is not None
+    }
+
+@app.post("/explain")
+async def explain_prediction(request: Request, file: UploadFile = File(...),
+                             top_k: int = 3, alpha: float = 0.5):
+    """Grad-CAM heatmaps showing which regions drove each of the top-k classes"""
+    require_model()
+    if explainer is None:
+        raise HTTPException(status_code=501, detail="Explanations need INFERENCE_BACKEND=keras")
+    if not file.content_type.startswith('image/'):
+        raise HTTPException(status_code=400, detail="File must be an image")
+    if not 1 <= top_k <= EXPLAIN_MAX_TOP_K:
+        raise HTTPException(status_code=400, detail=f"top_k must be between 1 and {EXPLAIN_MAX_TOP_K}")
+    if not 0.0 <= alpha <= 1.0:
+        raise HTTPException(status_code=400, detail="alpha must be between 0 and 1")
+    
+    with reserve_memory(request_memory(file.size or 0, 1)), input_pool.borrow(1) as buffer:
+        image_bytes = await read_upload(file)
+        processed_image = preprocess_image(image_bytes, buffer[0])
+        try:
+            result = await run_inference_async(explain_image, image_bytes, processed_image, top_k, alpha)
         except Exception as e:
-            results.append({
-                "filename": file.filename,
-                "error": str(e),
-                "success": False
-            })
+            raise HTTPException(status_code=500, detail=f"Explanation error: {str(e)}")
+    return render_response(request, result)
+
+def classify_frame(image_bytes: bytes, top_k: int) -> Dict[str, Any]:
+    """Decode and classify one camera frame (runs in a worker thread)"""
+    if len(image_bytes) > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Frame larger than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB")
+    started = time.perf_counter()
+    with reserve_memory(request_memory(len(image_bytes), 1)), input_pool.borrow(1) as buffer:
+        predictions, stages = run_inference(preprocess_image(image_bytes, buffer[0]))
+    stage = int(stages[0]) if cascade_backend is not None else None
+    latency = time.perf_counter() - started
+    log_prediction("ws-predict", image_bytes, predictions[0], stage, latency)
+    all_predictions = top_k_predictions(predictions[0], top_k)
+    result = {
+        "predicted_class": all_predictions[0]["class"],
+        "confidence": all_predictions[0]["confidence"],
+        "top_k": all_predictions,
+        "latency_ms": round(latency * 1000, 2)
+    }
+    if stage is not None:
+        result["stage"] = stage
+    return result
+
+@app.websocket("/ws/predict")
+async def predict_stream(websocket: WebSocket, top_k: int = WS_DEFAULT_TOP_K):
+    """
+    Live camera classification over one persistent connection.
+    
+    Each message is a frame: raw image bytes (binary message, numbered by the
+    server from 1) or JSON text `{"seq": 17, "image": "<base64>"}`. Only the
+    newest frame waits while inference is busy; older waiting frames are
+    dropped, so results never lag behind the camera. Every result carries the
+    frame's `seq` and how many frames were dropped before it.
+    """
+    global ws_sessions_active
+    await websocket.accept()
+    if model_state["status"] != "ready" or ws_sessions_active >= WS_MAX_SESSIONS:
+        count_metric("ws_sessions_rejected")
+        reason = "model not ready" if model_state["status"] != "ready" else "too many sessions"
+        await websocket.send_json({"error": reason, "retry_after": 5})
+        await websocket.close(code=1013)  # Try again later
+        return
+    
+    ws_sessions_active += 1
+    count_metric("ws_sessions_total")
+    top_k = min(max(top_k, 1), TOP_K)
+    latest = {"frame": None, "dropped": 0}
+    frame_ready = asyncio.Event()
+    
+    async def receive_frames():
+        received = 0
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            received += 1
+            if message.get("bytes") is not None:
+                frame = (received, message["bytes"])
+            else:
+                try:
+                    payload = json.loads(message.get("text") or "")
+                    frame = (payload.get("seq", received), base64.b64decode(payload["image"]))
+                except Exception:
+                    await websocket.send_json({"error": "Frames must be binary images or "
+                                                        "JSON {\"seq\": n, \"image\": base64}"})
+                    continue
+            count_metric("ws_frames_received")
+            if latest["frame"] is not None:
+                # Inference is behind: the waiting frame is stale, replace it
+                latest["dropped"] += 1
+                count_metric("ws_frames_dropped")
+            latest["frame"] = frame
+            frame_ready.set()
+    
+    async def classify_frames():
+        while True:
+            await frame_ready.wait()
+            frame_ready.clear()
+            (seq, image_bytes), dropped = latest["frame"], latest["dropped"]
+            latest["frame"], latest["dropped"] = None, 0
+            try:
+                result = await run_inference_async(classify_frame, image_bytes, top_k)
+                count_metric("ws_frames_classified")
+            except HTTPException as e:
+                result = {"error": e.detail}
+            except Exception as e:
+                result = {"error": f"Prediction error: {str(e)}"}
+            await websocket.send_json({"seq": seq, "dropped_before": dropped, **result})
     
-    return {"predictions": results}
+    tasks = [asyncio.create_task(receive_frames()), asyncio.create_task(classify_frames())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            error = task.exception()
+            if error is not None and not isinstance(error, WebSocketDisconnect):
+                logger.warning("websocket session ended", extra={"fields": {"error": str(error)}})
+    finally:
+        for task in tasks:
+            task.cancel()
+        ws_sessions_active -= 1
+
+@app.get("/metrics")
+async def get_metrics():
+    """Service counters, including which cascade stage answered"""
+    with metrics_lock:
+        snapshot = dict(metrics)
+    answered = snapshot["cascade_stage1_answered"] + snapshot["cascade_stage2_answered"]
+    snapshot["cascade_enabled"] = cascade_backend is not None
+    snapshot["cascade_threshold"] = CASCADE_THRESHOLD if cascade_backend is not None else None
+    snapshot["cascade_stage1_fraction"] = snapshot["cascade_stage1_answered"] / answered if answered else None
+    snapshot["mean_inference_ms_per_batch"] = (
+        1000 * snapshot["inference_seconds"] / snapshot["inference_batches"]
+        if snapshot["inference_batches"] else None
+    )
+    snapshot["prediction_log"] = prediction_logger.snapshot() if prediction_logger is not None else None
+    snapshot["inference_concurrency"] = INFERENCE_CONCURRENCY
+    snapshot["inference_waiting"] = inference_waiting
+    snapshot["ws_sessions_active"] = ws_sessions_active
+    snapshot["memory"] = {
+        **memory_governor.snapshot(),
+        "input_pool_mb": round(input_pool.pooled_bytes() / (1024 * 1024), 1),
+        "input_pool": dict(input_pool.stats)
+    }
+    snapshot["explain_cache"] = feature_cache.snapshot() if explainer is not None else None
+    if explainer is not None:
+        snapshot["memory"]["explain_cache_mb"] = snapshot["explain_cache"]["mb"]
+    snapshot["coalescing"] = {"enabled": COALESCE_PREDICTIONS, **single_flight.snapshot()}
+    snapshot["image_index"] = (
+        {**image_index.snapshot(), "lookup_distance": IMAGE_HASH_MAX_DISTANCE} if image_index is not None else None
+    )
+    snapshot["logging"] = logging_stats()
+    return snapshot
 
 @app.get("/model-info")
 async def get_model_info():
     """Get model information"""
-    if model is None:
-        raise HTTPException(
-            status_code=503, 
-            detail=f"Model not loaded. Error: {model_loading_error or 'Unknown error'}"
-        )
+    require_model()
     
     return {
-        "model_path": MODEL_PATH,
+        "model_path": backend.model_path,
+        "model_version": model_version,
+        "inference_backend": backend.name,
+        "cascade_model_path": cascade_backend.model_path if cascade_backend else None,
+        "cascade_threshold": CASCADE_THRESHOLD if cascade_backend else None,
+        "ensemble_heads": backend.num_heads if isinstance(backend, EnsembleBackend) else None,
+        "ensemble_combine": backend.combine if isinstance(backend, EnsembleBackend) else None,
         "input_shape": IMG_SIZE + (3,),
+        "input_size": list(IMG_SIZE),  # uploads of exactly this size are not resized again
         "num_classes": NUM_CLASSES,
         "class_names": class_names,
         "model_summary": "Model loaded successfully",
@@ -475,13 +1947,41 @@ async def debug_info():
         "model_file_size": os.path.getsize(MODEL_PATH) if os.path.exists(MODEL_PATH) else None,
         "labels_path": os.path.abspath(LABELS_PATH),
         "labels_file_exists": os.path.exists(LABELS_PATH),
-        "model_loaded": model is not None,
+        "model_loaded": backend is not None,
         "model_loading_error": model_loading_error,
+        "model_state": model_state,
+        "inference_backend": INFERENCE_BACKEND,
+        "runtime_tuning": {
+            "profile": TUNING_PROFILE_PATH if tuning_profile else None,
+            "intra_op_threads": TF_INTRA_OP_THREADS,
+            "inter_op_threads": TF_INTER_OP_THREADS,
+            "onednn": os.environ.get("TF_ENABLE_ONEDNN_OPTS"),
+            "inference_batch_size": INFERENCE_BATCH_SIZE,
+            "workers": SERVER_WORKERS
+        },
+        "import_seconds": IMPORT_SECONDS,
+        "jit_cache": {
+            "path": backend.cache_path,
+            "hit": backend.cache_hit,
+            "buckets": backend.bucket_timings
+        } if isinstance(backend, XLABackend) else None,
         "available_files": [f for f in os.listdir('.') if f.endswith('.keras') or f.endswith('.h5') or f.endswith('.txt')],
         "environment": os.environ.get('ENVIRONMENT', 'development'),
         "batik_names_count": len(class_names) if class_names else 0,
-        "tensorflow_version": tf.__version__
+        "tensorflow_version": tf.__version__ if tf is not None else None
     }
 
+# Measured once; TensorFlow is deliberately not part of this
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+    if AUTOTUNE == "force" or (AUTOTUNE and tuning_profile is None):
+        # Benchmarks run in child processes; the workers started below import
+        # this module afresh and pick up the new profile
+        import subprocess
+        print("🔧 AUTOTUNE: benchmarking runtime settings before serving...")
+        subprocess.run([sys.executable, "autotune.py", "--output", TUNING_PROFILE_PATH], check=False)
+        tuning_profile = load_tuning_profile()
+        SERVER_WORKERS = tuned_setting("WEB_CONCURRENCY", "workers") or 1
+    print(f"🚀 Serving with {SERVER_WORKERS} worker(s)")
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=SERVER_WORKERS)
\ No newline at end of file
@@ -0,0 +1,194 @@
+"""
+Memory budget for the serving process.
+
+`MemoryGovernor` tracks the process RSS and the bytes that in-flight
+requests have reserved (uploads, decoded images, input batches, inference
+working memory). New work is admitted only while RSS plus outstanding
+reservations stays below `reject_fraction` of the budget; above
+`shrink_fraction` the inference batch size is scaled down so each backend
+call needs less transient memory. Reservations are counted on top of RSS
+even after their buffers are allocated, which errs on the side of rejecting
+early rather than being OOM-killed.
+
+`BufferPool` keeps preallocated float32 input batches so requests decode
+straight into reused memory instead of allocating new arrays every time.
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+MB = 1024 * 1024
+
+
+class MemoryBudgetExceeded(Exception):
+    """Raised when admitting a reservation would exceed the budget"""
+
+    def __init__(self, requested: int, projected: int, limit: int):
+        super().__init__(f"Memory budget exceeded: {projected / MB:.0f} MB projected "
+                         f"with {requested / MB:.1f} MB requested, limit {limit / MB:.0f} MB")
+        self.requested = requested
+        self.projected = projected
+        self.limit = limit
+
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes"""
+    if psutil is not None:
+        return psutil.Process(os.getpid()).memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        # ru_maxrss is the peak in KiB on Linux, the best remaining estimate
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def container_memory_limit() -> Optional[int]:
+    """The cgroup (v2 or v1) memory limit, if the process runs under one"""
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.isdigit() and int(value) < (1 << 60):  # v1 reports "unlimited" as a huge number
+            return int(value)
+    return None
+
+
+def worker_memory_budget(workers: int, limit: Optional[int] = None) -> Optional[int]:
+    """
+    One worker's share of the container memory limit.
+
+    Every uvicorn worker runs its own governor against its own RSS, so each
+    may only budget for `limit / workers`; otherwise N workers could together
+    commit N times the limit before any of them rejects work.
+    """
+    if limit is None:
+        limit = container_memory_limit()
+    if limit is None:
+        return None
+    return limit // max(1, int(workers))
+
+
+class MemoryGovernor:
+    """Admission control and batch-size shrinking against a memory budget"""
+
+    def __init__(self, budget_bytes: Optional[int],
+                 reject_fraction: float = 0.9,
+                 shrink_fraction: float = 0.75):
+        """
+        Args:
+            budget_bytes: Memory the process may use; None only tracks usage.
+            reject_fraction: Share of the budget above which new work is rejected.
+            shrink_fraction: Share of the budget above which batches are shrunk.
+        """
+        self.budget = budget_bytes
+        self.reject_fraction = reject_fraction
+        self.shrink_fraction = shrink_fraction
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak_rss = 0
+        self.stats = {"admitted": 0, "rejected": 0, "batches_shrunk": 0}
+
+    def rss(self) -> int:
+        rss = current_rss()
+        self.peak_rss = max(self.peak_rss, rss)
+        return rss
+
+    def projected(self, extra: int = 0) -> int:
+        return self.rss() + self.in_flight + extra
+
+    @contextmanager
+    def reserve(self, nbytes: int):
+        """Hold `nbytes` for the duration of the block; raises MemoryBudgetExceeded"""
+        nbytes = int(nbytes)
+        with self._lock:
+            if self.budget is not None:
+                limit = int(self.budget * self.reject_fraction)
+                projected = self.projected(nbytes)
+                if projected > limit:
+                    self.stats["rejected"] += 1
+                    raise MemoryBudgetExceeded(nbytes, projected, limit)
+            self.in_flight += nbytes
+            self.stats["admitted"] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= nbytes
+
+    def batch_limit(self, batch_size: int) -> int:
+        """
+        Largest batch to run at once: `batch_size` with enough headroom,
+        scaled down linearly to 1 between the shrink and reject thresholds.
+        """
+        if self.budget is None or batch_size <= 1:
+            return batch_size
+        usage = self.projected() / self.budget
+        if usage <= self.shrink_fraction:
+            return batch_size
+        headroom = max(0.0, (self.reject_fraction - usage) / (self.reject_fraction - self.shrink_fraction))
+        limited = max(1, int(batch_size * headroom))
+        if limited < batch_size:
+            self.stats["batches_shrunk"] += 1
+        return limited
+
+    def snapshot(self) -> Dict[str, Any]:
+        rss = self.rss()
+        return {
+            "rss_mb": round(rss / MB, 1),
+            "peak_rss_mb": round(self.peak_rss / MB, 1),
+            "in_flight_mb": round(self.in_flight / MB, 1),
+            "budget_mb": round(self.budget / MB, 1) if self.budget else None,
+            "usage_fraction": round((rss + self.in_flight) / self.budget, 3) if self.budget else None,
+            **self.stats
+        }
+
+
+class BufferPool:
+    """Reusable float32 arrays of shape (n, *item_shape), a few per batch size"""
+
+    def __init__(self, item_shape: Tuple[int, ...], max_per_size: int = 4):
+        self.item_shape = tuple(item_shape)
+        self.max_per_size = max_per_size
+        self._free = {}
+        self._lock = threading.Lock()
+        self.stats = {"reused": 0, "allocated": 0}
+
+    def acquire(self, n: int) -> np.ndarray:
+        with self._lock:
+            free = self._free.get(n)
+            if free:
+                self.stats["reused"] += 1
+                return free.pop()
+            self.stats["allocated"] += 1
+        return np.empty((n, *self.item_shape), dtype=np.float32)
+
+    def release(self, buffer: np.ndarray):
+        with self._lock:
+            free = self._free.setdefault(len(buffer), [])
+            if len(free) < self.max_per_size:
+                free.append(buffer)
+
+    @contextmanager
+    def borrow(self, n: int):
+        buffer = self.acquire(n)
+        try:
+            yield buffer
+        finally:
+            self.release(buffer)
+
+    def pooled_bytes(self) -> int:
+        with self._lock:
+            return sum(b.nbytes for free in self._free.values() for b in free)
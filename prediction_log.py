@@ -0,0 +1,221 @@
+"""
+Write-behind prediction log.
+
+Request handlers hand a small record to `PredictionLogger.log`, which never
+blocks and never touches the disk: records go into a bounded in-memory
+queue and a background thread writes them out in batches. Each batch is
+appended to the current file as its own gzip member, so a file is readable
+(`gzip.open`, `pandas.read_json(..., lines=True)`, `read_prediction_log`)
+up to the last flush even while it is being written or after a crash.
+Files rotate by size and age, and the oldest in the directory are deleted
+beyond a limit, whichever worker process wrote them.
+
+When the queue fills up, records are sampled (kept with probability
+`busy_sample_rate`, carrying a matching `sample_weight` so counts can be
+re-weighted offline) and, once it is completely full, dropped. Either way
+the handler continues immediately.
+"""
+
+import os
+import sys
+import json
+import gzip
+import glob
+import time
+import queue
+import random
+import threading
+from typing import Any, Dict, Iterator, Optional
+
+LOG_FILE_PATTERN = "predictions-*.jsonl.gz"
+
+
+class PredictionLogger:
+    """Bounded queue plus a background writer producing rotated .jsonl.gz files"""
+
+    def __init__(self,
+                 directory: str,
+                 max_queue: int = 10000,
+                 batch_size: int = 512,
+                 flush_interval: float = 2.0,
+                 max_file_bytes: int = 64 * 1024 * 1024,
+                 rotate_seconds: float = 3600.0,
+                 max_files: int = 48,
+                 busy_fraction: float = 0.8,
+                 busy_sample_rate: float = 0.1):
+        """
+        Args:
+            directory: Where log files are written.
+            max_queue: Records held in memory before new ones are dropped.
+            batch_size: Maximum records written per gzip member.
+            flush_interval: Seconds a record may wait before being written.
+            max_file_bytes: Rotate to a new file beyond this compressed size.
+            rotate_seconds: Rotate to a new file after this many seconds.
+            max_files: The directory's oldest log files beyond this count are deleted,
+                including those of earlier or other worker processes. Files modified
+                within `rotate_seconds` may still be open in another worker and are kept.
+            busy_fraction: Queue fill level above which records are sampled.
+            busy_sample_rate: Probability of keeping a record while busy.
+        """
+        self.directory = directory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_file_bytes = max_file_bytes
+        self.rotate_seconds = rotate_seconds
+        self.max_files = max_files
+        self.busy_threshold = int(max_queue * busy_fraction)
+        self.busy_sample_rate = busy_sample_rate
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread = None
+        self._file_path = None
+        self._file_opened_at = 0.0
+        self._file_bytes = 0
+        self._files_opened = 0
+        # Updated by request handler threads and the writer thread
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            "logged": 0,
+            "sampled_out": 0,
+            "dropped": 0,
+            "written": 0,
+            "write_errors": 0,
+            "files_rotated": 0
+        }
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="prediction-log-writer", daemon=True)
+        self._thread.start()
+        return self
+
+    def _count(self, name: str, value: int = 1):
+        with self._stats_lock:
+            self.stats[name] += value
+
+    def log(self, record: Dict[str, Any]) -> bool:
+        """Queue a record without blocking; returns False if it was sampled out or dropped"""
+        weight = 1.0
+        if self._queue.qsize() >= self.busy_threshold:
+            if random.random() >= self.busy_sample_rate:
+                self._count("sampled_out")
+                return False
+            weight = 1.0 / self.busy_sample_rate
+        record["sample_weight"] = weight
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self._count("dropped")
+            return False
+        self._count("logged")
+        return True
+
+    def close(self, timeout: float = 10.0):
+        """Write out everything still queued and stop the writer"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        return {**stats, "queued": self._queue.qsize(), "current_file": self._file_path}
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch:
+                self._write(batch)
+            elif self._stop.is_set():
+                return
+
+    def _next_batch(self):
+        """Wait up to flush_interval for the first record, then take what is queued"""
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        lines = "".join(json.dumps(r, ensure_ascii=False, separators=(',', ':')) + "\n" for r in batch)
+        member = gzip.compress(lines.encode('utf-8'), compresslevel=6)
+        try:
+            if self._should_rotate():
+                self._rotate()
+            with open(self._file_path, 'ab') as f:
+                f.write(member)
+            self._file_bytes += len(member)
+            self._count("written", len(batch))
+        except OSError as e:
+            self._count("write_errors")
+            print(f"⚠️ Prediction log write failed, {len(batch)} records lost: {e}")
+
+    def _should_rotate(self) -> bool:
+        return (self._file_path is None
+                or self._file_bytes >= self.max_file_bytes
+                or time.time() - self._file_opened_at >= self.rotate_seconds)
+
+    def _rotate(self):
+        # The counter keeps names unique when one process rotates twice within a second
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        self._files_opened += 1
+        self._file_path = os.path.join(
+            self.directory, f"predictions-{stamp}-{os.getpid()}-{self._files_opened}.jsonl.gz")
+        self._file_opened_at = time.time()
+        self._file_bytes = 0
+        self._count("files_rotated")
+        self._prune()
+
+    def _prune(self):
+        """Delete the directory's oldest log files beyond max_files, sparing ones that may be live"""
+        files = []
+        for path in glob.glob(os.path.join(self.directory, LOG_FILE_PATTERN)):
+            try:
+                files.append((os.path.getmtime(path), path))
+            except OSError:
+                pass  # removed by another worker meanwhile
+        files.sort()
+        live_since = time.time() - self.rotate_seconds
+        for modified, old in files[:max(0, len(files) - self.max_files + 1)]:
+            if modified >= live_since or old == self._file_path:
+                continue
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+
+def log_files(path: str):
+    """Log files under a directory (oldest first), or the single file given"""
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(path, LOG_FILE_PATTERN)), key=os.path.getmtime)
+    return [path]
+
+
+def read_prediction_log(path: str, model_version: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Yield logged records from a log directory or file.
+
+    A truncated final gzip member (a file still being written, or a crash
+    mid-flush) ends that file's records instead of raising.
+    """
+    for log_file in log_files(path):
+        try:
+            with gzip.open(log_file, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    if model_version is None or record.get("model_version") == model_version:
+                        yield record
+        except (EOFError, gzip.BadGzipFile, json.JSONDecodeError) as e:
+            print(f"⚠️ Stopped reading {log_file} early: {e}", file=sys.stderr)
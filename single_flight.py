@@ -0,0 +1,82 @@
+"""
+Single-flight coalescing of identical concurrent work.
+
+`SingleFlight.run(key, factory)` starts `factory()` for the first caller of
+a key and makes every caller that arrives while it is running await the same
+result instead of repeating the work. Nothing is cached: once the work
+finishes the key is free again, so a later request (or a retry after an
+error) runs afresh.
+
+The work runs in its own task, so one caller going away does not fail the
+others: a cancelled caller only stops waiting, and the work is cancelled
+only when no caller is left. Errors are raised to every caller that shared
+the attempt.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key onto one task (one event loop)"""
+
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.stats = {"leaders": 0, "coalesced": 0, "shared_errors": 0, "cancelled_waiters": 0, "abandoned": 0}
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Return (result, shared): `shared` is True when the result came from
+        a call that another caller had already started.
+        """
+        flight = self._flights.get(key)
+        if flight is not None and flight.task.cancelled():
+            flight = None
+        shared = flight is not None
+        if shared:
+            self.stats["coalesced"] += 1
+        else:
+            self.stats["leaders"] += 1
+            flight = _Flight(asyncio.ensure_future(factory()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _, key=key, flight=flight: self._finish(key, flight))
+
+        flight.waiters += 1
+        try:
+            result = await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if not flight.task.done():
+                # This caller went away; the work continues for the others
+                self.stats["cancelled_waiters"] += 1
+                if flight.waiters == 1:
+                    self.stats["abandoned"] += 1
+                    flight.task.cancel()
+                    # Later callers start a new attempt instead of joining a cancelled one
+                    if self._flights.get(key) is flight:
+                        del self._flights[key]
+            raise
+        except Exception:
+            if shared:
+                self.stats["shared_errors"] += 1
+            raise
+        finally:
+            flight.waiters -= 1
+        return result, shared
+
+    def _finish(self, key: Hashable, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.task.cancelled():
+            # Mark the exception as retrieved when every caller has gone
+            flight.task.exception()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"in_flight": len(self._flights), **self.stats}
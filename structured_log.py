@@ -0,0 +1,201 @@
+"""
+Structured, non-blocking logging for the request path.
+
+Records are formatted as one JSON object (or a short text line) per event
+and written to stdout by a background `QueueListener` thread. Request
+handlers only put records on a bounded in-memory queue: when the queue is
+full the record is dropped and counted instead of blocking the event loop
+on a slow container log pipe.
+
+Each HTTP request gets a request ID (taken from `X-Request-ID` or
+generated) and a dict of stage timings, both held in a context variable
+that worker threads inherit. Routine per-request records can be sampled;
+warnings and errors are always kept.
+"""
+
+import sys
+import json
+import time
+import uuid
+import queue
+import random
+import logging
+import logging.handlers
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+LOGGER_NAME = "batik"
+
+# {"request_id": str, "stages": {name: milliseconds}} for the current request
+request_context: ContextVar[Optional[Dict[str, Any]]] = ContextVar("request_context", default=None)
+
+_listener = None
+_handler = None
+_sampling = None
+
+# How long shutdown waits for the writer to make room for its stop marker
+STOP_TIMEOUT_SECONDS = 5.0
+
+
+def start_request(request_id: Optional[str] = None) -> Dict[str, Any]:
+    """Open a logging context for a request and return it"""
+    context = {"request_id": request_id or uuid.uuid4().hex[:16], "stages": {}}
+    request_context.set(context)
+    return context
+
+
+def current_request_id() -> Optional[str]:
+    context = request_context.get()
+    return context["request_id"] if context else None
+
+
+def record_stage(name: str, seconds: float):
+    """Add a stage duration to the current request's timings (no-op outside a request)"""
+    context = request_context.get()
+    if context is not None:
+        stages = context["stages"]
+        stages[name] = round(stages.get(name, 0.0) + seconds * 1000, 3)
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block as a stage of the current request"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started)
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record, with the request ID and any `fields` extra"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable line: time, level, request ID, message and key=value fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = " ".join(f"{key}={value}" for key, value in (getattr(record, "fields", None) or {}).items())
+        request_id = getattr(record, "request_id", None)
+        line = (f"{self.formatTime(record, '%H:%M:%S')} {record.levelname:7s} "
+                f"{'[' + request_id + '] ' if request_id else ''}{record.getMessage()} {fields}").rstrip()
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class SamplingFilter(logging.Filter):
+    """Keep `sample_rate` of records logged with `extra={"sample": True}`; never drops warnings"""
+
+    def __init__(self, sample_rate: float):
+        super().__init__()
+        self.sample_rate = sample_rate
+        self.sampled_out = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not getattr(record, "sample", False):
+            return True
+        if self.sample_rate >= 1.0 or random.random() < self.sample_rate:
+            return True
+        self.sampled_out += 1
+        return False
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops (and counts) records when the queue is full"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Formatting happens on the listener thread; only attach the request ID here
+        if not hasattr(record, "request_id"):
+            record.request_id = current_request_id()
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class DrainingQueueListener(logging.handlers.QueueListener):
+    """QueueListener whose stop() also works when the bounded queue is full"""
+
+    def enqueue_sentinel(self):
+        # The base class uses put_nowait, which raises queue.Full on a full
+        # queue; the writer thread keeps draining, so wait for room instead
+        try:
+            self.queue.put(self._sentinel, timeout=STOP_TIMEOUT_SECONDS)
+        except queue.Full:
+            # The writer is stuck (e.g. blocked stdout): drop one record for the marker
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                pass
+            self.queue.put_nowait(self._sentinel)
+
+
+def setup_logging(level: str = "INFO", sample_rate: float = 1.0,
+                  fmt: str = "json", queue_size: int = 10000) -> logging.Logger:
+    """
+    Route the service's loggers through a bounded queue to a stdout writer thread.
+
+    Safe to call again (e.g. on reload): the previous listener is stopped first.
+    """
+    global _listener, _handler, _sampling
+    stop_logging()
+    log_queue = queue.Queue(maxsize=queue_size)
+    writer = logging.StreamHandler(sys.stdout)
+    writer.setFormatter(JSONFormatter() if fmt == "json" else TextFormatter())
+    _listener = DrainingQueueListener(log_queue, writer, respect_handler_level=False)
+    _listener.start()
+
+    _handler = NonBlockingQueueHandler(log_queue)
+    _sampling = SamplingFilter(sample_rate)
+    _handler.addFilter(_sampling)
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.handlers = [_handler]
+    logger.setLevel(level.upper())
+    logger.propagate = False
+    return logger
+
+
+def stop_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        # No new records may race the stop marker into the queue
+        logging.getLogger(LOGGER_NAME).removeHandler(_handler)
+        _listener.stop()
+        _listener = None
+
+
+def logging_stats() -> Dict[str, Any]:
+    if _handler is None:
+        return {"enabled": False}
+    return {
+        "enabled": True,
+        "queued": _handler.queue.qsize(),
+        "dropped": _handler.dropped,
+        "sampled_out": _sampling.sampled_out,
+        "sample_rate": _sampling.sample_rate
+    }
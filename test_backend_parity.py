@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Parity test between the Keras and TFLite inference backends.
+
+Both backends classify the same sample set through `preprocess_image`; the
+test fails if top-1 agreement drops below PARITY_MIN_AGREEMENT. Set
+PARITY_SAMPLES_DIR to a directory of real batik images (searched
+recursively); otherwise synthetic images are used.
+"""
+
+import os
+import io
+import numpy as np
+import pytest
+from PIL import Image
+
+import main as service
+
+MIN_AGREEMENT = float(os.environ.get("PARITY_MIN_AGREEMENT", "0.99"))
+SAMPLES_DIR = os.environ.get("PARITY_SAMPLES_DIR")
+NUM_SYNTHETIC = 32
+
+
+def load_sample_images():
+    """Return encoded sample images, real ones if PARITY_SAMPLES_DIR is set"""
+    samples = []
+    if SAMPLES_DIR and os.path.isdir(SAMPLES_DIR):
+        for root, _, files in os.walk(SAMPLES_DIR):
+            for filename in sorted(files):
+                if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
+                    with open(os.path.join(root, filename), 'rb') as f:
+                        samples.append(f.read())
+        return samples
+
+    rng = np.random.default_rng(42)
+    for i in range(NUM_SYNTHETIC):
+        # Smooth random patterns are closer to fabric than pure noise
+        coarse = rng.integers(0, 255, (8 + i % 8, 8 + i % 8, 3), dtype=np.uint8)
+        img = Image.fromarray(coarse).resize((320, 240), Image.BICUBIC)
+        buffer = io.BytesIO()
+        img.save(buffer, format='JPEG')
+        samples.append(buffer.getvalue())
+    return samples
+
+
+def test_backend_parity():
+    """Top-1 of the tflite backend must match the keras backend"""
+    pytest.importorskip("tensorflow")
+    missing = [path for path in (service.MODEL_PATH, service.TFLITE_MODEL_PATH) if not os.path.exists(path)]
+    if missing:
+        pytest.skip(f"Model file(s) missing: {', '.join(missing)}; run export_tflite.py first")
+
+    keras_backend = service.KerasBackend()
+    keras_backend.load()
+    tflite_backend = service.TFLiteBackend()
+    tflite_backend.load()
+
+    batch = np.concatenate([service.preprocess_image(sample) for sample in load_sample_images()], axis=0)
+    keras_probs = keras_backend.predict(batch)
+    tflite_probs = tflite_backend.predict(batch)
+
+    agreement = float(np.mean(np.argmax(keras_probs, axis=1) == np.argmax(tflite_probs, axis=1)))
+    max_diff = float(np.max(np.abs(keras_probs - tflite_probs)))
+    assert agreement >= MIN_AGREEMENT, (
+        f"Top-1 agreement {agreement:.4f} < {MIN_AGREEMENT} on {len(batch)} images, max |Δp|: {max_diff:.6f}")
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Test script for the async client SDK (client/batik_client) against a running API
+"""
+
+import io
+import os
+import sys
+import asyncio
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "client"))
+from batik_client import BatikClient  # noqa: E402
+
+# API base URL
+BASE_URL = os.environ.get("BASE_URL", "http://localhost:8000")
+
+def create_large_test_image():
+    """A camera-sized JPEG, so client-side resizing has something to do"""
+    img = Image.fromarray(np.random.randint(0, 255, (1200, 1600, 3), dtype=np.uint8))
+    img_bytes = io.BytesIO()
+    img.save(img_bytes, format='JPEG')
+    return img_bytes.getvalue()
+
+async def run_tests():
+    image = create_large_test_image()
+    async with BatikClient(BASE_URL) as client:
+        print("🔍 Waiting for the model...")
+        await client.wait_until_ready(timeout=120)
+
+        name, upload, _ = await client.prepare(image, "large.jpg")
+        print(f"✅ Client-side resize: {len(image) // 1024} KB -> {len(upload) // 1024} KB")
+        resized_ok = Image.open(io.BytesIO(upload)).size == await client.input_size()
+
+        result = await client.predict(image, "large.jpg")
+        print(f"✅ /predict: {result['predicted_class']} ({result['confidence']:.4f})")
+
+        results = await client.predict_many([image] * 25)
+        print(f"✅ predict_many: {len(results)} results from {-(-25 // client.batch_size)} batch calls")
+        batch_ok = len(results) == 25 and all(r.get("success") for r in results)
+
+        # Unresized and resized uploads must classify the same
+        async with BatikClient(BASE_URL, resize=False) as raw_client:
+            raw = await raw_client.predict(image, "large.jpg")
+        same_class = raw["predicted_class"] == result["predicted_class"]
+        print(f"{'✅' if same_class else '⚠️'} Same class with server-side resize: {raw['predicted_class']}")
+
+    return resized_ok and batch_ok
+
+if __name__ == "__main__":
+    print("🚀 Testing batik_client...")
+    print("=" * 50)
+    passed = asyncio.run(run_tests())
+    print("=" * 50)
+    print("🎉 All client tests passed!" if passed else "❌ Some client tests failed")
+    sys.exit(0 if passed else 1)
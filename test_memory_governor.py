@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Tests for the per-worker memory budget and admission control in memory_governor.py
+"""
+
+import pytest
+
+import memory_governor
+from memory_governor import MB, MemoryBudgetExceeded, MemoryGovernor, worker_memory_budget
+
+
+def test_worker_budget_splits_container_limit():
+    """Each of N workers gets 1/N of the cgroup limit"""
+    assert worker_memory_budget(1, 4096 * MB) == 4096 * MB
+    assert worker_memory_budget(4, 4096 * MB) == 1024 * MB
+    assert worker_memory_budget(0, 4096 * MB) == 4096 * MB
+
+
+def test_worker_budget_without_container_limit(monkeypatch):
+    monkeypatch.setattr(memory_governor, "container_memory_limit", lambda: None)
+    assert worker_memory_budget(4) is None
+
+
+def test_workers_together_stay_within_container_limit(monkeypatch):
+    """N workers admitting up to their share cannot commit more than the limit in total"""
+    limit, workers, rss = 4096 * MB, 4, 200 * MB
+    monkeypatch.setattr(memory_governor, "current_rss", lambda: rss)
+    governors = [MemoryGovernor(worker_memory_budget(workers, limit)) for _ in range(workers)]
+
+    admitted = 0
+    for governor in governors:
+        with governor.reserve(500 * MB):
+            admitted += rss + governor.in_flight
+            with pytest.raises(MemoryBudgetExceeded):
+                with governor.reserve(500 * MB):
+                    pass
+    assert admitted <= limit